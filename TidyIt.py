@@ -89,6 +89,11 @@
 # (~) can be used to expand the path in efforts to support the home
 # directory
 #
+# Content is moved instantly when it resides on the same filesystem as
+# the Move Path; otherwise it has to be copied there first (a warning
+# identifying the libraries this applies to is logged when the script
+# starts).
+#
 #MovePath=~/Desktop/TidyIt.Trash
 
 # Always Trash File Extensions.
@@ -181,6 +186,17 @@
 #
 #ProcessMinAge=3600
 
+# Age From Change Time.
+#
+# Content moved (or copied) into your library usually keeps the
+# modification time it had before; it can appear to be much older than
+# it really is. Set this to Yes to take the age of each file and directory
+# from the most recent of it's modification and (inode) change times
+# instead; such content is then left alone until it has reached the
+# Minimum Processing Age too.
+#
+#AgeFromChangeTime=No
+
 # File extensions for video files.
 #
 # Only files with these extensions are considered a video. Extensions must
@@ -200,6 +216,21 @@
 #
 #SafeEntries=.notidy
 
+# Excluded Paths.
+#
+# Identify the directories within your Video Paths that should never be
+# looked in (such as snapshot and recycle bin directories). Each entry is
+# matched against the path of a directory relative to the Video Path it
+# was found in; a star (*) matches anything within a single directory name
+# while a double star (**) matches any number of directories. Hence
+# */Extras matches the Extras directory of each show/movie, and
+# **/.snapshot matches a .snapshot directory anywhere. Excluded directories
+# are never listed or stat()'ed and are left alone (as though they held
+# something worth keeping). Use a comma (or a new line) to delimit multiple
+# entries.
+#
+#ExcludePaths=
+
 # My Systems File Encoding (UTF-8, UTF-16, ISO-8859-1, ISO-8859-2).
 #
 # All systems have their own encoding; here is a loose guide you can use
@@ -219,7 +250,10 @@
 # All files that are downloaded will be written to your filesystem using
 # the same encoding your operating system uses.  Since there is no way
 # to detect this (yet), by specifying it here, you can make it possible
-# to handle files with the extended character sets.
+# to handle files with the extended character sets.  Names that can not
+# be decoded by your operating system are left exactly as they were found
+# (and acted on as such); they are only decoded with this encoding when
+# they are logged.
 #
 #SystemEncoding=UTF-8
 
@@ -231,6 +265,173 @@
 #
 #KeepDirectories=No
 
+# Parallel Jobs.
+#
+# Identify the number of processes to use when scanning your libraries.
+# Each show/movie directory found in a library is scanned independently
+# of the others; so systems with several CPUs (and storage that can keep
+# up with them) benefit from setting this higher than one (1).
+#
+#Jobs=1
+
+# Concurrent Stat Threads.
+#
+# Libraries stored on a network share (NFS, SMB, etc) spend most of their
+# scan time waiting on the details (size, age, etc) of each file to be
+# returned to them. Setting this higher than one (1) allows these requests
+# to be made concurrently for the files found in each directory. Local
+# disks do not benefit from this so you can identify the number of threads
+# to use for each library by prefixing it with the library path followed
+# by an equal (=) sign.  Use a comma to delimit multiple entries. Entries
+# without a path apply to all other libraries.
+# Example=1, /mnt/nas/TV=16, /mnt/nas/Movies=8
+#
+#StatThreads=1
+
+# Action Threads.
+#
+# Identify the number of threads used to handle (remove or move) the content
+# the script has decided to tidy. Removing a large number of files from a
+# network share (NFS, SMB, etc) spends most of it's time waiting on each
+# request to complete; setting this higher than one (1) allows several of
+# them to be made at once. A directory is only ever handled once all of
+# the content within it has been.
+#
+#ActionThreads=1
+
+# Scan Index File.
+#
+# Optionally identify a file the script can use to remember the directories
+# it has already scanned (and what it decided about them). Directories (and
+# all of the sub-directories within them) that have not changed since the
+# last time the script ran are not scanned again. This greatly speeds up
+# the tidying of large libraries that rarely change. The Tilde (~) can be
+# used to expand the path in efforts to support the home directory.
+# Leave this blank to disable this feature.
+#
+#ScanIndex=
+
+# Action Plan File.
+#
+# Optionally identify a file to write every action the script takes (or
+# would take in Preview mode) to while it scans your libraries. Each line
+# of the file identifies the path handled along with it's category, size,
+# depth, modification time and the reason it was handled. A plan written
+# in Preview mode can be reviewed and then applied later on from the
+# command line (--apply) without your libraries having to be scanned
+# again. The Tilde (~) can be used to expand the path in efforts to support
+# the home directory. Leave this blank to disable this feature.
+#
+#PlanFile=
+
+# Manifest File.
+#
+# Walking a library stored on a NAS can be slow; but the NAS itself can
+# usually list it's content very quickly. Optionally identify a file
+# containing such a listing and your libraries are planned from it instead
+# of being scanned. Nothing is changed (the script runs as if it was in
+# Preview mode) so this is best combined with the Action Plan File; the
+# plan can then be reviewed and applied (--apply) later on. Each line of
+# the manifest identifies the path, size, modification time and type of
+# an entry (separated by a tab) such as the ones written by:
+#   find /path/to/library -printf '%p\t%s\t%T@\t%y\n'
+# The paths in the manifest must match the Video Paths. The Tilde (~) can
+# be used to expand the path in efforts to support the home directory.
+# Leave this blank to disable this feature.
+#
+#ManifestFile=
+
+# Maximum Run Time (in seconds).
+#
+# Large libraries can take longer to scan than the time you've set aside
+# for this script to run. Setting this higher than zero (0) stops a scan
+# once it has run for the number of seconds specified; the show/movie
+# directory being scanned at the time is always finished first. Where
+# the scan left off is saved to the Cursor File and the next run continues
+# from there; so your entire library is still covered over the course of
+# several runs. Set this to zero (0) to always scan everything.
+#
+#MaxRuntime=0
+
+# Cursor File.
+#
+# The file where a scan stopped by the Maximum Run Time is tracked so that
+# the next run can pick up where it left off. The Tilde (~) can be used to
+# expand the path in efforts to support the home directory.
+#
+#CursorFile=~/.tidyit.cursor
+
+# Maximum Memory (in MB).
+#
+# Everything planned for a directory is held on to until the directory has
+# been scanned in full; a directory holding hundreds of thousands of
+# entries can take a great deal of memory to get through. Setting this
+# higher than zero (0) leaves any directory alone (as though it held
+# something worth keeping) once scanning it has grown the memory this
+# script uses by more than the specified amount; each directory left alone
+# is reported as a warning. The most memory used is always reported at
+# the end of a run. Set this to zero (0) to never leave a directory alone
+# because of it's size.
+#
+#MaxMemory=0
+
+# Overlapping Runs (exit, rerun).
+#
+# Only one copy of this script can tidy a library at a time; a lock file
+# is held for each library while it's being tidied. If another copy is
+# already tidying a library when this one starts, it is left to it. Set
+# this to exit to simply leave it at that. Set this to rerun to also have
+# the copy already running take another look at the directories that
+# changed while it was running once it's done.
+#
+# exit  - Leave the library to the copy already tidying it.
+# rerun - Have the copy already tidying the library rescan the
+#         directories that changed while it was running.
+#
+#OverlapMode=exit
+
+# Lock Directory.
+#
+# The directory the lock files of each library are kept in. Leave this
+# blank to use your system's temporary directory. The Tilde (~) can be used
+# to expand the path in efforts to support the home directory.
+#
+#LockDirectory=
+
+# Metrics File.
+#
+# Optionally identify a file to write the metrics of each run to; this
+# includes the number of directories scanned, the entries found of each
+# category, the actions taken, the bytes reclaimed, the warnings and errors
+# encountered, the time spent in each phase of the run and the slowest
+# directories read. Files ending in .prom are written in a format that can
+# be picked up by the Prometheus node exporter's textfile collector; all
+# others are written as JSON. The Tilde (~) can be used to expand the path
+# in efforts to support the home directory. Leave this blank to disable
+# this feature.
+#
+#MetricsFile=
+
+# Profile File.
+#
+# Optionally identify a file to write a profile (in the format read by
+# Python's pstats module) of each run to. This is useful in tracking down
+# where a run is spending it's time; only the main process is profiled so
+# consider leaving Jobs set to 1 while you do so. The Tilde (~) can be used
+# to expand the path in efforts to support the home directory. Leave this
+# blank to disable this feature.
+#
+#ProfileFile=
+
+# Slow Trace Threshold (milliseconds).
+#
+# Optionally report on any directory that takes longer than the specified
+# number of milliseconds to be listed, stat()'ed or scanned and on any
+# content that takes as long to be handled. Leave this blank to disable
+# this feature.
+#
+#TraceSlow=
+
 # Enable debug logging (yes, no).
 #
 # If you experience a problem, you can bet I'll have a much easier time solving
@@ -247,22 +448,85 @@
 
 import re
 from os.path import join
-from os import listdir
 from os.path import basename
 from os.path import abspath
 from os.path import dirname
 from os.path import isdir
-from os.path import isfile
 from os.path import exists
+from os.path import lexists
+from os.path import islink
 from os import sep as os_separator
 
 from os import unlink
 from os import makedirs
+from os import rename
+from os import symlink
+from os import readlink
+from os import link as os_link
+
+try:
+    # Python v3.2+
+    from os import fsencode
+    from os import fsdecode
+
+except ImportError:
+    # Python v2.7 paths are already bytes
+    def fsencode(path):
+        return path
+
+    def fsdecode(path):
+        return path
+
+try:
+    # Python v3.5+
+    from os import scandir
+
+except ImportError:
+    # Python v2.7 requires the scandir backport
+    from scandir import scandir
+
 from shutil import rmtree
-from shutil import move
+from shutil import copytree
+from shutil import copystat
+
+# Our moves between devices
+from os import open as os_open
+from os import write as os_write
+from os import fstat
+from os import O_RDONLY
+from os import O_WRONLY
+from os import O_CREAT
+from os import O_EXCL
+from os import O_RDWR
+from errno import EXDEV
+from errno import EINVAL
+from errno import ENOSYS
+from errno import EOPNOTSUPP
+from errno import ENOENT
+from errno import EISDIR
+from errno import ENOTDIR
+from errno import EEXIST
+from errno import EPERM
+from errno import EMLINK
+
+try:
+    # Python v3.8+ (Linux)
+    from os import copy_file_range
+
+except ImportError:
+    copy_file_range = None
+
+try:
+    # Python v3.3+ (Linux; files to files)
+    from os import sendfile
+
+except ImportError:
+    sendfile = None
 
-from stat import ST_MTIME
 from stat import ST_SIZE
+from stat import S_ISDIR
+from stat import S_IFDIR
+from stat import S_IFREG
 
 # This is required if the below environment variables
 # are not included in your environment already
@@ -270,10 +534,93 @@ import sys
 
 # stat is used to test if the .srt file was fetched okay or not
 from os import stat
-
-# Script dependencies identified below
-from datetime import timedelta
-from datetime import datetime
+from os import stat_result
+
+# Our filename classification
+try:
+    # Python v3.2+
+    from functools import lru_cache
+
+except ImportError:
+    # Python v2.7; our classifications are not cached
+    lru_cache = None
+
+# Our sibling matching
+from bisect import bisect_left
+from bisect import insort
+
+# Our filesystem recordings
+from collections import deque
+
+# Our slow directory tracking
+from heapq import heappush
+from heapq import heapreplace
+
+# Our action plans
+import json
+
+# Our profiling
+import cProfile
+
+# Our estimates
+import random
+from math import sqrt
+
+# Our memory tracking
+try:
+    import resource
+    from os import sysconf
+
+    # The size of the memory pages our memory usage is reported in
+    PAGE_SIZE = sysconf('SC_PAGE_SIZE')
+
+except ImportError:
+    # Microsoft Windows; the memory we use is not tracked
+    resource = None
+    PAGE_SIZE = 0
+
+# The decoding of the path names we log
+from codecs import lookup as codec_lookup
+
+# Our library locks
+from tempfile import gettempdir
+try:
+    import fcntl
+
+except ImportError:
+    # Microsoft Windows; our libraries are not locked
+    fcntl = None
+
+# Our persistent scan index
+import sqlite3
+from hashlib import sha1
+
+# Our parallel scanning
+import signal
+import logging
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+# Our action threads
+import threading
+try:
+    # Python v3
+    from queue import Queue
+
+except ImportError:
+    # Python v2.7
+    from Queue import Queue
+
+# Our watch mode
+import struct
+from time import time
+from time import sleep
+from time import strftime
+from time import localtime
+from select import select
+from os import read as os_read
+from os import close as os_close
+from os import strerror
 
 # pynzbget Script Wrappers
 from nzbget import SKIP_DIRECTORIES
@@ -360,6 +707,9 @@ DEFAULT_VIDEO_EXTENSIONS = \
 DEFAULT_TIDYSAFE_ENTRIES = \
         '.tidysafe'
 
+# Default Excluded Paths (none)
+DEFAULT_EXCLUDE_PATHS = ''
+
 # Always default to nothing (forcing it back to a preview mode)
 DEFAULT_MOVE_PATH = ''
 
@@ -373,6 +723,44 @@ class TidyCode(object):
 # A collection of all the tidy_library() return codes
 TIDY_CODES = (TidyCode.REMOVE, TidyCode.IGNORE)
 
+class TidyCategory(object):
+    """ The categories a filename can be classified into by the
+    FilenameClassifier
+    """
+    # A video file (as identified by VideoExtensions)
+    VIDEO = 'video'
+    # A video file that is a sample
+    SAMPLE = 'sample'
+    # Media meta information (fanart, posters, tvshow.nfo, etc)
+    MEDIAMETA = 'media-meta'
+    # Content matched by AlwaysTrash
+    ALWAYS_TRASH = 'always-trash'
+    # An extra file (subtitles, nfo, etc) belonging to a video
+    EXTRA = 'extra'
+    # Anything else
+    UNKNOWN = 'unknown'
+
+    # The following are never returned by the FilenameClassifier; they
+    # identify the other content found in an action plan
+    DIRECTORY = 'directory'
+    OS_METADATA = 'os-metadata'
+
+# A collection of all of the filename categories
+TIDY_CATEGORIES = (
+    TidyCategory.VIDEO,
+    TidyCategory.SAMPLE,
+    TidyCategory.MEDIAMETA,
+    TidyCategory.ALWAYS_TRASH,
+    TidyCategory.EXTRA,
+    TidyCategory.UNKNOWN,
+)
+
+# A collection of all of the categories content can be handled as
+PLAN_CATEGORIES = TIDY_CATEGORIES + (
+    TidyCategory.DIRECTORY,
+    TidyCategory.OS_METADATA,
+)
+
 # The number of seconds a matched directory/file has to have aged before it
 # is processed further.  This prevents the script from removing content
 # that may being processed 'now'.  All content must be older than this
@@ -400,597 +788,4818 @@ DEFAULT_ENCODINGS = (
 # Filesystem Encoding
 DEFAULT_SYSTEM_ENCODING = 'UTF-8'
 
+# The encoding our operating system uses for it's path names
+FS_ENCODING = sys.getfilesystemencoding()
+
+# The bytes of a path name that could not be decoded with it
+UNDECODED_RE = re.compile(u'[\udc80-\udcff]+')
+
 # Default Keep Directory Switch
 DEFAULT_KEEP_DIRECTORY_SWITCH = 'No'
 
+# Default Age From Change Time Switch
+DEFAULT_AGE_FROM_CHANGE_TIME = 'No'
 
-class TidyItScript(SchedulerScript):
-    """A Media Library Tidying tool written for NZBGet
-    """
+# Default Scan Index (disabled)
+DEFAULT_SCAN_INDEX = ''
 
-    def _re_str(self, re_str):
-        """
-        Support custom RE provided by this script where * becomes .*
-        and ? becomes .
-        """
-        return re.sub(
-            '\*', '.*', re.sub(
-            '\?', '.', re.sub(
-            '\)', '\\)', re.sub(
-            '\^', '\\^', re.sub(
-            '\.', '\\.', re_str,
-        )))))
+# Default Action Plan File (disabled)
+DEFAULT_PLAN_FILE = ''
 
-    def _handle(self, path, depth):
-        """
-        A Simple wrapper to handle content in addition to logging it.
-        """
+# Default Manifest File (disabled)
+DEFAULT_MANIFEST_FILE = ''
 
-        if not isdir(path):
-            # File Removal
-            if self.mode == TIDYIT_MODE.DELETE:
-                try:
-                    unlink(path)
-                    self.logger.info('Removed FILE: %s' % path)
-                except:
-                    self.logger.error('Could not removed FILE: %s' % path)
-                    return False
+# Default Filesystem Recording (disabled) and the one to Replay (disabled)
+DEFAULT_FS_RECORD = ''
+DEFAULT_FS_REPLAY = ''
 
-            elif self.mode == TIDYIT_MODE.MOVE:
-                # Using the depth, we need to determine the path we're
-                # generating for the new file
-                tmp_fullpath = join(
-                    self.move_path,
-                    os_separator.join(os_path_split(path)[-depth:]),
-                )
+# Default latency (in milliseconds) added to each call made to a manifest or
+# a replayed recording (disabled)
+DEFAULT_FS_LATENCY = 0
 
-                # Handle duplicate files:
-                if exists(tmp_fullpath):
-                    index = 1
-                    _new_path = '%s.%.5d' % (tmp_fullpath, index)
-                    while exists(_new_path):
-                        index +=1
-                        _new_path = '%s.%.5d' % (tmp_fullpath, index)
-                    # Store our new path
-                    tmp_fullpath = _new_path
+# Default Maximum Run Time (disabled)
+DEFAULT_MAX_RUNTIME = 0
 
-                tmp_dirname = dirname(tmp_fullpath)
-                if not isdir(tmp_dirname):
-                    try:
-                        makedirs(tmp_dirname)
-                    except Exception as e:
-                        self.logger.error(
-                            'Could not create move path: %s' % tmp_dirname,
-                        )
-                        self.logger.debug('makedirs() Exception %s' % str(e))
+# Default Cursor File
+DEFAULT_CURSOR_FILE = '~/.tidyit.cursor'
 
-                # Now create our directory path if it doesn't exist
-                try:
-                    move(path, tmp_fullpath)
-                    self.logger.info('Moved FILE: %s' % path)
-                except Exception as e:
-                    self.logger.error('Could not move FILE: %s' % path)
-                    self.logger.debug('Move Exception %s' % str(e))
-                    return False
+# Default Maximum Memory (disabled)
+DEFAULT_MAX_MEMORY = 0
 
-            else:
-                self.logger.info('PREVIEW ONLY: Handle FILE: %s' % path)
-        else:
-            # Directory Removal
-            if self.mode == TIDYIT_MODE.DELETE:
-                try:
-                    rmtree(path)
-                    self.logger.info('Removed DIRECTORY: %s' % path)
-                except:
-                    self.logger.error('Could not remove DIRECTORY: %s' % path)
-                    return False
+# Default number of show/movie directories an estimate is made from
+DEFAULT_ESTIMATE_SAMPLE = 100
+
+# The number of standard errors either side of an estimate its confidence
+# interval spans (95%)
+ESTIMATE_Z = 1.96
 
-            elif self.mode == TIDYIT_MODE.MOVE:
-                # Using the depth, we need to determine the path we're
-                # generating for the new file
-                tmp_fullpath = join(
-                    self.move_path,
-                    os_separator.join(os_path_split(path)[-depth:]),
-                )
+# The number of entries looked at between checks of the memory we're using
+MEMORY_CHECK_INTERVAL = 1024
 
-                if isfile(tmp_fullpath):
-                    # Directories are usually already handled because
-                    # they contain files and have already been created and
-                    # set up... but just to be bulletproof; this will handle
-                    # situations where a file exists where a directory should
-                    # be.
-                    index = 1
-                    _new_path = '%s.%.5d' % (tmp_fullpath, index)
-                    while isfile(_new_path):
-                        index +=1
-                        _new_path = '%s.%.5d' % (tmp_fullpath, index)
-                    # Store our new path
-                    tmp_fullpath = _new_path
+# Default handling of a library another copy of us is already tidying
+DEFAULT_OVERLAP_MODE = 'exit'
 
-                tmp_dirname = dirname(tmp_fullpath)
-                if not isdir(tmp_dirname):
-                    try:
-                        makedirs(tmp_dirname)
-                    except Exception as e:
-                        self.logger.error(
-                            'Could not create move path: %s' % tmp_dirname,
-                        )
-                        self.logger.debug('makedirs() Exception %s' % str(e))
+# The supported handling of a library another copy of us is tidying
+OVERLAP_MODES = ('exit', 'rerun')
 
-                if not isdir(tmp_fullpath):
-                    # Now create our directory path if it doesn't exist
-                    try:
-                        move(path, tmp_fullpath)
-                        self.logger.info('Moved DIRECTORY: %s' % path)
-                    except Exception as e:
-                        self.logger.error('Could not move DIRECTORY: %s' % path)
-                        self.logger.debug('Move Exception %s' % str(e))
-                        return False
+# Default Lock Directory (our system's temporary directory)
+DEFAULT_LOCK_DIRECTORY = ''
 
-                # Now that content has been backed up properly, we can
-                # safely remove the source directory
-                if isdir(path):
-                    try:
-                        rmtree(path)
-                        self.logger.info(
-                            'Removed (already backed up) ' + \
-                            'DIRECTORY: %s' % path,
-                        )
-                    except:
-                        self.logger.error(
-                            'Could not remove (already backed up) ' + \
-                            'DIRECTORY: %s' % path,
-                        )
-                        return False
-            else:
-                self.logger.info('PREVIEW ONLY: Handle DIRECTORY: %s' % path)
+# Default Metrics File (disabled)
+DEFAULT_METRICS_FILE = ''
 
-        return True
+# Default Profile File (disabled)
+DEFAULT_PROFILE_FILE = ''
 
-    def tidy_library(self, path, extensions, extras, minsize, minage, keep_dirs, *args, **kwargs):
-        """
-          - Recursively scan a library path and returns the number of files
-            found in a directory.
+# Default number of milliseconds a directory scan (or action) must take
+# before it's reported on (disabled)
+DEFAULT_TRACE_SLOW = ''
 
-          But the path library will be skewed if changes are determiend to happen.
-          - If a directory contains another directory within it; it will never
-            be removed.
-              - If a meta directory exists, it will not be considered as part
-                of this rule.
-            The directory passed into the function (for the first time
-            will 'never' be removed reguardless of scanned outcome
+# The phases of a scan we track the time spent in
+SCAN_PHASES = ('list', 'stat', 'classify')
 
-          - if keep_dirs is set to True, then directoreies are NOT removed.
-        """
-        if not isdir(path):
-            # Not a directory? then return a value that will prevent
-            # the file/block from being removed (non-zero)
-            return TidyCode.IGNORE
+# The number of (slowest) directories reported in our metrics
+SLOW_DIRECTORIES = 10
 
-        # Internal Tracking of Directory Depth
-        # A depth of 0 is a 'safe' directory that will
-        # never be removed
-        current_depth = kwargs.get('__current_depth', 1)
+# The number of filename classifications to remember; filenames such as
+# folder.jpg, Thumbs.db and tvshow.nfo are found throughout a library
+DEFAULT_CLASSIFIER_CACHE_SIZE = 4096
 
-        if current_depth == 1:
-            self.logger.info('Scanning %s' % path)
+# The default number of processes used to scan our libraries
+DEFAULT_JOBS = 1
 
-        # Change to absolute path
-        path = abspath(path)
-        ref_time = datetime.now() - timedelta(seconds=minage)
-        # Check absolute path date (because we don't want to
-        # process anything in it if it was touched recently)
-        try:
-            stat_obj = stat(path)
-            mtime = datetime.fromtimestamp(stat_obj[ST_MTIME])
-            if current_depth > 1 and mtime >= ref_time:
-                # We're done; directory is to new
-                self.logger.debug('Skipping %s; modified less than %ds ago.' % (
-                    path,
-                    minage,
-                ))
-                return TidyCode.IGNORE
+# The default number of threads used to handle (remove/move) content
+DEFAULT_ACTION_THREADS = 1
 
-        except OSError:
-            # The directory suddently became inaccessible
-            self.logger.warning(
-                'Path %s is inaccessible.' % path,
-            )
-            # Since the directory is missing (or inaccessible
-            # due to permissions) return an IGNORE on it
-            return TidyCode.IGNORE
+# The number of actions that can be waiting on each action thread before
+# our scan is paused to let them catch up
+ACTION_QUEUE_DEPTH = 64
 
-        except ValueError:
-            # datetime could not parse the time correctly
-            # Newly created directories won't have this problem
-            # we can move along
-            pass
+# The number of bytes copied at a time when content is moved between devices
+COPY_CHUNK_SIZE = 8388608
 
-        # Store Filesize
-        size = stat_obj[ST_SIZE]
+# The number of bytes copied between each progress report of a (large) file
+COPY_PROGRESS_SIZE = 536870912
 
-        # First check for the goods; we may not have to do
-        # further processing otherwise
-        _valid_paths = self.get_files(
-            path,
-            regex_filter=extensions,
-            min_depth=1, max_depth=1,
-            fullstats=True,
-            skip_directories=False,
-        )
-
-        # Apply Filters To Detect actual valid video files
-        _valid_paths = [ k for (k, v) in _valid_paths.items() if \
-            v['filesize'] >= minsize]
-
-        valid_paths = []
-        while(len(_valid_paths)):
-            _path = _valid_paths.pop()
-            if isfile(_path) and \
-               True in [ v.search(basename(_path)) is not None \
-                        for v in IGNORE_FILELIST_RE ]:
-                self.logger.debug(
-                    'Skipping - Ignored file: %s' % basename(_path))
-                continue
-            valid_paths.append(_path)
-        del _valid_paths
+# The default number of threads used to stat() directory entries
+DEFAULT_STAT_THREADS = 1
 
-        if len(valid_paths):
-            # at least one valid file was found in this directory
-            # but it doesn't rule out the fact the possibility of
-            # movie files existing in further sub directories.
-            # so we flag this as a safe dir and keep processing
+# The minimum number of seconds to wait after a change was detected in a
+# watched directory before it is scanned again.  This allows a burst of
+# changes (such as a Plex or Sonarr removing a show) to settle first.
+DEFAULT_WATCH_DEBOUNCE = 5
 
-            # The easiest way to mark a directory safe is to just
-            # toggle the current_depth to one (1).
-            current_depth = 1
+# inotify(7) event masks used by our watch mode
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONTFOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
 
-        # Get All Entries
-        dirents = [ d for d in listdir(path) \
-                        if d not in ('..', '.') ]
+# The events we want to hear about in our libraries
+IN_TIDYIT_EVENTS = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | \
+    IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | \
+    IN_DONTFOLLOW
+
+# The version of our scan index; indexes stored by another version are
+# rebuilt
+SCAN_INDEX_VERSION = 2
+
+# The structure of our scan index; paths (and the names of the directories
+# found in them) are stored exactly as our filesystem knows them (as bytes)
+# since they aren't always valid UTF-8
+SCAN_INDEX_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    CREATE TABLE IF NOT EXISTS dirs (
+        path BLOB PRIMARY KEY,
+        parent BLOB,
+        mtime REAL,
+        inode INTEGER,
+        verdict INTEGER,
+        children BLOB
+    );
+    CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+"""
+
+
+def glob_re(pattern):
+    """
+    Returns the regular expression equivalent of the path glob specified.
+    A star (*) and question mark (?) never match a path separator whereas a
+    double star (**) matches any number of directories.
+    """
+    sep = re.escape(os_separator)
+    regex = []
+    for token in re.split(r'(\*\*%s|\*\*|\*|\?)' % sep,
+                          pattern.strip(os_separator)):
+        if token == '**' + os_separator:
+            regex.append('(.*%s)?' % sep)
 
-        tidylist = []
-        remove_if_empty = []
-        while len(dirents):
+        elif token == '**':
+            regex.append('.*')
 
-            # Pop directory entry
-            dirent = dirents.pop()
+        elif token == '*':
+            regex.append('[^%s]*' % sep)
 
-            # Build absolute path with it
-            fullpath = join(path, dirent)
+        elif token == '?':
+            regex.append('[^%s]' % sep)
 
-            # Check for TidySafe Content
-            if dirent in self.tidysafe_entries:
-                # it was found; change the current depth
-                # we do not proceed any further
-                self.logger.debug('Safe entry %s found in %s' % (dirent, path))
-                return TidyCode.IGNORE
+        else:
+            regex.append(re.escape(token))
 
-            if dirent in self.meta_entries:
-                # METADATA is only cannon-fodder if it's determined
-                # the directory should be removed
-                self.logger.debug('Potential handling (os meta data): %s' % fullpath)
-                remove_if_empty.append(fullpath)
-                continue
+    return ''.join(regex)
 
-            try:
-                stat_obj = stat(fullpath)
-                mtime = datetime.fromtimestamp(stat_obj[ST_MTIME])
-                if mtime >= ref_time:
-                    # We're done; directory is to new
-                    self.logger.debug('Skipping %s; %s was modified less than %ds ago.' % (
-                        path,
-                        dirent,
-                        minage,
-                    ))
-                    return TidyCode.IGNORE
 
-            except OSError:
-                # The directory suddently became inaccessible
-                self.logger.warning(
-                    'Path %s became inaccessible.' % fullpath,
-                )
-                # Since the directory is missing, return 0 letting
-                # recursively called situations go ahead and handle
-                # this directory
-                continue
+class FilenameClassifier(object):
+    """
+    Classifies a filename into it's TidyCategory with a single call; the
+    results are cached (where supported) since the same names tend to be
+    found over and over again in a library.
+    """
 
-            except ValueError:
-                # datetime could not parse the time correctly
-                # Newly created directories won't have this problem
-                # we can move along
-                pass
+    def __init__(self, extensions, extras, always_trash=None,
+                 cache_size=DEFAULT_CLASSIFIER_CACHE_SIZE):
+        """
+        Initializes our classifier using the compiled regular expressions
+        identifying our video extensions, extras and always trash content.
+        """
+        self.extensions = extensions
+        self.extras = tuple(extras)
+        self.always_trash = always_trash
 
-            # Store Filesize
-            size = stat_obj[ST_SIZE]
+        self.classify = self._classify if lru_cache is None \
+            else lru_cache(maxsize=cache_size)(self._classify)
 
-            if isdir(fullpath):
-                if dirent in METADIRS:
-                    if len(valid_paths) == 0:
-                        # Meta content is useless to us if the directory
-                        # is empty
-                        tidylist.append(fullpath)
-                        self.logger.debug('Planned handling (metadata): %s' % fullpath)
-                    else:
-                        # Meta data exists, the best way to tackle this is
-                        # to append it to the current dirent list to be
-                        # processed
-                        dirents.extend([ join(dirent, d) for d in listdir(fullpath) \
-                                    if d not in ('..', '.') ])
+    def _classify(self, name):
+        """
+        Returns a tuple of the TidyCategory the filename specified belongs
+        to and the stem (the name of the video it belongs to) if it was
+        identified as an extra.
+        """
+        if self.extensions.search(name):
+            if True in [ v.search(name) is not None \
+                         for v in IGNORE_FILELIST_RE ]:
+                return (TidyCategory.SAMPLE, None)
+            return (TidyCategory.VIDEO, None)
 
-                    # Next File
-                    continue
+        for regex in MEDIAMETA_FILES_RE:
+            if regex.search(name):
+                return (TidyCategory.MEDIAMETA, None)
 
-                # Recursively continue scanning
-                code = self.tidy_library(
-                    path=fullpath,
-                    extensions=extensions,
-                    extras=extras,
-                    minsize=minsize,
-                    minage=minage,
-                    keep_dirs=keep_dirs,
-                    # Internal
-                    __current_depth=current_depth+1,
-                )
+        if self.always_trash is not None and self.always_trash.search(name):
+            return (TidyCategory.ALWAYS_TRASH, None)
 
-                if code == TidyCode.IGNORE:
-                    # Add this directory back to the
-                    # valid paths to prevent it from being
-                    # removed later
-                    valid_paths.append(fullpath)
+        for regex in self.extras:
+            match = regex.match(name)
+            if match:
+                return (TidyCategory.EXTRA, basename(match.group('filename')))
 
-                elif code == TidyCode.REMOVE:
-                    # We got instructions to remove
-                    # the directory
-                    if not keep_dirs:
-                        tidylist.append(fullpath)
-                        self.logger.debug('Planned handling (dir): %s' % fullpath)
+        return (TidyCategory.UNKNOWN, None)
 
-                # Next File
-                continue
 
-            if isfile(fullpath):
-                # Match against extras as a way of safeguarding
-                if extensions.search(fullpath):
-                    if len(valid_paths) == 0:
-                        # We found a video file in a situation where
+class SiblingIndex(object):
+    """
+    Tracks the names of the valid entries found in a directory (and the
+    name of the directory they reside in) so that an extra file can be
+    matched to the entry it belongs to with a simple prefix lookup.
+    """
+
+    def __init__(self):
+        """
+        Initializes our (empty) index
+        """
+        # A sorted list of our entry names
+        self.names = []
+
+        # The name of the directories our entries reside in
+        self.dirnames = set()
+
+    def add(self, path):
+        """
+        Adds a valid path to our index
+        """
+        name = basename(path)
+        if True not in [ ignore.search(name) is not None \
+                         for ignore in IGNORE_FILELIST_RE ]:
+            # Our entry can be matched by name (samples never are)
+            insort(self.names, name)
+
+        self.dirnames.add(basename(dirname(path)))
+
+    def lookup(self, prefix):
+        """
+        Returns a tuple of the name of the entry that starts with the prefix
+        specified and whether or not it was a directory name that matched.
+        None is returned if there was no match at all.
+        """
+        index = bisect_left(self.names, prefix)
+        if index < len(self.names) and self.names[index].startswith(prefix):
+            return (self.names[index], False)
+
+        for name in self.dirnames:
+            if name.startswith(prefix):
+                return (name, True)
+
+        return None
+
+
+class TidyState(object):
+    """
+    The progress tidy_library() has made through a directory it is scanning.
+    One is kept for every directory between the library root and the one
+    currently being scanned; there can be a great deal of them in a deep
+    library so they're kept as small as possible.
+    """
+    __slots__ = (
+        'path', 'depth', 'stat', 'valid_paths', 'siblings', 'stated',
+        'dirents', 'tidylist', 'remove_if_empty', 'subdirs', 'prefetched',
+        'pending', 'memory',
+    )
+
+    def __init__(self, path, depth, stat_obj):
+        """
+        Initializes the state of the directory specified
+        """
+        # The absolute path to our directory
+        self.path = path
+
+        # Our depth (1 if our directory holds valid content)
+        self.depth = depth
+
+        # The stat() of our directory (for the scan index)
+        self.stat = stat_obj
+
+        # The valid entries (videos and sub-directories worth keeping)
+        # found, along with the index extra files are matched against
+        self.valid_paths = []
+        self.siblings = SiblingIndex()
+
+        # The entries we've already performed a stat() on
+        self.stated = set()
+
+        # The (name, entry) pairs still to be looked at
+        self.dirents = []
+
+        # The content to be handled if we make it to the end
+        self.tidylist = []
+        self.remove_if_empty = []
+
+        # The sub-directories considered as part of our verdict
+        self.subdirs = []
+
+        # The sub-directories our workers are scanning for us
+        self.prefetched = {}
+
+        # The (name, path) of the sub-directory we're waiting on
+        self.pending = None
+
+        # The memory we were using before our directory was read (if we're
+        # limiting how much it can use)
+        self.memory = 0
+
+
+class ScanIndex(object):
+    """
+    A persistent record of the directories tidy_library() has already
+    visited.  Each directory is stored with the mtime and inode it had at
+    the time along with the verdict (TidyCode) that was reached for it.
+
+    A directory's verdict is only reused if neither it (nor any of the
+    directories found beneath it) have changed since it was recorded.
+    """
+
+    def __init__(self, path, fingerprint, rebuild=False):
+        """
+        Opens (and if nessisary creates) our index.  The fingerprint
+        identifies the configuration used to generate the verdicts stored
+        in the index; if it changes, so could the verdicts so the index is
+        cleared.
+        """
+        self.path = path
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+
+        # Paths we can not trust our verdict on (because it would have been
+        # different had we have scanned it at a later time)
+        self._tainted = set()
+
+        # Paths we've already confirmed have not changed this run
+        self._verified = set()
+
+        # If set to a list, the changes we would have otherwise made to the
+        # index are appended to it instead
+        self.journal = None
+
+        # How our children are stat()'ed; this is replaced by the one of
+        # the filesystem we scan through
+        self.stat = stat
+
+        self._db = sqlite3.connect(path)
+        self._db.executescript(SCAN_INDEX_SCHEMA)
+
+        row = self._db.execute(
+            'SELECT value FROM meta WHERE key = ?', ('fingerprint', ),
+        ).fetchone()
+
+        if rebuild or row is None or row[0] != fingerprint:
+            self._db.execute('DELETE FROM dirs')
+            self._db.execute(
+                'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                ('fingerprint', fingerprint),
+            )
+            self._db.commit()
+
+    def _unchanged(self, row, stat_obj):
+        """
+        Returns True if the row provided still reflects the stat_obj
+        """
+        return row is not None and row[0] == stat_obj.st_mtime and \
+            row[1] == stat_obj.st_ino
+
+    def _row(self, path):
+        """
+        Returns the (mtime, inode, verdict, children) of the indexed path
+        """
+        row = self._db.execute(
+            'SELECT mtime, inode, verdict, children FROM dirs WHERE path = ?',
+            (fsencode(path), ),
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        return row[0], row[1], row[2], fsdecode(bytes(row[3]))
+
+    def lookup(self, path, stat_obj):
+        """
+        Returns the verdict last reached on the path (provided it and every
+        directory beneath it is unchanged).  None is returned otherwise.
+        """
+        row = self._row(path)
+        if row is None or row[2] is None or \
+                not self._unchanged(row, stat_obj):
+            self.misses += 1
+            return None
+
+        # Walk our indexed children; we avoid recursion here so that we
+        # aren't limited by how deep a library may go
+        verified = []
+        stack = [(path, row[3])]
+        while len(stack):
+            parent, children = stack.pop()
+            if not children:
+                continue
+
+            for name in children.split('\n'):
+                child = join(parent, name)
+                if child in self._verified:
+                    continue
+
+                try:
+                    _stat_obj = self.stat(child)
+
+                except OSError:
+                    # Our child directory is gone
+                    self.misses += 1
+                    return None
+
+                _row = self._row(child)
+                if not self._unchanged(_row, _stat_obj):
+                    self.misses += 1
+                    return None
+
+                verified.append(child)
+                stack.append((child, _row[3]))
+
+        self._verified.update(verified)
+        self._verified.add(path)
+        self.hits += 1
+        return row[2]
+
+    def taint(self, path):
+        """
+        Prevents the path (and all of the directories that contain it) from
+        having their verdict stored this run.
+        """
+        if self.journal is not None:
+            self.journal.append(('taint', path))
+
+        while path not in self._tainted:
+            self._tainted.add(path)
+            _path = dirname(path)
+            if _path == path:
+                break
+            path = _path
+
+    def store(self, path, stat_obj, verdict, children):
+        """
+        Stores the verdict reached on a path along with the name of the
+        directories (relative to it) that it took into consideration.
+
+        A verdict of None can be used to track a directory's state without
+        associating a verdict with it.
+        """
+        if path in self._tainted:
+            return
+
+        if self.journal is not None:
+            self.journal.append(('store', path, stat_obj, verdict, children))
+            return
+
+        self._db.execute(
+            'INSERT OR REPLACE INTO dirs '
+            '(path, parent, mtime, inode, verdict, children) '
+            'VALUES (?, ?, ?, ?, ?, ?)', (
+                fsencode(path),
+                fsencode(dirname(path)),
+                stat_obj.st_mtime,
+                stat_obj.st_ino,
+                verdict,
+                fsencode('\n'.join(children)),
+            ))
+
+        # Clean up any directories that no longer belong to us
+        children = set(fsencode(join(path, c)) for c in children)
+        stale = [(r[0], ) for r in self._db.execute(
+            'SELECT path FROM dirs WHERE parent = ?', (fsencode(path), ))
+            if bytes(r[0]) not in children]
+        if stale:
+            self._db.executemany('DELETE FROM dirs WHERE path = ?', stale)
+
+    def reopen(self):
+        """
+        Opens a new connection to our index; this is required by processes
+        forked from the one that opened the index.
+        """
+        self._db = sqlite3.connect(self.path)
+
+    def reset(self):
+        """
+        Forgets what was verified (and tainted) so far; this allows a long
+        running process to re-use the same index over and over again.
+        """
+        self._tainted.clear()
+        self._verified.clear()
+
+    def commit(self):
+        """
+        Writes our index to disk
+        """
+        self._db.commit()
+
+    def close(self):
+        """
+        Writes our index to disk and closes it
+        """
+        self._db.commit()
+        self._db.close()
+
+    @staticmethod
+    def fingerprint(*args):
+        """
+        Generates a fingerprint from the arguments specified (along with
+        the version of our index they're stored in)
+        """
+        return sha1(repr((SCAN_INDEX_VERSION, ) + args).encode(
+            'utf-8')).hexdigest()
+
+
+class Inotify(object):
+    """
+    A very light wrapper to the Linux inotify(7) API.
+
+    Only the parent watch descriptor and name of each directory being
+    watched is kept (instead of it's full path); this keeps our memory
+    footprint small even when hundreds of thousands of directories are
+    being watched.
+    """
+
+    # The inotify_event structure (wd, mask, cookie, len)
+    event_struct = struct.Struct('iIII')
+
+    def __init__(self):
+        """
+        Initializes our inotify instance; an OSError is thrown if inotify
+        is not supported on this system.
+        """
+        import ctypes
+        import ctypes.util
+
+        try:
+            self._libc = ctypes.CDLL(
+                ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            self._libc.inotify_init
+            self._libc.inotify_add_watch
+            self._libc.inotify_rm_watch
+
+        except (OSError, AttributeError):
+            raise OSError('inotify is not supported on this system.')
+
+        self._ctypes = ctypes
+        self.fd = self._libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init() failed.')
+
+        # watch descriptor -> (parent watch descriptor, name)
+        self._watches = {}
+
+    def __len__(self):
+        """
+        Returns the number of directories being watched
+        """
+        return len(self._watches)
+
+    def add(self, path, parent=None):
+        """
+        Watches the directory specified (but not it's sub-directories).
+        If a parent watch descriptor isn't specified, then path is treated
+        as a root directory.
+
+        The watch descriptor is returned; an OSError is thrown if the
+        directory could not be watched.
+        """
+        wd = self._libc.inotify_add_watch(
+            self.fd, fsencode(path), IN_TIDYIT_EVENTS)
+
+        if wd < 0:
+            errno = self._ctypes.get_errno()
+            raise OSError(errno, strerror(errno), path)
+
+        # Watching a directory we already watch (because it moved) returns
+        # it's original watch descriptor; so this also updates where it
+        # lives now
+        self._watches[wd] = \
+            (None, path) if parent is None else (parent, basename(path))
+        return wd
+
+    def remove(self, wd):
+        """
+        Stops watching the watch descriptor specified along with every one
+        beneath it
+        """
+        if wd not in self._watches:
+            return
+
+        # Only the parent of each watch descriptor is kept; so we find
+        # their children first
+        children = {}
+        for _wd, (parent, _) in self._watches.items():
+            children.setdefault(parent, []).append(_wd)
+
+        stack = [wd]
+        while len(stack):
+            wd = stack.pop()
+            stack.extend(children.get(wd, []))
+            del self._watches[wd]
+            self._libc.inotify_rm_watch(self.fd, wd)
+
+    def forget(self, wd):
+        """
+        Forgets about a watch descriptor the kernel has already released
+        """
+        self._watches.pop(wd, None)
+
+    def chain(self, wd):
+        """
+        Returns the list of watch descriptors leading to (and including)
+        the one specified starting from it's root.  An empty list is
+        returned if the watch descriptor is not known.
+        """
+        chain = []
+        while wd is not None:
+            if wd not in self._watches:
+                return []
+            chain.append(wd)
+            wd = self._watches[wd][0]
+
+        chain.reverse()
+        return chain
+
+    def path(self, wd):
+        """
+        Returns the full path to the watch descriptor specified (or None if
+        it is not known)
+        """
+        chain = self.chain(wd)
+        if not chain:
+            return None
+        return join(*[ self._watches[w][1] for w in chain ])
+
+    def read(self, timeout=None):
+        """
+        A generator of the (wd, mask, cookie, name) events that occurred
+        within the timeout (in seconds) specified.
+        """
+        if not select([self.fd], [], [], timeout)[0]:
+            return
+
+        data = os_read(self.fd, 65536)
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = \
+                self.event_struct.unpack_from(data, offset)
+            offset += self.event_struct.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            yield wd, mask, cookie, fsdecode(name) if name else name
+
+    def close(self):
+        """
+        Releases our inotify instance
+        """
+        os_close(self.fd)
+        self._watches.clear()
+
+
+
+class OSFilesystem(object):
+    """
+    The filesystem our libraries are scanned (and tidied) through; this is
+    the one provided by our operating system.  The other filesystems (used
+    to plan from a manifest, to test and to benchmark) provide the same
+    methods.
+    """
+
+    # Changes made through us are real
+    real = True
+
+    def scandir(self, path):
+        return list(scandir(path))
+
+    def stat(self, path):
+        return stat(path)
+
+    def isdir(self, path):
+        return isdir(path)
+
+    def islink(self, path):
+        return islink(path)
+
+    def lexists(self, path):
+        return lexists(path)
+
+    def unlink(self, path):
+        unlink(path)
+
+    def rmtree(self, path):
+        rmtree(path)
+
+    def makedirs(self, path):
+        makedirs(path)
+
+    def rename(self, src, dst):
+        rename(src, dst)
+
+    def link(self, src, dst):
+        try:
+            # Python v3.3+; a symbolic link is linked to, not followed
+            os_link(src, dst, follow_symlinks=False)
+
+        except TypeError:
+            # Python v2.7
+            os_link(src, dst)
+
+    def copy(self, src, dst, copy_function):
+        """
+        Copies a file, directory or symbolic link (to another device); the
+        content of each file is copied with the copy_function specified
+        """
+        if islink(src):
+            # We copy the link, not what it points to
+            symlink(readlink(src), dst)
+
+        elif isdir(src):
+            try:
+                # Python v3.2+
+                copytree(src, dst, symlinks=True, copy_function=copy_function)
+
+            except TypeError:
+                # Python v2.7
+                copytree(src, dst, symlinks=True)
+
+        else:
+            copy_function(src, dst)
+
+    def close(self):
+        pass
+
+
+class VirtualEntry(object):
+    """
+    An entry found in one of our virtual filesystems; it can be used in
+    place of the os.DirEntry objects returned by scandir().
+    """
+    __slots__ = ('name', 'path', '_kind', '_size', '_mtime')
+
+    def __init__(self, path, name, kind, size, mtime):
+        self.name = name
+        self.path = path
+        self._kind = kind
+        self._size = size
+        self._mtime = mtime
+
+    def is_dir(self, follow_symlinks=True):
+        return self._kind == 'd'
+
+    def is_file(self, follow_symlinks=True):
+        return self._kind == 'f'
+
+    def stat(self):
+        return _virtual_stat(self._kind, self._size, self._mtime)
+
+
+def _virtual_stat(kind, size, mtime):
+    """
+    Returns the stat() of an entry found in one of our virtual filesystems
+    """
+    return stat_result((
+        S_IFDIR if kind == 'd' else S_IFREG, 0, 0, 1, 0, 0,
+        size, mtime, mtime, mtime))
+
+
+class MemoryFilesystem(object):
+    """
+    A filesystem kept entirely in memory.  It can be loaded from a manifest
+    of a library (such as one written by find -printf) or built up one
+    entry at a time.  Each line of a manifest identifies the path, size,
+    modification time and type (d, f, l, etc) of an entry separated by a
+    tab.
+
+    Only the type, size and modification time of each entry is kept (by
+    the directory it resides in).  A latency (in seconds) can be added to
+    each call to mimic a slow (network) filesystem.
+    """
+
+    # Nothing we change is real
+    real = False
+
+    def __init__(self, latency=0.0):
+        """
+        Initializes our (empty) filesystem
+        """
+        # The (type, size, mtime) of the entries in each directory (by name)
+        self._dirs = {}
+
+        # The time each call takes
+        self.latency = latency
+
+        # The entries read from our manifest (and the lines we couldn't)
+        self.entries = 0
+        self.skipped = 0
+
+    def load(self, path):
+        """
+        Reads the manifest specified into our filesystem
+        """
+        # Our paths are read exactly as they were written; they need not
+        # be valid in any encoding
+        with open(path, 'rb') as f:
+            for line in f:
+                line = fsdecode(line.rstrip(b'\r\n'))
+                if not line:
+                    continue
+
+                try:
+                    fullpath, size, mtime, kind = line.rsplit('\t', 3)
+                    self.add(fullpath, kind, int(size), float(mtime))
+
+                except ValueError:
+                    self.skipped += 1
+                    continue
+
+                self.entries += 1
+
+    def add(self, path, kind='f', size=0, mtime=None):
+        """
+        Adds an entry to our filesystem; the directories it resides in are
+        created if they don't already exist
+        """
+        if mtime is None:
+            mtime = time()
+
+        path = path.rstrip(os_separator) or os_separator
+        if kind == 'd':
+            self._dirs.setdefault(path, {})
+
+        # This is the same as (but much quicker than) using dirname() and
+        # basename()
+        parent, _, name = path.rpartition(os_separator)
+        if not name:
+            # Our root directory
+            return
+
+        parent = parent or os_separator
+        if parent not in self._dirs:
+            self.add(parent, 'd', 0, mtime)
+
+        self._dirs[parent][name] = (kind, size, mtime)
+
+    def _wait(self):
+        if self.latency:
+            sleep(self.latency)
+
+    def _lookup(self, path):
+        """
+        Returns the (type, size, mtime) of the path specified
+        """
+        parent, _, name = path.rpartition(os_separator)
+        try:
+            return self._dirs[parent or os_separator][name]
+
+        except KeyError:
+            raise OSError(ENOENT, strerror(ENOENT), path)
+
+    def _touch(self, path):
+        """
+        Updates the modification time of the directory specified (the same
+        as changing it's content would)
+        """
+        try:
+            kind, size, _ = self._lookup(path)
+
+        except OSError:
+            return
+
+        parent, _, name = path.rpartition(os_separator)
+        self._dirs[parent or os_separator][name] = (kind, size, time())
+
+    def _subtree(self, path):
+        """
+        Returns the directory specified and all of the directories within it
+        """
+        paths = [path]
+        for _path in paths:
+            paths.extend([
+                join(_path, name) for name, node in self._dirs[_path].items()
+                if node[0] == 'd' ])
+
+        return paths
+
+    def scandir(self, path):
+        self._wait()
+        try:
+            entries = self._dirs[path]
+
+        except KeyError:
+            raise OSError(ENOENT, strerror(ENOENT), path)
+
+        prefix = path.rstrip(os_separator) + os_separator
+        return [ VirtualEntry(prefix + name, name, kind, size, mtime)
+                 for name, (kind, size, mtime) in entries.items() ]
+
+    def stat(self, path):
+        self._wait()
+        return _virtual_stat(*self._lookup(path))
+
+    def isdir(self, path):
+        self._wait()
+        return path in self._dirs
+
+    def islink(self, path):
+        self._wait()
+        try:
+            return self._lookup(path)[0] == 'l'
+
+        except OSError:
+            return False
+
+    def lexists(self, path):
+        try:
+            self.stat(path)
+
+        except OSError:
+            return False
+
+        return True
+
+    def unlink(self, path):
+        self._wait()
+        if self._lookup(path)[0] == 'd':
+            raise OSError(EISDIR, strerror(EISDIR), path)
+
+        del self._dirs[dirname(path)][basename(path)]
+        self._touch(dirname(path))
+
+    def rmtree(self, path):
+        self._wait()
+        if path not in self._dirs:
+            raise OSError(ENOTDIR, strerror(ENOTDIR), path)
+
+        for _path in self._subtree(path):
+            del self._dirs[_path]
+
+        del self._dirs[dirname(path)][basename(path)]
+        self._touch(dirname(path))
+
+    def makedirs(self, path):
+        self._wait()
+        if self.lexists(path):
+            raise OSError(EEXIST, strerror(EEXIST), path)
+
+        self.add(path, 'd')
+        self._touch(dirname(path))
+
+    def rename(self, src, dst):
+        self._wait()
+        node = self._lookup(src)
+        if dirname(dst) not in self._dirs:
+            raise OSError(ENOENT, strerror(ENOENT), dst)
+
+        if dst in self._dirs:
+            raise OSError(EEXIST, strerror(EEXIST), dst)
+
+        if node[0] == 'd':
+            # Everything within our directory moves with it
+            for _path in self._subtree(src):
+                self._dirs[dst + _path[len(src):]] = self._dirs.pop(_path)
+
+        del self._dirs[dirname(src)][basename(src)]
+        self._dirs[dirname(dst)][basename(dst)] = node
+        self._touch(dirname(src))
+        self._touch(dirname(dst))
+
+    def link(self, src, dst):
+        self._wait()
+        node = self._lookup(src)
+        if node[0] == 'd':
+            raise OSError(EPERM, strerror(EPERM), src)
+
+        if dirname(dst) not in self._dirs:
+            raise OSError(ENOENT, strerror(ENOENT), dst)
+
+        if basename(dst) in self._dirs[dirname(dst)]:
+            raise OSError(EEXIST, strerror(EEXIST), dst)
+
+        self._dirs[dirname(dst)][basename(dst)] = node
+        self._touch(dirname(dst))
+
+    def copy(self, src, dst, copy_function=None):
+        self._wait()
+        node = self._lookup(src)
+        if dirname(dst) not in self._dirs:
+            raise OSError(ENOENT, strerror(ENOENT), dst)
+
+        if basename(dst) in self._dirs[dirname(dst)]:
+            raise OSError(EEXIST, strerror(EEXIST), dst)
+
+        if node[0] == 'd':
+            # Everything within our directory is copied with it
+            for _path in self._subtree(src):
+                self._dirs[dst + _path[len(src):]] = \
+                    dict(self._dirs[_path])
+
+        self._dirs[dirname(dst)][basename(dst)] = node
+        self._touch(dirname(dst))
+
+    def close(self):
+        pass
+
+
+def _entry_kind(entry):
+    """
+    Returns the type (d, f or ?) of the os.DirEntry specified
+    """
+    try:
+        if entry.is_dir():
+            return 'd'
+
+        if entry.is_file():
+            return 'f'
+
+    except OSError:
+        pass
+
+    return '?'
+
+
+def _encode_stat(stat_obj):
+    """
+    Returns the stat() specified in a form that can be written to a
+    recording
+    """
+    return [
+        stat_obj.st_mode, stat_obj.st_ino, stat_obj.st_dev,
+        stat_obj.st_nlink, stat_obj.st_uid, stat_obj.st_gid,
+        stat_obj.st_size, stat_obj.st_atime, stat_obj.st_mtime,
+        stat_obj.st_ctime,
+    ]
+
+
+class RecordedEntry(object):
+    """
+    An os.DirEntry whose stat() is written to a recording
+    """
+    __slots__ = ('name', 'path', '_entry', '_fs')
+
+    def __init__(self, entry, filesystem):
+        self.name = entry.name
+        self.path = entry.path
+        self._entry = entry
+        self._fs = filesystem
+
+    def is_dir(self, follow_symlinks=True):
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, follow_symlinks=True):
+        return self._entry.is_file(follow_symlinks=follow_symlinks)
+
+    def stat(self):
+        return self._fs._record(
+            {'op': 'stat', 'path': self.path}, self._entry.stat, (),
+            _encode_stat)
+
+
+class RecordingFilesystem(object):
+    """
+    Writes every call made to another filesystem (along with it's outcome)
+    to a file so that it can be replayed (with a ReplayFilesystem) later on.
+    Each line of the file is a JSON object identifying the call made, the
+    path it was made on and it's result (or the errno it failed with).
+    """
+
+    def __init__(self, filesystem, path):
+        """
+        Starts recording the calls made to the filesystem specified
+        """
+        self.filesystem = filesystem
+        self.real = filesystem.real
+        self.path = path
+        self.calls = 0
+
+        self._lock = threading.Lock()
+        self._file = open(path, 'w')
+
+    def _record(self, record, function, args, encode=None):
+        """
+        Makes a call and records it's outcome
+        """
+        try:
+            result = function(*args)
+
+        except OSError as e:
+            record['error'] = e.errno
+            self._write(record)
+            raise
+
+        record['result'] = encode(result) if encode else result
+        self._write(record)
+        return result
+
+    def _write(self, record):
+        line = json.dumps(record, sort_keys=True) + '\n'
+        with self._lock:
+            # Each line is written as a whole; our worker processes share
+            # our file with us
+            self._file.write(line)
+            self._file.flush()
+            self.calls += 1
+
+    def scandir(self, path):
+        return [ RecordedEntry(entry, self) for entry in self._record(
+            {'op': 'scandir', 'path': path},
+            self.filesystem.scandir, (path, ),
+            lambda listing: [ [e.name, _entry_kind(e)] for e in listing ]) ]
+
+    def stat(self, path):
+        return self._record(
+            {'op': 'stat', 'path': path}, self.filesystem.stat, (path, ),
+            _encode_stat)
+
+    def isdir(self, path):
+        return self._record(
+            {'op': 'isdir', 'path': path}, self.filesystem.isdir, (path, ))
+
+    def islink(self, path):
+        return self._record(
+            {'op': 'islink', 'path': path}, self.filesystem.islink, (path, ))
+
+    def lexists(self, path):
+        return self._record(
+            {'op': 'lexists', 'path': path}, self.filesystem.lexists,
+            (path, ))
+
+    def unlink(self, path):
+        self._record(
+            {'op': 'unlink', 'path': path}, self.filesystem.unlink, (path, ))
+
+    def rmtree(self, path):
+        self._record(
+            {'op': 'rmtree', 'path': path}, self.filesystem.rmtree, (path, ))
+
+    def makedirs(self, path):
+        self._record(
+            {'op': 'makedirs', 'path': path}, self.filesystem.makedirs,
+            (path, ))
+
+    def rename(self, src, dst):
+        self._record(
+            {'op': 'rename', 'path': src, 'target': dst},
+            self.filesystem.rename, (src, dst))
+
+    def link(self, src, dst):
+        self._record(
+            {'op': 'link', 'path': src, 'target': dst},
+            self.filesystem.link, (src, dst))
+
+    def copy(self, src, dst, copy_function):
+        self._record(
+            {'op': 'copy', 'path': src, 'target': dst},
+            self.filesystem.copy, (src, dst, copy_function))
+
+    def close(self):
+        self._file.close()
+        self.filesystem.close()
+
+
+class ReplayError(OSError):
+    """
+    Raised when a call is made to a ReplayFilesystem that was never recorded
+    """
+
+
+class ReplayEntry(VirtualEntry):
+    """
+    An entry found in a ReplayFilesystem; it's stat() is replayed too
+    """
+    __slots__ = ('_fs', )
+
+    def __init__(self, path, name, kind, filesystem):
+        VirtualEntry.__init__(self, path, name, kind, 0, 0)
+        self._fs = filesystem
+
+    def stat(self):
+        return self._fs.stat(self.path)
+
+
+class ReplayFilesystem(object):
+    """
+    Replays the calls written to a recording (by a RecordingFilesystem).
+    Each call is answered with the outcome recorded for the same call on
+    the same path; calls made more often than they were recorded are given
+    the last outcome again.  Calls that were never recorded fail (or are
+    answered with False) and are counted.  A latency (in seconds) can be
+    added to each call to mimic a slow (network) filesystem.
+    """
+
+    # Nothing we change is real
+    real = False
+
+    def __init__(self, path, latency=0.0):
+        """
+        Reads the recording specified
+        """
+        self.path = path
+        self.misses = 0
+
+        # The time each call takes
+        self.latency = latency
+
+        # The outcomes recorded (by call and path)
+        self._records = {}
+
+        with open(path, 'r') as f:
+            for line in f:
+                record = json.loads(line)
+                self._records.setdefault(
+                    (record['op'], record['path']), deque()).append(record)
+
+    def _replay(self, op, path):
+        """
+        Returns the outcome recorded for the call specified
+        """
+        if self.latency:
+            sleep(self.latency)
+
+        try:
+            records = self._records[(op, path)]
+
+        except KeyError:
+            self.misses += 1
+            raise ReplayError(ENOENT, '%s() was not recorded' % op, path)
+
+        record = records.popleft() if len(records) > 1 else records[0]
+        if 'error' in record:
+            raise OSError(record['error'], strerror(record['error']), path)
+
+        return record['result']
+
+    def scandir(self, path):
+        prefix = path.rstrip(os_separator) + os_separator
+        return [ ReplayEntry(prefix + name, name, kind, self)
+                 for name, kind in self._replay('scandir', path) ]
+
+    def stat(self, path):
+        return stat_result(tuple(self._replay('stat', path)))
+
+    def isdir(self, path):
+        try:
+            return self._replay('isdir', path)
+
+        except ReplayError:
+            return False
+
+    def islink(self, path):
+        try:
+            return self._replay('islink', path)
+
+        except ReplayError:
+            return False
+
+    def lexists(self, path):
+        try:
+            return self._replay('lexists', path)
+
+        except ReplayError:
+            return False
+
+    def unlink(self, path):
+        self._replay('unlink', path)
+
+    def rmtree(self, path):
+        self._replay('rmtree', path)
+
+    def makedirs(self, path):
+        self._replay('makedirs', path)
+
+    def rename(self, src, dst):
+        self._replay('rename', src)
+
+    def link(self, src, dst):
+        self._replay('link', src)
+
+    def copy(self, src, dst, copy_function):
+        self._replay('copy', src)
+
+    def close(self):
+        pass
+
+
+class CaptureHandler(logging.Handler):
+    """
+    A logging handler that stores the (level, message) of each record it
+    receives into the script's capture list.
+    """
+
+    def __init__(self, script):
+        logging.Handler.__init__(self)
+        self.script = script
+
+    def emit(self, record):
+        self.script._capture.append(
+            ('log', record.levelno, record.getMessage()))
+
+
+class PathDecoder(logging.Filter):
+    """
+    Decodes the names found in the messages logged that could not be
+    decoded with the encoding our operating system uses for it's paths.
+    Such names are kept (and acted on) exactly as they were read; they're
+    only decoded with the SystemEncoding configured when they are logged.
+    """
+
+    def __init__(self, encoding):
+        logging.Filter.__init__(self)
+        self.encoding = encoding
+
+    def _decode(self, match):
+        return match.group(0).encode('ascii', 'surrogateescape').decode(
+            self.encoding, 'replace')
+
+    def decode(self, text):
+        """
+        Returns the text specified with the bytes that couldn't be decoded
+        decoded with our encoding
+        """
+        return UNDECODED_RE.sub(self._decode, text)
+
+    def filter(self, record):
+        message = record.getMessage()
+        try:
+            # Nearly every message is free of undecoded names
+            message.encode('utf-8')
+            return True
+
+        except UnicodeError:
+            pass
+
+        if isinstance(message, bytes):
+            # Python v2.7
+            record.msg = message.decode(self.encoding, 'replace')
+
+        else:
+            # Only the bytes that couldn't be decoded are; the rest of our
+            # message is already text
+            record.msg = self.decode(message)
+
+        record.args = None
+        return True
+
+
+class LogCounter(logging.Handler):
+    """
+    A logging handler that counts the warnings and errors it receives
+    """
+
+    def __init__(self):
+        logging.Handler.__init__(self, logging.WARNING)
+        self.warnings = 0
+        self.errors = 0
+
+    def emit(self, record):
+        if record.levelno >= logging.ERROR:
+            self.errors += 1
+
+        else:
+            self.warnings += 1
+
+
+class MoveIndex(object):
+    """
+    Tracks the names already taken in each of the directories content is
+    moved into so that a free one can be found without having to ask the
+    filesystem about every candidate.  Each directory is only ever listed
+    the first time something is moved into it.
+    """
+
+    def __init__(self, scandir=scandir):
+        """
+        Initializes our (empty) index; directories are listed with the
+        scandir() specified
+        """
+        self._scandir = scandir
+
+        # The names taken (and whether or not they're a directory) by the
+        # directory they reside in
+        self._dirs = {}
+
+        # The next suffix worth trying for a name (by directory)
+        self._suffixes = {}
+
+        # The number of directories we've listed
+        self.listed = 0
+
+    def _names(self, path):
+        """
+        Returns the names taken in the directory specified
+        """
+        names = self._dirs.get(path)
+        if names is not None:
+            return names
+
+        names = {}
+        try:
+            for entry in self._scandir(path):
+                try:
+                    names[entry.name] = entry.is_dir()
+
+                except OSError:
+                    names[entry.name] = False
+
+        except OSError:
+            # The directory doesn't exist (yet)
+            pass
+
+        self._dirs[path] = names
+        self._suffixes[path] = {}
+        self.listed += 1
+        return names
+
+    def reserve(self, path, directory=False):
+        """
+        Returns the path specified if it's free; otherwise the next free
+        numbered version of it (.00001, .00002, etc) is.  Directories can
+        share the name of an existing directory (their content is merged).
+
+        The path returned is marked as taken.
+        """
+        parent, name = dirname(path), basename(path)
+        names = self._names(parent)
+
+        if name in names and not (directory and names[name]):
+            suffixes = self._suffixes[parent]
+            index = suffixes.get(name, 1)
+            while True:
+                _name = '%s.%.5d' % (name, index)
+                if _name not in names or (directory and names[_name]):
+                    break
+                index += 1
+
+            # We start where we left off next time
+            suffixes[name] = index + 1
+            name = _name
+            path = join(parent, name)
+
+        names[name] = directory
+
+        # Our directory is created if it doesn't already exist
+        _names = self._dirs.get(dirname(parent))
+        if _names is not None:
+            _names.setdefault(basename(parent), True)
+
+        return path
+
+    def forget(self, path):
+        """
+        Forgets what we know about the directory specified (and all of the
+        directories within it)
+        """
+        prefix = join(path, '')
+        for _path in [ p for p in self._dirs
+                       if p == path or p.startswith(prefix) ]:
+            del self._dirs[_path]
+            del self._suffixes[_path]
+
+
+class ActionQueue(object):
+    """
+    Hands the content we've decided to handle to a pool of threads (or
+    handles it right away if we only have the one).
+
+    A directory is only handled once everything queued within it has been.
+    If any of it could not be handled then the directory is left alone; the
+    same as if we had found content worth keeping in it.
+    """
+
+    def __init__(self, handler, threads=DEFAULT_ACTION_THREADS):
+        """
+        Initializes our queue; the handler is called with the path and
+        depth of each entry and returns False if it could not be handled.
+        """
+        self.handler = handler
+
+        # Our statistics
+        self.handled = 0
+        self.failed = 0
+        self.bytes = 0
+        self.started = None
+        self.elapsed = 0.0
+
+        # The time spent by our handler (across all of our threads)
+        self.busy = 0.0
+
+        # The number of actions outstanding (by the directory they're in)
+        self._pending = {}
+
+        # The directories containing content that could not be handled
+        self._kept = set()
+
+        self._lock = threading.Condition()
+        self._queue = None
+        self._threads = []
+
+        if threads > 1:
+            self._queue = Queue(threads * ACTION_QUEUE_DEPTH)
+            for _ in range(threads):
+                thread = threading.Thread(target=self._run)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def put(self, path, depth, size=0):
+        """
+        Queues the path specified to be handled.  False is returned if it
+        was left alone because some of it's content could not be handled.
+        The size is the number of bytes reclaimed once it is.
+        """
+        parent = dirname(path)
+        with self._lock:
+            if self.started is None:
+                self.started = time()
+
+            # Everything within us must be handled first
+            while self._pending.get(path):
+                self._lock.wait()
+
+            if path in self._kept:
+                # Our parent can no longer be handled either
+                self._kept.add(parent)
+                return False
+
+            self._pending[parent] = self._pending.get(parent, 0) + 1
+
+        if self._queue is None:
+            self._handle(path, depth, size)
+
+        else:
+            self._queue.put((path, depth, size))
+
+        return True
+
+    def _handle(self, path, depth, size):
+        """
+        Handles an action and tracks it's outcome
+        """
+        started = time()
+        okay = self.handler(path, depth)
+        elapsed = time() - started
+
+        parent = dirname(path)
+        with self._lock:
+            self.busy += elapsed
+            self._pending[parent] -= 1
+            if not self._pending[parent]:
+                del self._pending[parent]
+
+            if okay is False:
+                self._kept.add(parent)
+                self.failed += 1
+
+            else:
+                self.handled += 1
+                self.bytes += size
+
+            self._lock.notify_all()
+
+    def _run(self):
+        """
+        The body of our action threads
+        """
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            self._handle(*item)
+
+    def close(self):
+        """
+        Waits for everything queued to be handled
+        """
+        if self._queue is not None:
+            for _ in self._threads:
+                self._queue.put(None)
+
+            for thread in self._threads:
+                thread.join()
+
+            self._queue = None
+            self._threads = []
+
+        if self.started is not None:
+            self.elapsed = time() - self.started
+
+
+def _tidy_worker_init():
+    """
+    Prepares a (forked) process from our pool to scan content on behalf of
+    the process that created it.
+    """
+    script = TidyItScript._worker[0]
+
+    # Our parent looks after handling signals; it will terminate us
+    # when we're no longer needed
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # Capture our log entries so that our parent can write them in the
+    # same order a single process would have
+    script.logger.handlers = [CaptureHandler(script)]
+    script.logger.propagate = False
+
+    if script.scan_index is not None:
+        # SQLite connections can not be shared with our parent
+        script.scan_index.reopen()
+
+    # Threads do not survive a fork(); we'll create our own if we need them
+    script._stat_pool = None
+
+
+def _copy_fd(fd_src, fd_dst, size, progress=None):
+    """
+    Copies the content of one open file to another; the copy is made by
+    the kernel (copy_file_range() or sendfile()) when it can be so that
+    the content never has to pass through us.  The number of bytes copied
+    is returned.
+    """
+    # The ways we can copy; each is abandoned if it's not supported
+    methods = [ m for m in (copy_file_range, sendfile) if m is not None ]
+
+    copied = 0
+    reported = 0
+    while True:
+        if not methods:
+            # Copy it ourselves
+            data = os_read(fd_src, COPY_CHUNK_SIZE)
+            written = 0
+            while written < len(data):
+                written += os_write(fd_dst, data[written:])
+            count = len(data)
+
+        else:
+            try:
+                if methods[0] is copy_file_range:
+                    count = copy_file_range(fd_src, fd_dst, COPY_CHUNK_SIZE)
+
+                else:
+                    count = sendfile(fd_dst, fd_src, copied, COPY_CHUNK_SIZE)
+
+            except OSError as e:
+                if copied or e.errno not in \
+                        (EXDEV, EINVAL, ENOSYS, EOPNOTSUPP):
+                    raise
+
+                # Our kernel (or filesystem) can't do this; try the next way
+                methods.pop(0)
+                continue
+
+        if not count:
+            return copied
+
+        copied += count
+        if progress is not None and copied - reported >= COPY_PROGRESS_SIZE:
+            reported = copied
+            progress(copied, size)
+
+
+def _copy_file(src, dst, progress=None):
+    """
+    Copies the file src to dst (which must not already exist).  The
+    progress function (if specified) is called with the number of bytes
+    copied so far and the size of the file every now and then.  The number
+    of bytes copied is returned.
+    """
+    fd_src = os_open(src, O_RDONLY)
+    try:
+        fd_dst = os_open(dst, O_WRONLY | O_CREAT | O_EXCL, 0o666)
+        try:
+            copied = _copy_fd(
+                fd_src, fd_dst, fstat(fd_src).st_size, progress=progress)
+
+        except:
+            os_close(fd_dst)
+            try:
+                # Don't leave a partial copy behind
+                unlink(dst)
+
+            except OSError:
+                pass
+            raise
+
+        os_close(fd_dst)
+
+    finally:
+        os_close(fd_src)
+
+    try:
+        copystat(src, dst)
+
+    except OSError:
+        # The content is what matters
+        pass
+
+    return copied
+
+
+def memory_usage():
+    """
+    Returns the memory (in bytes) our process is using; the most it has
+    used is returned instead where that's all our operating system can
+    tell us.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+
+    except (IOError, OSError, ValueError, IndexError):
+        return peak_memory()
+
+
+def peak_memory():
+    """
+    Returns the most memory (in bytes) our process has used (or zero if
+    it can not be determined).
+    """
+    if resource is None:
+        return 0
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Reported in bytes on Mac OS X and kilobytes everywhere else
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _extrapolate(values, population):
+    """
+    Returns the estimated total of a population (along with the variance of
+    the estimate) from the values of a simple random sample of it.
+    """
+    n = len(values)
+    mean = float(sum(values)) / n
+    if n < 2 or n >= population:
+        # There is nothing to measure our variance with (or we have the
+        # entire population)
+        return mean * population, 0.0
+
+    variance = sum([ (v - mean) ** 2 for v in values ]) / (n - 1)
+    return mean * population, \
+        population ** 2 * (1.0 - float(n) / population) * variance / n
+
+
+def _stat_entry(entry):
+    """
+    Performs a stat() on the os.DirEntry specified; the result is cached
+    within the entry itself.
+    """
+    try:
+        entry.stat()
+
+    except OSError:
+        # tidy_library() will deal with this when it gets to it
+        pass
+
+
+def _tidy_worker(path, stat_obj, depth, ref_time, stat_threads):
+    """
+    Scans the path specified and returns the TidyCode along with a list of
+    everything our parent needs to do with it (log entries, content to
+    handle, scan index updates) and our filesystem counters.
+    """
+    script, options = TidyItScript._worker
+    script._stat_threads = stat_threads
+    script._capture = []
+    script._reset_counters()
+
+    if script.scan_index is not None:
+        script.scan_index.reset()
+        script.scan_index.journal = script._capture
+
+    code = script.tidy_library(
+        path, __current_depth=depth, __stat_obj=stat_obj, __ref_time=ref_time,
+        **options)
+
+    return code, script._capture, script._counters()
+
+
+class TidyItScript(SchedulerScript):
+    """A Media Library Tidying tool written for NZBGet
+    """
+
+    # Our pool of worker processes (if one is in use)
+    _pool = None
+
+    # The (script, options) our worker processes operate with
+    _worker = None
+
+    # When set to a list, actions are recorded into it instead of being
+    # performed; this is how our worker processes report back to us
+    _capture = None
+
+    # Our scan index (if one is in use)
+    scan_index = None
+
+    # The number of threads used to stat() the entries of the library being
+    # scanned and the pool of threads doing so (if one is in use)
+    _stat_threads = DEFAULT_STAT_THREADS
+    _stat_pool = None
+
+    # The file our action plan is written to (if one is being written)
+    _plan = None
+
+    # The queue the content we handle is passed through
+    _actions = None
+
+    # The number of seconds anything must take before it's reported on (if
+    # we're tracing what's slow)
+    _trace_slow = None
+
+    # The time our scan must stop by (if it's time budgeted) and the library
+    # root it applies to
+    _deadline = None
+    _budgeted = None
+
+    # The cursor our scan resumed from (and the one it stopped at) if it
+    # was time budgeted
+    _cursor = None
+    _cursor_next = None
+
+    # Whether or not our scan resumed from where an earlier one left off
+    _resumed = False
+
+    # The last show/movie directory in our time budgeted library root that
+    # we've finished scanning
+    _finished = None
+
+    # The modification time of the directories we've scanned (if we're
+    # tracking them for a rerun)
+    _seen = None
+
+    # The filesystem our libraries are scanned (and tidied) through
+    _fs = OSFilesystem()
+
+    # Whether or not the age of content is taken from it's change time too
+    _use_ctime = False
+
+    # Decodes the path names we log with our SystemEncoding
+    _path_decoder = None
+
+    # The names taken in the directories we move content into (and the
+    # lock our action threads share it with)
+    _move_index = None
+    _move_lock = None
+
+    # Whether or not each of our libraries resides on the same device as
+    # our move path and the number of items (and bytes) we've moved; each
+    # run (of each script) has it's own
+    _move_devices = None
+    _moves = None
+
+    def _re_str(self, re_str):
+        """
+        Support custom RE provided by this script where * becomes .*
+        and ? becomes .
+        """
+        return re.sub(
+            '\*', '.*', re.sub(
+            '\?', '.', re.sub(
+            '\)', '\\)', re.sub(
+            '\^', '\\^', re.sub(
+            '\.', '\\.', re_str,
+        )))))
+
+    def _handle(self, path, depth):
+        """
+        A Simple wrapper to handle content in addition to logging it.
+        """
+
+        if not self._fs.isdir(path):
+            # File Removal
+            if self.mode == TIDYIT_MODE.DELETE:
+                try:
+                    self._fs.unlink(path)
+                    self.logger.info('Removed FILE: %s' % path)
+                except:
+                    self.logger.error('Could not removed FILE: %s' % path)
+                    return False
+
+            elif self.mode == TIDYIT_MODE.MOVE:
+                # Using the depth, we need to determine the path we're
+                # generating for the new file
+                tmp_fullpath = join(
+                    self.move_path,
+                    os_separator.join(os_path_split(path)[-depth:]),
+                )
+
+                return self._move_file(path, tmp_fullpath)
+
+            else:
+                self.logger.info('PREVIEW ONLY: Handle FILE: %s' % path)
+        else:
+            # Directory Removal
+            if self.mode == TIDYIT_MODE.DELETE:
+                try:
+                    self._fs.rmtree(path)
+                    self.logger.info('Removed DIRECTORY: %s' % path)
+                except:
+                    self.logger.error('Could not remove DIRECTORY: %s' % path)
+                    return False
+
+            elif self.mode == TIDYIT_MODE.MOVE:
+                # Using the depth, we need to determine the path we're
+                # generating for the new file
+                tmp_fullpath = join(
+                    self.move_path,
+                    os_separator.join(os_path_split(path)[-depth:]),
+                )
+
+                # Directories are usually already handled because
+                # they contain files and have already been created and
+                # set up... but just to be bulletproof; this will handle
+                # situations where a file exists where a directory should
+                # be.
+                with self._move_lock:
+                    tmp_fullpath = self._move_index.reserve(
+                        tmp_fullpath, directory=True)
+
+                tmp_dirname = dirname(tmp_fullpath)
+                if not self._fs.isdir(tmp_dirname):
+                    try:
+                        self._fs.makedirs(tmp_dirname)
+                    except Exception as e:
+                        self.logger.error(
+                            'Could not create move path: %s' % tmp_dirname,
+                        )
+                        self.logger.debug('makedirs() Exception %s' % str(e))
+
+                if not self._fs.isdir(tmp_fullpath):
+                    # Now create our directory path if it doesn't exist
+                    try:
+                        self._move(path, tmp_fullpath, directory=True)
+                        self.logger.info('Moved DIRECTORY: %s' % path)
+
+                        # Our index of what was in it is no longer valid
+                        with self._move_lock:
+                            self._move_index.forget(tmp_fullpath)
+
+                    except Exception as e:
+                        self.logger.error('Could not move DIRECTORY: %s' % path)
+                        self.logger.debug('Move Exception %s' % str(e))
+                        return False
+
+                # Now that content has been backed up properly, we can
+                # safely remove the source directory
+                if self._fs.isdir(path):
+                    try:
+                        self._fs.rmtree(path)
+                        self.logger.info(
+                            'Removed (already backed up) ' + \
+                            'DIRECTORY: %s' % path,
+                        )
+                    except:
+                        self.logger.error(
+                            'Could not remove (already backed up) ' + \
+                            'DIRECTORY: %s' % path,
+                        )
+                        return False
+            else:
+                self.logger.info('PREVIEW ONLY: Handle DIRECTORY: %s' % path)
+
+        return True
+
+    def _move_file(self, path, tmp_fullpath):
+        """
+        Moves a file to the path specified (or the next free numbered
+        version of it if it's already taken)
+        """
+        tmp_dirname = dirname(tmp_fullpath)
+        if not self._fs.isdir(tmp_dirname):
+            try:
+                self._fs.makedirs(tmp_dirname)
+            except Exception as e:
+                self.logger.error(
+                    'Could not create move path: %s' % tmp_dirname,
+                )
+                self.logger.debug('makedirs() Exception %s' % str(e))
+
+        while True:
+            # Handle duplicate files; our index tells us which names are
+            # already taken (including the ones our other action threads
+            # are in the middle of moving files to)
+            with self._move_lock:
+                _new_path = self._move_index.reserve(tmp_fullpath)
+
+            if self._fs.lexists(_new_path):
+                # Something outside of our control took the name after we
+                # indexed it's directory; it's now marked as taken so we'll
+                # be given the next one
+                continue
+
+            try:
+                self._move(path, _new_path)
+                self.logger.info('Moved FILE: %s' % path)
+
+            except OSError as e:
+                if e.errno == EEXIST:
+                    # The name was taken after we checked it; our file is
+                    # never moved over the top of it
+                    continue
+
+                self.logger.error('Could not move FILE: %s' % path)
+                self.logger.debug('Move Exception %s' % str(e))
+                return False
+
+            except Exception as e:
+                self.logger.error('Could not move FILE: %s' % path)
+                self.logger.debug('Move Exception %s' % str(e))
+                return False
+
+            return True
+
+    def _move(self, path, target, directory=False):
+        """
+        Moves a file or directory to the target specified.  Content residing
+        on the same device as our move path is simply renamed; otherwise it
+        is copied there and then removed.
+
+        A file is never moved over the top of one that already exists at
+        the target; an OSError (EEXIST) is raised instead.
+        """
+        if self._move_same_device(path) is not False:
+            try:
+                if directory:
+                    self._fs.rename(path, target)
+
+                else:
+                    self._link(path, target)
+
+                with self._move_lock:
+                    self._moves['renamed'] += 1
+                return
+
+            except OSError as e:
+                if e.errno != EXDEV:
+                    raise
+                # The content resides on a device mounted within our
+                # library; we have to copy it after all
+
+        if directory and not self._fs.islink(path):
+            self._fs.copy(path, target, self._copy)
+            self._fs.rmtree(path)
+
+        else:
+            # A symbolic link is moved; not what it points to
+            self._fs.copy(path, target, self._copy)
+            self._fs.unlink(path)
+
+        with self._move_lock:
+            self._moves['copied'] += 1
+
+    def _link(self, src, dst):
+        """
+        Renames a file without replacing anything found at the destination.
+        A rename() would silently replace a file that took the name after
+        we checked it; a (hard) link to it fails instead.
+        """
+        try:
+            self._fs.link(src, dst)
+
+        except OSError as e:
+            if e.errno not in (EPERM, EMLINK, ENOSYS, EOPNOTSUPP):
+                raise
+
+            # Our filesystem doesn't support hard links; a rename is as
+            # close as we can get
+            self._fs.rename(src, dst)
+            return
+
+        self._fs.unlink(src)
+
+    def _copy(self, src, dst):
+        """
+        Copies a file to another device (tracking the number of bytes we
+        had to)
+        """
+        def progress(copied, size):
+            self.logger.debug('Copied %d of %d bytes of %s' % (
+                copied, size, src))
+
+        copied = _copy_file(src, dst, progress=progress)
+        with self._move_lock:
+            self._moves['bytes'] += copied
+
+        return dst
+
+    def _move_same_device(self, path):
+        """
+        Returns True if the path specified resides on the same device as our
+        move path, False if it doesn't and None if we don't know.
+        """
+        for root, same in self._move_devices.items():
+            if path == root or path.startswith(join(root, '')):
+                return same
+
+        return None
+
+    def _check_devices(self, paths):
+        """
+        Determines which of our libraries reside on the same device as our
+        move path (and warns of the ones that don't)
+        """
+        if self.mode != TIDYIT_MODE.MOVE:
+            return
+
+        # Our move path doesn't have to exist yet; it will be created on
+        # the same device as the nearest directory above it that does
+        path = self.move_path
+        while True:
+            try:
+                device = self._fs.stat(path).st_dev
+                break
+
+            except OSError:
+                if dirname(path) == path:
+                    return
+                path = dirname(path)
+
+        different = []
+        for path in paths:
+            try:
+                same = self._fs.stat(path).st_dev == device
+
+            except OSError:
+                # tidy_library() will deal with this when it gets to it
+                continue
+
+            self._move_devices[abspath(path)] = same
+            if not same:
+                different.append(path)
+
+        if different:
+            self.logger.warning(
+                'The following libraries reside on a different device than '
+                'the move path %s; content moved from them must be copied: '
+                '%s' % (self.move_path, ', '.join(different)))
+
+    def _scandir(self, path):
+        """
+        Returns a list of os.DirEntry objects found in the path specified or
+        None if the directory could not be read.
+
+        The directory is only ever read once; the DirEntry objects returned
+        cache their type (and stat() once called) so that no further
+        filesystem calls are needed to make decisions on them.
+        """
+        # Track our directory read
+        self._fs_calls += 1
+        started = time()
+        try:
+            return self._fs.scandir(path)
+
+        except OSError as e:
+            self.logger.warning('Path %s could not be listed.' % path)
+            self.logger.debug('scandir() Exception %s' % str(e))
+
+        finally:
+            elapsed = time() - started
+            self._timings['list'] += elapsed
+            self._trace('list', path, elapsed)
+
+        return None
+
+    def _act(self, path, depth, category, reason, size=None, mtime=None):
+        """
+        Handles the path specified (or defers it to our parent process if
+        we're one of it's workers).  The category and reason it's being
+        handled (along with the size and modification time of it if we
+        have them) are recorded in our action plan (if we're writing one).
+        """
+        if self._capture is not None:
+            self._capture.append(
+                ('handle', path, depth, category, reason, size, mtime))
+            return True
+
+        if self._plan is not None:
+            self._plan_write(path, depth, category, reason, size, mtime)
+
+        if size is None or category == TidyCategory.DIRECTORY:
+            size = 0
+
+        self._planned_categories[category][0] += 1
+        self._planned_categories[category][1] += size
+
+        if self._actions is None:
+            return self._handle(path, depth)
+
+        if not self._actions.put(path, depth, size):
+            self.logger.warning(
+                'Left DIRECTORY: %s; some of it\'s content could not be '
+                'handled.' % path)
+            return False
+
+        return True
+
+    def _plan_write(self, path, depth, category, reason, size=None, mtime=None):
+        """
+        Writes an entry to our action plan
+        """
+        if size is None:
+            try:
+                # OS meta content is never stat()'ed while scanning
+                self._fs_calls += 1
+                stat_obj = self._fs.stat(path)
+                size, mtime = stat_obj.st_size, stat_obj.st_mtime
+
+            except OSError:
+                # It will not pass verification when the plan is applied
+                pass
+
+        self._plan.write(json.dumps({
+            'path': path,
+            'category': category,
+            'size': size,
+            'depth': depth,
+            'reason': reason,
+            'mtime': mtime,
+        }, sort_keys=True) + '\n')
+        self._planned += 1
+
+    def _stat_entries(self, entries):
+        """
+        Performs a stat() on all of the os.DirEntry objects specified using
+        our pool of threads.  The results are cached within the entries
+        themselves.
+        """
+        if self._stat_pool is None or \
+                self._stat_pool[0] != self._stat_threads:
+            if self._stat_pool is not None:
+                self._stat_pool[1].close()
+
+            self._stat_pool = \
+                (self._stat_threads, ThreadPool(self._stat_threads))
+
+        self._stat_pool[1].map(_stat_entry, entries, chunksize=1)
+
+    def _prefetch(self, listing, depth, ref_time):
+        """
+        Hands the sub-directories found in the listing specified to our
+        pool of workers to scan.  They are handed out in the same order
+        tidy_library() will want their results in.
+
+        A dictionary of the pending results (by path) is returned.
+        """
+        pending = {}
+        for entry in reversed(listing):
+            if entry.name in self.tidysafe_entries or \
+                    entry.name in self.meta_entries or \
+                    entry.name in METADIRS:
+                continue
+
+            if self._exclude is not None and self._exclude.match(entry.path):
+                # tidy_library() stays out of these
+                continue
+
+            try:
+                if not entry.is_dir():
+                    continue
+                stat_obj = entry.stat()
+
+            except OSError:
+                # tidy_library() will deal with this when it gets to it
+                continue
+
+            pending[entry.path] = self._pool.apply_async(
+                _tidy_worker,
+                (entry.path, stat_obj, depth, ref_time, self._stat_threads))
+
+        return pending
+
+    def _collect(self, result):
+        """
+        Waits for the result of a sub-directory scanned by one of our
+        workers and then replays everything it reported (in order) as
+        though we scanned it ourselves.  The TidyCode is returned.
+        """
+        code, capture, counters = result.get()
+        for entry in capture:
+            if entry[0] == 'log':
+                self.logger.log(entry[1], entry[2])
+
+            elif entry[0] == 'handle':
+                self._act(*entry[1:])
+
+            elif entry[0] == 'store':
+                self.scan_index.store(*entry[1:])
+
+            elif entry[0] == 'taint':
+                self.scan_index.taint(entry[1])
+
+        self._merge_counters(counters)
+        return code
+
+    def _reset_counters(self):
+        """
+        Resets the counters we track during a run
+        """
+        self._dirs_scanned = 0
+        self._fs_calls = 0
+        self._fs_calls_legacy = 0
+        self._categories = dict([ (c, 0) for c in TIDY_CATEGORIES ])
+
+        # The time spent in each phase of our scan
+        self._timings = dict([ (p, 0.0) for p in SCAN_PHASES ])
+
+        # The (time, path) of the slowest directories we've read
+        self._slow_dirs = []
+
+        # The directories left alone because of the memory they needed (and
+        # the most memory used by any of our processes)
+        self._memory_skipped = 0
+        self._peak_memory = 0
+
+        # The number (and bytes) of the items we planned to handle in each
+        # category
+        self._planned_categories = dict(
+            [ (c, [0, 0]) for c in PLAN_CATEGORIES ])
+
+        # The excluded directories we stayed out of (and the directories
+        # protected by a safe entry)
+        self._excluded = 0
+        self._protected = 0
+
+        if self._seen is not None:
+            self._seen = {}
+
+        if self.scan_index is not None:
+            self.scan_index.hits = 0
+            self.scan_index.misses = 0
+
+    def _counters(self):
+        """
+        Returns a dictionary of the counters we've tracked so far
+        """
+        return {
+            'dirs_scanned': self._dirs_scanned,
+            'fs_calls': self._fs_calls,
+            'fs_calls_legacy': self._fs_calls_legacy,
+            'categories': self._categories,
+            'timings': self._timings,
+            'slow_dirs': self._slow_dirs,
+            'memory_skipped': self._memory_skipped,
+            'peak_memory': peak_memory(),
+            'excluded': self._excluded,
+            'protected': self._protected,
+            'seen': self._seen,
+            'index_hits':
+                self.scan_index.hits if self.scan_index is not None else 0,
+            'index_misses':
+                self.scan_index.misses if self.scan_index is not None else 0,
+        }
+
+    def _merge_counters(self, counters):
+        """
+        Merges the counters (from one of our workers) into our own
+        """
+        self._dirs_scanned += counters['dirs_scanned']
+        self._fs_calls += counters['fs_calls']
+        self._fs_calls_legacy += counters['fs_calls_legacy']
+        for category, count in counters['categories'].items():
+            self._categories[category] += count
+
+        for phase, elapsed in counters['timings'].items():
+            self._timings[phase] += elapsed
+
+        for elapsed, path in counters['slow_dirs']:
+            self._slow(path, elapsed)
+
+        self._memory_skipped += counters['memory_skipped']
+        self._excluded += counters['excluded']
+        self._protected += counters['protected']
+        self._peak_memory = max(self._peak_memory, counters['peak_memory'])
+
+        if self._seen is not None:
+            self._seen.update(counters['seen'])
+
+        if self.scan_index is not None:
+            self.scan_index.hits += counters['index_hits']
+            self.scan_index.misses += counters['index_misses']
+
+    def _budget(self, path, listing):
+        """
+        Prepares the listing of the library root specified to be scanned
+        within our time budget.  The entries are sorted (so that a later
+        run can find where we left off) and the directories an earlier
+        run already scanned are split from the rest.
+        """
+        self._budgeted = path
+
+        # Entries are popped off of the end
+        listing = sorted(listing, key=lambda e: e.name, reverse=True)
+
+        resume = None
+        if self._cursor is not None and self._cursor['root'] == path:
+            resume = self._cursor['entry']
+            if resume is not None:
+                self.logger.info('Resuming %s after %s' % (path, resume))
+
+        # Nothing is finished until we say so (other then what an earlier
+        # run already finished with)
+        self._finished = resume
+
+        _listing = []
+        skipped = []
+        for entry in listing:
+            if entry.name in METADIRS or not entry.is_dir():
+                # Only show/movie directories are worth skipping over
+                _listing.append(entry)
+                continue
+
+            self._coverage[0] += 1
+            if resume is not None and entry.name <= resume:
+                skipped.append(entry)
+                continue
+
+            _listing.append(entry)
+
+        self._coverage[1] += len(skipped)
+        return _listing, skipped
+
+    def _stop(self, state):
+        """
+        Stops the scan of the library root the TidyState specified refers
+        to (because we ran out of time) and returns it's TidyCode.  The
+        entries left are recorded so that the next run can pick up from
+        where we left off.
+        """
+        path = state.path
+        dirents = state.dirents
+
+        # The directories we've finished with won't be looked at again
+        # until our next pass; so we handle the ones that were found to be
+        # empty now
+        for fullpath, category, reason, size, mtime in state.tidylist:
+            if reason == 'dir':
+                self._act(
+                    fullpath, state.depth, category, reason, size, mtime)
+
+        # Everything we popped off of our listing has been scanned; our
+        # next run picks up after the last show/movie directory we finished
+        # with
+        self._cursor_next = {
+            'root': path,
+            'entry': self._finished,
+        }
+
+        # The directories we never made it to
+        self._coverage[2] = len([
+            entry for dirent, entry in dirents
+            if dirent not in METADIRS and entry.is_dir()
+            and os_separator not in dirent ])
+
+        if self._finished is None:
+            self.logger.info(
+                'Maximum run time reached; stopping before scanning anything '
+                'in %s.' % path)
+
+        else:
+            self.logger.info(
+                'Maximum run time reached; stopping after %s in %s.' % (
+                    self._finished, path))
+
+        # Nothing left in our library root is touched
+        return TidyCode.IGNORE
+
+    def _load_cursor(self, paths):
+        """
+        Loads the cursor a previous (time budgeted) run left behind and
+        returns the library paths left to be scanned.  Time budgeted runs
+        always scan our libraries in the same (sorted) order so that the
+        ones before the cursor are the ones an earlier run finished.
+        """
+        self._cursor = None
+        self._cursor_next = None
+        self._resumed = False
+
+        # The show/movie directories found in our libraries, the ones an
+        # earlier run already scanned and the ones we never made it to
+        self._coverage = [0, 0, 0]
+
+        if self._deadline is None or not self._cursor_file:
+            return paths
+
+        paths = sorted(paths, key=abspath)
+
+        try:
+            with open(self._cursor_file, 'r') as f:
+                cursor = json.load(f)
+
+            root, entry = cursor['root'], cursor['entry']
+            index = [ abspath(p) for p in paths ].index(root)
+
+        except (IOError, OSError):
+            # There is no cursor; we're starting a new pass of our libraries
+            return paths
+
+        except (ValueError, TypeError, KeyError):
+            self.logger.warning(
+                'Ignoring cursor %s; it does not match the libraries being '
+                'scanned.' % self._cursor_file)
+            return paths
+
+        self._cursor = cursor
+        self._resumed = True
+        self.logger.debug(
+            'Cursor %s left off after %s in %s' % (
+                self._cursor_file, entry, root))
+
+        # Libraries before the one we left off in were already scanned
+        return paths[index:]
+
+    def _save_cursor(self):
+        """
+        Saves (or clears) our cursor and reports on how much of our
+        libraries have been covered
+        """
+        if self._deadline is None:
+            return
+
+        covered = self._coverage[0] - self._coverage[1] - self._coverage[2]
+        runs = 1
+        total = covered
+        if self._cursor is not None:
+            runs += self._cursor.get('runs', 0)
+            total += self._cursor.get('covered', 0)
+
+        self.logger.info(
+            'Scanned %d show/movie director(ies) this run; %d over the last '
+            '%d run(s).' % (covered, total, runs))
+
+        if self._cursor_next is None:
+            if self._cursor is not None:
+                self.logger.info(
+                    'Completed a full scan of your libraries over %d run(s).'
+                    % runs)
+
+            if self._cursor_file and exists(self._cursor_file):
+                try:
+                    unlink(self._cursor_file)
+
+                except OSError as e:
+                    self.logger.warning(
+                        'Cursor %s could not be removed.' % self._cursor_file)
+                    self.logger.debug('unlink() Exception %s' % str(e))
+
+            return
+
+        if not self._cursor_file:
+            self.logger.warning(
+                'No cursor file was specified; the next run will start over.')
+            return
+
+        cursor = dict(self._cursor_next, runs=runs, covered=total)
+        tmp_file = '%s.tmp' % self._cursor_file
+        try:
+            with open(tmp_file, 'w') as f:
+                json.dump(cursor, f, sort_keys=True)
+
+            rename(tmp_file, self._cursor_file)
+
+        except (IOError, OSError) as e:
+            self.logger.warning(
+                'Cursor %s could not be written.' % self._cursor_file)
+            self.logger.debug('write() Exception %s' % str(e))
+
+    def _trace(self, phase, path, elapsed):
+        """
+        Reports on anything that took longer than we were told to expect
+        (if we were told to)
+        """
+        if self._trace_slow is not None and elapsed >= self._trace_slow:
+            self.logger.info(
+                'Slow %s took %.1fms: %s' % (phase, elapsed * 1000, path))
+
+    def _traced_handle(self, path, depth):
+        """
+        Handles the path specified; tracing it if it's slow to do so
+        """
+        started = time()
+        try:
+            return self._handle(path, depth)
+
+        finally:
+            self._trace('action', path, time() - started)
+
+    def _slow(self, path, elapsed):
+        """
+        Tracks the time it took to read the directory specified (if it's one
+        of the slowest we've seen)
+        """
+        if len(self._slow_dirs) < SLOW_DIRECTORIES:
+            heappush(self._slow_dirs, (elapsed, path))
+
+        elif elapsed > self._slow_dirs[0][0]:
+            heapreplace(self._slow_dirs, (elapsed, path))
+
+    def _verdict(self, path, stat_obj, code, subdirs):
+        """
+        Returns the code specified after storing it into our scan index
+        (if one is in use).
+        """
+        if self.scan_index is not None:
+            self.scan_index.store(path, stat_obj, code, subdirs)
+        return code
+
+    def tidy_library(self, path, extensions, extras, minsize, minage, keep_dirs, *args, **kwargs):
+        """
+          - Scans a library path (depth first) and returns the TidyCode of
+            it.
+
+          But the path library will be skewed if changes are determiend to happen.
+          - If a directory contains another directory within it; it will never
+            be removed.
+              - If a meta directory exists, it will not be considered as part
+                of this rule.
+            The directory passed into the function (for the first time
+            will 'never' be removed reguardless of scanned outcome
+
+          - if keep_dirs is set to True, then directoreies are NOT removed.
+
+          The library is walked with a stack of TidyState objects (one for
+          each directory we're part way through) rather than recursion so
+          that there is no limit to how deep a library can be.
+        """
+        # Internal Tracking of Directory Depth
+        # A depth of 0 is a 'safe' directory that will
+        # never be removed
+        current_depth = kwargs.get('__current_depth', 1)
+
+        # Our parent directory has already performed a stat() on us while
+        # it was looking through it's own listing; there is no need to
+        # request it again
+        stat_obj = kwargs.get('__stat_obj')
+
+        # Anything modified after this time is too new to be touched; it's
+        # only ever calculated once for the entire scan
+        ref_time = kwargs.get('__ref_time')
+        if ref_time is None:
+            ref_time = time() - minage
+
+        # Change to absolute path; it's how our filesystem (and any manifest
+        # it was loaded from) knows it
+        path = abspath(path)
+
+        if stat_obj is None:
+            self._fs_calls += 1
+            if not self._fs.isdir(path):
+                if current_depth == 1 and \
+                        isinstance(self._fs, MemoryFilesystem):
+                    self.logger.warning(
+                        'Library %s was not found in the manifest.' % path)
+
+                # Not a directory? then return a value that will prevent
+                # the file/block from being removed (non-zero)
+                return TidyCode.IGNORE
+
+        if current_depth == 1:
+            self.logger.info('Scanning %s' % path)
+
+        state = self._tidy_enter(
+            path, current_depth, stat_obj, ref_time, minsize, minage)
+        if not isinstance(state, TidyState):
+            # We already have our answer
+            return state
+
+        # The directories we're part way through scanning; the last one is
+        # the one we're currently in
+        stack = [state]
+
+        # The verdict of the last directory we finished with
+        code = None
+
+        while len(stack):
+            state = self._tidy_resume(
+                stack[-1], code, ref_time, minsize, minage, keep_dirs)
+
+            if isinstance(state, TidyState):
+                # We have a sub-directory to scan first
+                stack.append(state)
+                code = None
+                continue
+
+            # We're done with this directory; our parent (if there is one)
+            # gets our verdict
+            stack.pop()
+            code = state
+
+        return code
+
+    def _tidy_enter(self, path, depth, stat_obj, ref_time, minsize, minage):
+        """
+        Reads the directory specified and returns the TidyState needed to
+        scan it.  If the verdict of the directory can be determined without
+        having to look any further (it's too new, inaccessible or is
+        unchanged since we last indexed it) then the TidyCode is returned
+        instead.
+        """
+        # Check absolute path date (because we don't want to
+        # process anything in it if it was touched recently)
+        try:
+            if stat_obj is None:
+                self._fs_calls += 1
+                stat_obj = self._fs.stat(path)
+
+            modified = stat_obj.st_mtime
+            if self._use_ctime and stat_obj.st_ctime > modified:
+                # Content moved in keeps it's modification time
+                modified = stat_obj.st_ctime
+
+            if self._seen is not None:
+                # We can tell if it changed later on (anything too new to
+                # be looked at is always looked at again)
+                self._seen[path] = \
+                    stat_obj.st_mtime if modified < ref_time else None
+
+            if depth > 1 and modified >= ref_time:
+                # We're done; directory is to new
+                self.logger.debug('Skipping %s; modified less than %ds ago.' % (
+                    path,
+                    minage,
+                ))
+                if self.scan_index is not None:
+                    self.scan_index.taint(path)
+                return TidyCode.IGNORE
+
+        except OSError:
+            # The directory suddently became inaccessible
+            self.logger.warning(
+                'Path %s is inaccessible.' % path,
+            )
+            if self.scan_index is not None:
+                self.scan_index.taint(path)
+            # Since the directory is missing (or inaccessible
+            # due to permissions) return an IGNORE on it
+            return TidyCode.IGNORE
+
+        if self.scan_index is not None and depth > 1:
+            # Nothing has changed since we last looked here, so our previous
+            # verdict still stands
+            code = self.scan_index.lookup(path, stat_obj)
+            if code is not None:
+                self.logger.debug('Unchanged %s; using indexed verdict.' % path)
+                return code
+
+        # Only the memory used from here on counts against our directory
+        memory = memory_usage() if self._max_memory else 0
+
+        # Get All Entries; this is the only time we read this directory
+        scanned = time()
+        listing = self._scandir(path)
+        if listing is None:
+            # The directory could not be read; play it safe
+            if self.scan_index is not None:
+                self.scan_index.taint(path)
+            return TidyCode.IGNORE
+
+        self._dirs_scanned += 1
+
+        # A safe entry protects everything in our directory; there's no
+        # need to look any further at it (or anything within it)
+        names = [ entry.name for entry in listing ]
+        safe = self.tidysafe_entries.intersection(names)
+        if safe:
+            self.logger.debug(
+                'Safe entry %s found in %s' % (sorted(safe)[0], path))
+            self._protected += 1
+            elapsed = time() - scanned
+            self._slow(path, elapsed)
+            self._trace('scan', path, elapsed)
+            return self._verdict(path, stat_obj, TidyCode.IGNORE, [])
+
+        skipped = []
+        if depth == 1 and self._deadline is not None:
+            # Our scan is on the clock
+            listing, skipped = self._budget(path, listing)
+
+        # An estimate of what this directory would have cost if it was read
+        # once with get_files() and again with listdir() (each entry paying
+        # for it's own isdir(), isfile() and stat() calls); it's only ever
+        # reported alongside the calls we actually issued
+        self._fs_calls_legacy += 6 + (2 * len(listing))
+
+        state = TidyState(path, depth, stat_obj)
+        state.memory = memory
+
+        if self._stat_threads > 1:
+            # Our library is slow to respond to each stat(); so we request
+            # all of them at once (meta entries are never stat'ed)
+            _entries = [ entry for entry in listing
+                         if entry.name not in self.meta_entries and not (
+                             self._exclude is not None and
+                             self._exclude.match(entry.path)) ]
+            if len(_entries) > 1:
+                started = time()
+                self._stat_entries(_entries)
+                elapsed = time() - started
+                self._timings['stat'] += elapsed
+                self._trace('stat', path, elapsed)
+                self._fs_calls += len(_entries)
+                state.stated.update([ entry.path for entry in _entries ])
+            del _entries
+
+        # First check for the goods; we may not have to do
+        # further processing otherwise
+        for entry in listing:
+            started = time()
+            category = self.classifier.classify(entry.name)[0]
+            self._timings['classify'] += time() - started
+
+            if category not in (TidyCategory.VIDEO, TidyCategory.SAMPLE) or \
+                    not entry.is_file():
+                continue
+
+            try:
+                # Store Filesize (DirEntry caches this for us)
+                self._fs_calls_legacy += 3
+                if entry.path not in state.stated:
+                    self._fs_calls += 1
+                    state.stated.add(entry.path)
+
+                started = time()
+                size = entry.stat().st_size
+                elapsed = time() - started
+                self._timings['stat'] += elapsed
+                self._trace('stat', entry.path, elapsed)
+
+                if size < minsize:
+                    continue
+
+            except OSError:
+                # The file became inaccessible
+                continue
+
+            if category == TidyCategory.SAMPLE:
+                self.logger.debug(
+                    'Skipping - Ignored file: %s' % entry.name)
+                continue
+
+            state.valid_paths.append(entry.path)
+            state.siblings.add(entry.path)
+
+        # Track how long it took to read our directory (and look up the
+        # details of it's content)
+        elapsed = time() - scanned
+        self._slow(path, elapsed)
+        self._trace('scan', path, elapsed)
+
+        if len(state.valid_paths):
+            # at least one valid file was found in this directory
+            # but it doesn't rule out the fact the possibility of
+            # movie files existing in further sub directories.
+            # so we flag this as a safe dir and keep processing
+
+            # The easiest way to mark a directory safe is to just
+            # toggle the current_depth to one (1).
+            state.depth = 1
+
+        # OS meta content is only ever handled if our directory is found to
+        # be empty; it's set aside now and never looked at again
+        meta = self.meta_entries.intersection(names)
+        if meta:
+            for entry in reversed(listing):
+                if entry.name in meta:
+                    self.logger.debug(
+                        'Potential handling (os meta data): %s' % entry.path)
+                    state.remove_if_empty.append(
+                        (entry.path, TidyCategory.OS_METADATA,
+                         'os meta data', None, None))
+
+        # Our entries are paired with the name we reference them by (which
+        # is relative to the path we're scanning)
+        state.dirents = [ (entry.name, entry) for entry in listing
+                          if entry.name not in meta ]
+
+        for entry in skipped:
+            # An earlier run already took care of these; they're treated as
+            # if they were found worth keeping
+            state.subdirs.append(entry.name)
+            state.valid_paths.append(entry.path)
+            state.siblings.add(entry.path)
+
+        if self._pool is not None and depth == 1 and len(listing) > 1:
+            state.prefetched = self._prefetch(
+                listing, state.depth + 1, ref_time)
+
+        return state
+
+    def _tidy_resume(self, state, code, ref_time, minsize, minage, keep_dirs):
+        """
+        Continues scanning the directory the TidyState specified refers to.
+        The code is the verdict of the sub-directory we were last waiting
+        on (if we were).
+
+        The TidyState of a sub-directory that must be scanned before we
+        can continue is returned; otherwise the TidyCode of our directory
+        is once we've finished with it.
+        """
+        if state.pending is not None:
+            # Our sub-directory has been scanned
+            dirent, fullpath, stat_obj = state.pending
+            state.pending = None
+            self._tidy_subdir(state, dirent, fullpath, stat_obj, code, keep_dirs)
+
+        path = state.path
+        dirents = state.dirents
+        valid_paths = state.valid_paths
+        tidylist = state.tidylist
+        remove_if_empty = state.remove_if_empty
+
+        while len(dirents):
+
+            if path == self._budgeted and time() >= self._deadline:
+                # We're out of time; we'll pick up from here next time
+                return self._stop(state)
+
+            if self._max_memory and \
+                    not (len(dirents) - 1) % MEMORY_CHECK_INTERVAL and \
+                    memory_usage() - state.memory > self._max_memory:
+                # Everything we've read and planned is held on to until
+                # we're done with our directory; we can't afford to hold on
+                # to more (we always check before our last entry too)
+                self.logger.warning(
+                    'Skipping %s; scanning it would use more than the '
+                    '%dMB of memory allowed.' % (
+                        path, self._max_memory // 1048576))
+                self._memory_skipped += 1
+                if self.scan_index is not None:
+                    self.scan_index.taint(path)
+                return TidyCode.IGNORE
+
+            # Pop directory entry
+            dirent, entry = dirents.pop()
+
+            if path == self._budgeted and dirent not in METADIRS and \
+                    os_separator not in dirent and entry.is_dir():
+                # It's been scanned by the time we're back to look at our
+                # next entry (and the clock)
+                self._finished = dirent
+
+            # Build absolute path with it
+            fullpath = entry.path
+
+            if self._exclude is not None and self._exclude.match(fullpath) \
+                    and entry.is_dir():
+                # We were asked to stay out of this directory; it's treated
+                # as though it held something worth keeping
+                self.logger.debug('Excluded %s' % fullpath)
+                self._excluded += 1
+                valid_paths.append(fullpath)
+                state.siblings.add(fullpath)
+                continue
+
+            try:
+                self._fs_calls_legacy += 3
+                if fullpath not in state.stated:
+                    self._fs_calls += 1
+
+                started = time()
+                stat_obj = entry.stat()
+                elapsed = time() - started
+                self._timings['stat'] += elapsed
+                self._trace('stat', fullpath, elapsed)
+                modified = stat_obj.st_mtime
+                if self._use_ctime and stat_obj.st_ctime > modified:
+                    # Content moved in keeps it's modification time
+                    modified = stat_obj.st_ctime
+
+                if modified >= ref_time:
+                    # We're done; directory is to new
+                    self.logger.debug('Skipping %s; %s was modified less than %ds ago.' % (
+                        path,
+                        dirent,
+                        minage,
+                    ))
+                    if self.scan_index is not None:
+                        self.scan_index.taint(path)
+                    return TidyCode.IGNORE
+
+            except OSError:
+                # The directory suddently became inaccessible
+                self.logger.warning(
+                    'Path %s became inaccessible.' % fullpath,
+                )
+                if self.scan_index is not None:
+                    self.scan_index.taint(path)
+                # Since the directory is missing, return 0 letting
+                # recursively called situations go ahead and handle
+                # this directory
+                continue
+
+            # Store Filesize (and modification time); it's all we hold on to
+            # for the content we plan to handle
+            size = stat_obj[ST_SIZE]
+            mtime = stat_obj.st_mtime
+
+            if entry.is_dir():
+                if dirent in METADIRS:
+                    if len(valid_paths) == 0:
+                        # Meta content is useless to us if the directory
+                        # is empty
+                        tidylist.append(
+                            (fullpath, TidyCategory.DIRECTORY, 'metadata', size, mtime))
+                        self.logger.debug('Planned handling (metadata): %s' % fullpath)
+                    else:
+                        # Meta data exists, the best way to tackle this is
+                        # to append it to the current dirent list to be
+                        # processed
+                        _listing = self._scandir(fullpath)
+                        if _listing is None:
+                            # We can't see what is in our meta directory
+                            if self.scan_index is not None:
+                                self.scan_index.taint(path)
+                            return TidyCode.IGNORE
+
+                        # Our meta directory contents are now part of our
+                        # own verdict
+                        state.subdirs.append(dirent)
+                        if self.scan_index is not None:
+                            self.scan_index.store(fullpath, stat_obj, None, [])
+
+                        self._fs_calls_legacy += 1
+                        dirents.extend([ (join(dirent, e.name), e) for e in _listing ])
+
+                    # Next File
+                    continue
+
+                if fullpath in state.prefetched:
+                    # One of our workers already scanned this for us
+                    code = self._collect(state.prefetched.pop(fullpath))
+
+                else:
+                    # Continue scanning with our sub-directory
+                    code = self._tidy_enter(
+                        fullpath, state.depth + 1, stat_obj, ref_time,
+                        minsize, minage)
+
+                    if isinstance(code, TidyState):
+                        # We need to look through it first; we'll pick up
+                        # where we left off when it's done
+                        state.pending = (dirent, fullpath, stat_obj)
+                        return code
+
+                self._tidy_subdir(state, dirent, fullpath, stat_obj, code, keep_dirs)
+
+                # Next File
+                continue
+
+            if entry.is_file():
+                # Classify our file
+                started = time()
+                category, stem = self.classifier.classify(entry.name)
+                self._timings['classify'] += time() - started
+                self._categories[category] += 1
+
+                # Match against extras as a way of safeguarding
+                if category in (TidyCategory.VIDEO, TidyCategory.SAMPLE):
+                    if len(valid_paths) == 0:
+                        # We found a video file in a situation where
                         # there were no 'valid' ones; This is caused by the
                         # filesize not meeting the defined requirements or it
                         # was defined in the IGNORE_FILELIST and it's the last
                         # remaining content found in the directory
-                        tidylist.append(fullpath)
+                        tidylist.append(
+                            (fullpath, category, 'invalid video', size, mtime))
                         self.logger.debug('Planned handling (invalid video): %s' % fullpath)
                     # Next File
                     continue
 
-                # Meta Information
-                found = False
-                for regex in MEDIAMETA_FILES_RE:
-                    if regex.search(basename(dirent)):
-                        found = True
-                        # Break for() loop
-                        break
-                if found:
-                    # Add file to tidy if empty queue
-                    self.logger.debug('Potential handling (meta data): %s' % fullpath)
-                    remove_if_empty.append(fullpath)
-                    # Next File
+                # Meta Information
+                if category == TidyCategory.MEDIAMETA:
+                    # Add file to tidy if empty queue
+                    self.logger.debug('Potential handling (meta data): %s' % fullpath)
+                    remove_if_empty.append(
+                        (fullpath, category, 'meta data', size, mtime))
+                    # Next File
+                    continue
+
+                # Filesize
+                if size == 0:
+                    # Zero byte files are never good
+                    tidylist.append(
+                        (fullpath, category, 'zero byte file', size, mtime))
+                    self.logger.debug('Planned handling (zero byte file): %s' % fullpath)
+                    continue
+
+                # Match against always trash items (if configured to do so)
+                elif category == TidyCategory.ALWAYS_TRASH:
+                    # we found a file we flagged to always be trashed when
+                    # matched
+                    tidylist.append(
+                        (fullpath, category, 'marked for trash', size, mtime))
+                    self.logger.debug('Planned handling (marked for trash): %s' % fullpath)
+                    # Next File
+                    continue
+
+                if len(valid_paths) > 0 and category == TidyCategory.EXTRA:
+                    # Handle alike files; we look for the video our
+                    # file belongs to in order to decide it's fate
+                    owner = state.siblings.lookup(stem)
+
+                    if owner is None:
+                        # We didn't find anything on an
+                        # Alike match
+                        tidylist.append(
+                            (fullpath, category, 'no alike match', size, mtime))
+                        self.logger.debug('Planned handling (no alike match): %s' % fullpath)
+
+                    elif owner[1]:
+                        # We have a good match (against the directory)
+                        self.logger.debug('%s belongs to (dir) %s' % (
+                            dirent,
+                            owner[0],
+                        ))
+
+                    else:
+                        # We have a good match!
+                        self.logger.debug('%s belongs to %s' % (
+                            dirent,
+                            owner[0],
+                        ))
+
+                    # Next File since we handled or at
+                    # least matched an Alike file
+                    continue
+
+            # If we make it to the end, we scanned a file
+            # that does not meet filtering criterias
+
+            # This is like a safe file.  We don't know what it is; so we don't
+            # want to avoid destroying something we shouldn't
+            self.logger.debug('Unhandled entry found: %s (safe-guarded)' % fullpath)
+            return self._verdict(
+                path, state.stat, TidyCode.IGNORE, state.subdirs)
+
+        if len(valid_paths) == 0:
+            # we successfully handled every file/dir
+            # in the current directory and there were no
+            # valid files found in the list
+
+            # Append the remove_if_empty list in this
+            # scenario
+            tidylist.extend(remove_if_empty)
+
+        # We only tidy the parent if all of it's children
+        # are gone
+        for fullpath, category, reason, size, mtime in tidylist:
+            self._act(fullpath, state.depth, category, reason, size, mtime)
+
+        if len(tidylist) and self.scan_index is not None:
+            # Our directory contents were (or in a preview would have been)
+            # altered; we want to take another look next time
+            self.scan_index.taint(path)
+
+        if len(valid_paths):
+            # We have a media directory worth keeping
+            return self._verdict(
+                path, state.stat, TidyCode.IGNORE, state.subdirs)
+
+        if state.depth > 1:
+            return self._verdict(
+                path, state.stat, TidyCode.REMOVE, state.subdirs)
+
+        return self._verdict(path, state.stat, TidyCode.IGNORE, state.subdirs)
+
+    def _tidy_subdir(self, state, dirent, fullpath, stat_obj, code, keep_dirs):
+        """
+        Applies the TidyCode a sub-directory was given to the TidyState
+        of the directory it resides in.
+        """
+        state.subdirs.append(dirent)
+
+        if code == TidyCode.IGNORE:
+            # Add this directory back to the
+            # valid paths to prevent it from being
+            # removed later
+            state.valid_paths.append(fullpath)
+            state.siblings.add(fullpath)
+
+        elif code == TidyCode.REMOVE:
+            # We got instructions to remove
+            # the directory
+            if not keep_dirs:
+                state.tidylist.append(
+                    (fullpath, TidyCategory.DIRECTORY, 'dir',
+                     stat_obj.st_size, stat_obj.st_mtime))
+                self.logger.debug('Planned handling (dir): %s' % fullpath)
+
+
+    def _configure(self):
+        """
+        Prepares our script using the options it was provided.
+
+        The paths to scan are returned along with the keyword arguments
+        tidy_library() should be called with. None is returned if the
+        configuration is not valid.
+        """
+
+        if not self.validate(keys=(
+            'Mode',
+            'MovePath',
+            'VideoPaths',
+            'AlwaysTrash',
+            'MetaContent',
+            'VideoMinSize',
+            'ProcessMinAge',
+            'VideoExtensions',
+            'SafeEntries',
+            'VideoExtras',
+            'SystemEncoding')):
+
+            return None
+
+        # Nothing we've moved (or learned about moving) is shared with
+        # another script or carried over from an earlier run
+        self._move_lock = threading.Lock()
+        self._move_devices = {}
+        self._moves = {'renamed': 0, 'copied': 0, 'bytes': 0}
+
+        # Fix mode to object (self.*)
+        self.mode = self.get('Mode', TIDYIT_MODE_DEFAULT)
+        if self.mode not in TIDYIT_MODES:
+            self.logger.error('The specified mode "%s" is not supported.' % self.mode)
+            return None
+
+        # Fix tidy-safe entries to object (self.*)
+        self.tidysafe_entries = set(self.parse_list(self.get('SafeEntries', DEFAULT_TIDYSAFE_ENTRIES)))
+
+        # Store Move Path
+        self.move_path = tidy_path(self.get('MovePath', DEFAULT_MOVE_PATH))
+        if self.move_path:
+            # Convert to absolute path if possible
+            self.move_path = abspath(self.move_path)
+
+        if self.mode == TIDYIT_MODE.MOVE and not self.move_path:
+            # Fall back to preview mode if no move path is specified
+            self.mode = TIDYIT_MODE.PREVIEW
+            self.logger.warning('MovePath not specified; falling back to Preview Mode.')
+
+        # Remaining Environment Variables; lists are sorted so that the
+        # expressions built from them (and the fingerprint of our scan
+        # index) are the same from one run to the next
+        video_extensions = sorted(self.parse_list(self.get('VideoExtensions', DEFAULT_VIDEO_EXTENSIONS)))
+        video_minsize = int(self.get('VideoMinSize', DEFAULT_VIDEO_MIN_SIZE_MB)) * 1048576
+        minage = int(self.get('ProcessMinAge', DEFAULT_MATCH_MINAGE))
+        encoding = self.get('SystemEncoding', DEFAULT_SYSTEM_ENCODING)
+        try:
+            encoding = codec_lookup(encoding).name
+
+        except LookupError:
+            self.logger.warning(
+                'The specified encoding "%s" is not supported; using %s.' % (
+                    encoding, FS_ENCODING))
+            encoding = FS_ENCODING
+
+        if self._path_decoder is None:
+            self._path_decoder = PathDecoder(encoding)
+            self.logger.addFilter(self._path_decoder)
+
+        else:
+            self._path_decoder.encoding = encoding
+        paths = self.parse_path_list(self.get('VideoPaths'))
+        self.meta_entries = self.parse_list(self.get('MetaContent', OS_METADATA_ENTRIES))
+
+        # Directory Handling
+        keep_dirs = self.parse_bool(
+            self.get('KeepDirectories', DEFAULT_KEEP_DIRECTORY_SWITCH))
+
+        # Age Handling
+        self._use_ctime = self.parse_bool(
+            self.get('AgeFromChangeTime', DEFAULT_AGE_FROM_CHANGE_TIME))
+
+        # Create Unique List of Meta Entries
+        self.meta_entries = set(list(self.meta_entries) + list(OS_METADATA_ENTRIES))
+        self.logger.debug('Meta Entries set to: "%s"' % '", "'.join(self.meta_entries))
+
+        # Extra Managing - build regular expressions based on input
+        video_extras = sorted(self.parse_list(self.get('VideoExtras', '')))
+
+        # Start ourselves off with an extras list
+        extras = [ x for x in VIDEO_ALIKE_FILES_RE ]
+
+        if len(video_extras):
+            _extras = '%s' % '|'.join(video_extras)
+            _extras = '^(?P<filename>.*)(' + self._re_str(_extras) + ')$'
+            try:
+                __extras = re.compile('(%s)$' % _extras, re.IGNORECASE)
+                self.logger.debug('Compiled regex "(%s)"' % _extras)
+                # insert our extras to the head of our list
+                extras.insert(0, __extras)
+            except:
+                self.logger.warning(
+                    'Invalid regular expression: "(%s)$"' % _extras,
+                )
+
+        if not len(video_extensions):
+            self.logger.error('No video extensions were specified.')
+            return None
+
+        _extensions = r'%s' % '|'.join(video_extensions)
+        _extensions = self._re_str(_extensions)
+        try:
+            extensions = re.compile(r'(%s)$' % _extensions, re.IGNORECASE)
+            self.logger.debug('Compiled regex "(%s)$"' % _extensions)
+        except:
+            self.logger.warning(
+                'Invalid regular expression: "(%s)$"' % _extensions,
+            )
+
+        # Trash Managing - build regular expressions based on input
+        always_trash_entries = sorted(self.parse_list(self.get('AlwaysTrash', [])))
+
+        # By Default; Always Trash is Disabled (Safer this way)
+        self.always_trash = None
+        if len(always_trash_entries):
+            _always_trash = '%s' % '|'.join(always_trash_entries)
+            _always_trash = self._re_str(_always_trash)
+            try:
+                self.always_trash = re.compile('(%s)$' % _always_trash, re.IGNORECASE)
+                self.logger.debug('Compiled "Always Trash" regex "(%s)$"' % _always_trash)
+            except:
+                # Disable option (Safer this way)
+                self.logger.warning(
+                    'Invalid "Always Trash" regular expression: "(%s)$"' % _always_trash,
+                )
+
+        # Excluded Paths - one regular expression matches all of them
+        # (within each of our libraries)
+        self._exclude = None
+        # They're parsed the same way our Video Paths are (directory names
+        # can hold spaces) one line at a time
+        exclude_paths = sorted(self.parse_path_list(*str(self.get(
+            'ExcludePaths', DEFAULT_EXCLUDE_PATHS)).splitlines()))
+        if len(exclude_paths) and len(paths):
+            _exclude = '^(%s)%s(%s)$' % (
+                '|'.join(sorted([ re.escape(abspath(p).rstrip(os_separator))
+                                  for p in paths ])),
+                re.escape(os_separator),
+                '|'.join([ glob_re(x) for x in exclude_paths ]),
+            )
+            self._exclude = re.compile(_exclude)
+            self.logger.debug('Compiled "Excluded Paths" regex "%s"' % _exclude)
+
+        # Concurrent stat() handling; this can be specified per library
+        self.stat_threads = {None: DEFAULT_STAT_THREADS}
+        for entry in str(self.get(
+                'StatThreads', DEFAULT_STAT_THREADS)).split(','):
+            entry = entry.strip()
+            if not entry:
+                continue
+
+            _path, _, threads = entry.rpartition('=')
+            try:
+                threads = max(1, int(threads))
+
+            except ValueError:
+                self.logger.warning(
+                    'An invalid number of stat threads (%s) was specified.' %
+                    entry)
+                continue
+
+            self.stat_threads[
+                abspath(tidy_path(_path.strip())) if _path else None] = \
+                threads
+
+        # Scan Index Managing
+        self.scan_index = None
+        scan_index = tidy_path(self.get('ScanIndex', DEFAULT_SCAN_INDEX))
+        if scan_index:
+            try:
+                self.scan_index = ScanIndex(
+                    abspath(scan_index),
+                    # Any change to the following will invalidate the
+                    # verdicts already stored in our index
+                    fingerprint=ScanIndex.fingerprint(
+                        extensions.pattern,
+                        [ x.pattern for x in extras ],
+                        self.always_trash.pattern \
+                            if self.always_trash is not None else None,
+                        sorted(self.tidysafe_entries),
+                        sorted(self.meta_entries),
+                        self._exclude.pattern \
+                            if self._exclude is not None else None,
+                        video_minsize,
+                        minage,
+                        self._use_ctime,
+                        keep_dirs,
+                    ),
+                    rebuild=self.parse_bool(self.get('RebuildIndex', False)),
+                )
+                self.logger.debug('Using scan index %s' % self.scan_index.path)
+
+            except (sqlite3.Error, OSError) as e:
+                # We can still do our job; just slower
+                self.logger.warning(
+                    'Scan index %s could not be opened; ignoring.' % scan_index)
+                self.logger.debug('ScanIndex() Exception %s' % str(e))
+
+        # Our filename classifier
+        self.classifier = FilenameClassifier(
+            extensions, extras, always_trash=self.always_trash)
+
+        # Time budgeted scans
+        self._max_runtime = 0
+        try:
+            self._max_runtime = abs(int(
+                self.get('MaxRuntime', DEFAULT_MAX_RUNTIME)))
+
+        except (TypeError, ValueError):
+            self.logger.warning(
+                'An invalid maximum run time (%s) was specified.' %
+                self.get('MaxRuntime'))
+
+        self._cursor_file = tidy_path(
+            self.get('CursorFile', DEFAULT_CURSOR_FILE))
+        if self._cursor_file:
+            self._cursor_file = abspath(self._cursor_file)
+
+        # Memory bounded scans
+        self._max_memory = 0
+        try:
+            self._max_memory = abs(int(
+                self.get('MaxMemory', DEFAULT_MAX_MEMORY))) * 1048576
+
+        except (TypeError, ValueError):
+            self.logger.warning(
+                'An invalid maximum memory (%s) was specified.' %
+                self.get('MaxMemory'))
+
+        # Slow operation tracing
+        self._trace_slow = None
+        trace_slow = self.get('TraceSlow', DEFAULT_TRACE_SLOW)
+        if trace_slow:
+            try:
+                self._trace_slow = abs(float(trace_slow)) / 1000.0
+
+            except (TypeError, ValueError):
+                self.logger.warning(
+                    'An invalid slow trace threshold (%s) was specified.' %
+                    trace_slow)
+
+        # Filesystem call (and classification) tracking
+        self._reset_counters()
+
+        return paths, {
+            'extensions': extensions,
+            'extras': extras,
+            'minsize': video_minsize,
+            'minage': minage,
+            'keep_dirs': keep_dirs,
+        }
+
+    def _watch_tree(self, inotify, path, parent=None):
+        """
+        Watches the directory specified and every directory beneath it
+        (meta directories are not included).  The number of directories
+        that could not be watched is returned.
+        """
+        failures = 0
+        stack = [(path, parent)]
+        while len(stack):
+            path, parent = stack.pop()
+            try:
+                wd = inotify.add(path, parent=parent)
+
+            except OSError as e:
+                failures += 1
+                self.logger.debug('inotify_add_watch() Exception %s' % str(e))
+                continue
+
+            listing = self._scandir(path)
+            if listing is None:
+                continue
+
+            stack.extend([ (e.path, wd) for e in listing
+                if e.name not in self.meta_entries and
+                    e.is_dir(follow_symlinks=False) and not (
+                        self._exclude is not None and
+                        self._exclude.match(e.path)) ])
+
+        return failures
+
+    def watch(self, paths, options):
+        """
+        Watches the paths specified (using inotify) for any changes. The
+        directories in which changes were detected are tidied once they've
+        been left alone for at least the ProcessMinAge.
+
+        Only the affected top level directory of a library (the show or
+        movie) is scanned again.  Changes found in the library root itself
+        cause the whole library to be scanned again (which is where the
+        use of a ScanIndex pays off).
+        """
+        try:
+            inotify = Inotify()
+
+        except OSError as e:
+            self.logger.error('Watch mode is not supported: %s' % str(e))
+            return False
+
+        # Our root paths (by their watch descriptor)
+        roots = {}
+
+        failures = 0
+        for path in paths:
+            path = abspath(path)
+            if not isdir(path):
+                continue
+
+            failures += self._watch_tree(inotify, path)
+            try:
+                # Watching the same directory again just returns the watch
+                # descriptor it already has
+                roots[inotify.add(path)] = path
+
+            except OSError:
+                continue
+
+        if failures:
+            self.logger.warning(
+                '%d directories could not be watched; you may need to '
+                'increase fs.inotify.max_user_watches.' % failures)
+
+        self.logger.info(
+            'Watching %d directories for changes.' % len(inotify))
+
+        # The items we're waiting to scan; the key is a tuple of the library
+        # root and the name of the top level directory in it (None if the
+        # root itself should be scanned). The value is the time the scan
+        # should take place.
+        pending = {}
+
+        # We wait at least our minimum age after the last detected change
+        delay = max(options['minage'] + 1, DEFAULT_WATCH_DEBOUNCE)
+
+        try:
+            while True:
+                timeout = None
+                if pending:
+                    timeout = max(0, min(pending.values()) - time())
+
+                for wd, mask, cookie, name in inotify.read(timeout):
+                    if mask & IN_Q_OVERFLOW:
+                        # We missed some events; rescan everything
+                        self.logger.warning(
+                            'inotify queue overflow; scheduling a full scan.')
+                        for root in roots.values():
+                            pending[(root, None)] = time() + delay
+                        continue
+
+                    if mask & IN_IGNORED:
+                        # Our directory is gone
+                        inotify.forget(wd)
+                        continue
+
+                    chain = inotify.chain(wd)
+                    if not chain:
+                        # Not a directory we know about
+                        continue
+
+                    if mask & IN_MOVE_SELF:
+                        if not isdir(inotify.path(wd)):
+                            # The directory moved out of our library; so
+                            # did everything beneath it
+                            inotify.remove(wd)
+                        continue
+
+                    if mask & IN_DELETE_SELF:
+                        # IN_IGNORED will follow
+                        continue
+
+                    if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) \
+                            and name not in self.meta_entries:
+                        # A new directory we want to watch too
+                        failures = self._watch_tree(
+                            inotify, join(inotify.path(wd), name), parent=wd)
+                        if failures:
+                            self.logger.warning(
+                                '%d directories could not be watched.' %
+                                failures)
+
+                    root = roots[chain[0]]
+                    if len(chain) > 1:
+                        # Our show/movie directory
+                        key = (root, inotify.path(chain[1])[len(root):]
+                               .lstrip(os_separator))
+
+                    elif mask & IN_ISDIR:
+                        # A show/movie directory in our root
+                        key = (root, name)
+
+                    else:
+                        # Content in our root
+                        key = (root, None)
+
+                    # Reset our clock
+                    pending[key] = time() + delay
+                    self.logger.vdebug(
+                        'Change detected in %s' % join(root, key[1] or ''))
+
+                now = time()
+                for key in [ k for k, v in pending.items() if v <= now ]:
+                    del pending[key]
+                    self._tidy_watched(key[0], key[1], options)
+
+        except KeyboardInterrupt:
+            self.logger.info('Watch mode interrupted; stopping.')
+
+        inotify.close()
+        return True
+
+    def _tidy_watched(self, root, name, options):
+        """
+        Tidies the top level directory (name) found in a library root. If
+        no name is specified, then the root itself is tidied.
+        """
+        if self.scan_index is not None:
+            # Forget our previous verifications; they may no longer be true
+            self.scan_index.reset()
+
+        self._library(root)
+        if name is None:
+            self.tidy_library(root, **options)
+
+        else:
+            path = join(root, name)
+            if self._exclude is not None and self._exclude.match(path):
+                # We were asked to stay out of it
+                return
+
+            self._fs_calls += 1
+            if not self._fs.isdir(path):
+                # It's already gone
+                return
+
+            for entry in self.tidysafe_entries:
+                self._fs_calls += 1
+                if self._fs.lexists(join(root, entry)):
+                    # Our library root is protected
+                    self.logger.debug(
+                        'Safe entry %s found in %s' % (entry, root))
+                    return
+
+            # Scan our directory as if it was found by our library root
+            code = self.tidy_library(path, __current_depth=2, **options)
+            if code == TidyCode.REMOVE and not options['keep_dirs']:
+                self._act(path, 1, TidyCategory.DIRECTORY, 'dir')
+
+        if self.scan_index is not None:
+            self.scan_index.commit()
+
+    def _lock(self, paths):
+        """
+        Locks the library paths specified so that no other copy of this
+        script can tidy them while we are.  The paths we were able to lock
+        are returned; the others are left to the copy already tidying them.
+        """
+        self._locks = {}
+        self._seen = None
+
+        if not self._fs.real:
+            # We're not changing anything
+            return paths
+
+        if fcntl is None:
+            self.logger.debug('Library locking is not supported.')
+            return paths
+
+        overlap = self.get('OverlapMode', DEFAULT_OVERLAP_MODE).lower()
+        if overlap not in OVERLAP_MODES:
+            self.logger.warning(
+                'The specified overlap mode "%s" is not supported.' % overlap)
+            overlap = DEFAULT_OVERLAP_MODE
+
+        lock_dir = tidy_path(
+            self.get('LockDirectory', DEFAULT_LOCK_DIRECTORY)) or gettempdir()
+
+        _paths = []
+        for path in paths:
+            lock_file = join(abspath(lock_dir), 'tidyit-%s.lock' % sha1(
+                fsencode(abspath(path))).hexdigest()[:16])
+
+            try:
+                fd = os_open(lock_file, O_RDWR | O_CREAT, 0o644)
+
+            except OSError as e:
+                self.logger.warning(
+                    'Lock file %s could not be opened; %s is not locked.' % (
+                        lock_file, path))
+                self.logger.debug('open() Exception %s' % str(e))
+                _paths.append(path)
+                continue
+
+            try:
+                fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+            except (IOError, OSError):
+                # Another copy of us is tidying this library
+                os_close(fd)
+                if overlap == 'rerun':
+                    try:
+                        open('%s.rerun' % lock_file, 'w').close()
+                        self.logger.info(
+                            '%s is already being tidied; a rerun was '
+                            'requested.' % path)
+                        continue
+
+                    except (IOError, OSError) as e:
+                        self.logger.debug('open() Exception %s' % str(e))
+
+                self.logger.info(
+                    '%s is already being tidied; skipping.' % path)
+                continue
+
+            if exists('%s.rerun' % lock_file):
+                # We're about to take care of what was requested
+                try:
+                    unlink('%s.rerun' % lock_file)
+
+                except OSError:
+                    pass
+
+            self._locks[path] = (fd, lock_file)
+            _paths.append(path)
+
+        if overlap == 'rerun':
+            # Track our directories so that we can tell what changed
+            self._seen = {}
+
+        return _paths
+
+    def _unlock(self):
+        """
+        Releases the locks we hold on our libraries and returns the ones
+        a rerun is still requested in
+        """
+        requested = []
+        for path, (fd, lock_file) in self._locks.items():
+            os_close(fd)
+            if exists('%s.rerun' % lock_file):
+                # Requested after we last checked for it
+                requested.append(path)
+
+        self._locks = {}
+        self._seen = None
+        return requested
+
+    def _rerun(self, options):
+        """
+        Scans the directories that changed while we were running again in
+        the libraries another copy of this script asked us to.  This is
+        repeated until no more reruns are requested.
+        """
+        while self._seen is not None:
+            requested = [
+                path for path, (fd, lock_file) in self._locks.items()
+                if exists('%s.rerun' % lock_file) ]
+
+            if not requested:
+                break
+
+            for path in requested:
+                try:
+                    unlink('%s.rerun' % self._locks[path][1])
+
+                except OSError:
+                    pass
+
+                # The show/movie directories (or the root itself) that
+                # changed since we scanned them
+                root = abspath(path)
+                changed = set()
+                for _path, mtime in list(self._seen.items()):
+                    if _path != root and \
+                            not _path.startswith(root + os_separator):
+                        continue
+
+                    try:
+                        self._fs_calls += 1
+                        if self._fs.stat(_path).st_mtime == mtime:
+                            continue
+
+                    except OSError:
+                        # It's gone
+                        del self._seen[_path]
+                        continue
+
+                    changed.add(
+                        _path[len(root):].lstrip(os_separator)
+                        .split(os_separator)[0] or None)
+
+                self.logger.info(
+                    'Rerun requested; changes were found in %d '
+                    'director(ies) of %s.' % (len(changed), path))
+
+                if None in changed:
+                    self._tidy_watched(root, None, options)
+                    continue
+
+                for name in sorted(changed):
+                    self._tidy_watched(root, name, options)
+
+    def _summarize(self):
+        """
+        Reports on (and wraps up) a run
+        """
+        self.logger.info(
+            'Scanned %d directories; %d filesystem call(s) issued (an '
+            'estimated %d would have been issued reading each directory '
+            'twice and checking each entry on it\'s own).' % (
+                self._dirs_scanned,
+                self._fs_calls,
+                self._fs_calls_legacy,
+            ))
+
+        if self._exclude is not None:
+            self.logger.info(
+                'Stayed out of %d excluded director(ies).' % self._excluded)
+
+        self.logger.info(
+            'Protected %d director(ies) with a safe entry.' % self._protected)
+
+        self.logger.info(
+            'Classified %d file(s): %s.' % (
+                sum(self._categories.values()),
+                ', '.join([ '%d %s' % (self._categories[c], c)
+                            for c in TIDY_CATEGORIES ]),
+            ))
+
+        if self._plan is not None:
+            self._plan.close()
+            self.logger.info(
+                'Wrote %d planned action(s) to %s.' % (
+                    self._planned,
+                    self._plan.name,
+                ))
+            self._plan = None
+
+        if self.scan_index is not None:
+            self.logger.info(
+                'Scan index: %d hit(s), %d miss(es).' % (
+                    self.scan_index.hits,
+                    self.scan_index.misses,
+                ))
+            try:
+                self.scan_index.close()
+
+            except sqlite3.Error as e:
+                self.logger.warning(
+                    'Scan index %s could not be saved.' % self.scan_index.path)
+                self.logger.debug('ScanIndex.close() Exception %s' % str(e))
+
+        self._stop_metrics()
+
+    def _start_metrics(self):
+        """
+        Starts tracking the metrics of a run
+        """
+        self._started = time()
+        self._handled = None
+
+        self._log_counter = LogCounter()
+        self.logger.addHandler(self._log_counter)
+
+    def _stop_metrics(self):
+        """
+        Reports on the time spent in each phase of a run and writes our
+        metrics file (if we were configured to write one)
+        """
+        self.logger.removeHandler(self._log_counter)
+
+        metrics = self._metrics()
+        self.logger.info(
+            'Used at most %.1fMB of memory; %d director(ies) were left alone '
+            'because of the memory they needed.' % (
+                metrics['peak_memory'] / 1048576.0,
+                metrics['memory_skipped'],
+            ))
+        self.logger.info(
+            'Spent %.2fs listing, %.2fs stat()ing, %.2fs classifying and '
+            '%.2fs handling content; %d warning(s) and %d error(s) '
+            'reported.' % (
+                metrics['phases']['list'],
+                metrics['phases']['stat'],
+                metrics['phases']['classify'],
+                metrics['phases']['act'],
+                metrics['warnings'],
+                metrics['errors'],
+            ))
+
+        for entry in metrics['slow_directories']:
+            self.logger.debug(
+                'Slow directory %s took %.3fs to read.' % (
+                    entry['path'], entry['elapsed']))
+
+        metrics_file = tidy_path(self.get('MetricsFile', DEFAULT_METRICS_FILE))
+        if not metrics_file:
+            return
+
+        metrics_file = abspath(metrics_file)
+        if metrics_file.endswith('.prom'):
+            content = self._prometheus(metrics)
+
+        else:
+            content = json.dumps(metrics, indent=2, sort_keys=True) + '\n'
+
+        # Metrics are written to a temporary file first so that nothing
+        # reading them ever sees a partially written file
+        tmp_file = '%s.tmp' % metrics_file
+        try:
+            with open(tmp_file, 'wb') as f:
+                # Anything that still can't be encoded is escaped
+                f.write(content.encode('utf-8', 'backslashreplace'))
+
+            rename(tmp_file, metrics_file)
+
+        except (IOError, OSError) as e:
+            self.logger.warning(
+                'Metrics file %s could not be written.' % metrics_file)
+            self.logger.debug('write() Exception %s' % str(e))
+
+            try:
+                unlink(tmp_file)
+
+            except OSError:
+                pass
+            return
+
+        self.logger.debug('Wrote metrics to %s' % metrics_file)
+
+    def _metrics(self):
+        """
+        Returns a dictionary of the metrics tracked during a run
+        """
+        handled = self._handled or {
+            'handled': 0, 'failed': 0, 'bytes': 0, 'busy': 0.0}
+
+        phases = dict(self._timings)
+        phases['act'] = handled['busy']
+
+        metrics = {
+            'mode': self.mode,
+            'finished': time(),
+            'elapsed': time() - self._started,
+            'directories': self._dirs_scanned,
+            'filesystem_calls': self._fs_calls,
+            'categories': dict(self._categories),
+            'phases': phases,
+            'actions': {
+                'handled': handled['handled'],
+                'failed': handled['failed'],
+            },
+            'reclaimed_bytes': handled['bytes'],
+            'planned': dict([
+                (c, {'items': items, 'bytes': size})
+                for c, (items, size) in self._planned_categories.items() ]),
+            'complete': bool(self._dirs_scanned) and
+                not self._resumed and self._cursor_next is None,
+            'peak_memory': max(self._peak_memory, peak_memory()),
+            'memory_skipped': self._memory_skipped,
+            'excluded': self._excluded,
+            'protected': self._protected,
+            'warnings': self._log_counter.warnings,
+            'errors': self._log_counter.errors,
+            'slow_directories': [
+                {'path': path, 'elapsed': elapsed}
+                for elapsed, path in sorted(self._slow_dirs, reverse=True)
+            ],
+        }
+
+        if self.scan_index is not None:
+            metrics['index'] = {
+                'hits': self.scan_index.hits,
+                'misses': self.scan_index.misses,
+            }
+
+        return metrics
+
+    def _prometheus(self, metrics):
+        """
+        Returns the metrics specified in the Prometheus text exposition
+        format
+        """
+        def label(value):
+            value = str(value)
+            if self._path_decoder is not None:
+                # Label values are UTF-8; paths aren't always
+                value = self._path_decoder.decode(value)
+
+            return value.replace('\\', '\\\\') \
+                .replace('"', '\\"').replace('\n', '\\n')
+
+        lines = []
+
+        def gauge(name, doc, samples):
+            lines.append('# HELP tidyit_%s %s' % (name, doc))
+            lines.append('# TYPE tidyit_%s gauge' % name)
+            for labels, value in samples:
+                lines.append('tidyit_%s%s %s' % (
+                    name,
+                    '{%s}' % ','.join([
+                        '%s="%s"' % (k, label(v)) for k, v in labels])
+                    if labels else '',
+                    repr(value),
+                ))
+
+        mode = (('mode', metrics['mode']), )
+        gauge('last_run_timestamp_seconds',
+              'The time the last run finished.',
+              [(mode, metrics['finished'])])
+        gauge('run_seconds',
+              'The time the last run took.',
+              [(mode, metrics['elapsed'])])
+        gauge('phase_seconds',
+              'The time spent in each phase of the last run.',
+              [(mode + (('phase', p), ), metrics['phases'][p])
+               for p in SCAN_PHASES + ('act', )])
+        gauge('directories_scanned',
+              'The number of directories scanned.',
+              [(mode, metrics['directories'])])
+        gauge('filesystem_calls',
+              'The number of filesystem calls issued while scanning.',
+              [(mode, metrics['filesystem_calls'])])
+        gauge('entries',
+              'The number of entries classified in each category.',
+              [(mode + (('category', c), ), metrics['categories'][c])
+               for c in TIDY_CATEGORIES])
+        gauge('actions',
+              'The number of actions taken (and that could not be).',
+              [(mode + (('outcome', o), ), metrics['actions'][o])
+               for o in ('handled', 'failed')])
+        gauge('reclaimed_bytes',
+              'The number of bytes reclaimed (or that would have been).',
+              [(mode, metrics['reclaimed_bytes'])])
+        gauge('planned_items',
+              'The number of items planned to be handled in each category.',
+              [(mode + (('category', c), ), metrics['planned'][c]['items'])
+               for c in PLAN_CATEGORIES])
+        gauge('planned_bytes',
+              'The number of bytes planned to be handled in each category.',
+              [(mode + (('category', c), ), metrics['planned'][c]['bytes'])
+               for c in PLAN_CATEGORIES])
+        gauge('peak_memory_bytes',
+              'The most memory used by any of our processes.',
+              [(mode, metrics['peak_memory'])])
+        gauge('memory_skipped_directories',
+              'The number of directories left alone because of the memory '
+              'they needed.',
+              [(mode, metrics['memory_skipped'])])
+        gauge('excluded_directories',
+              'The number of excluded directories stayed out of.',
+              [(mode, metrics['excluded'])])
+        gauge('protected_directories',
+              'The number of directories protected by a safe entry.',
+              [(mode, metrics['protected'])])
+        gauge('log_messages',
+              'The number of warnings and errors reported.',
+              [(mode + (('level', 'warning'), ), metrics['warnings']),
+               (mode + (('level', 'error'), ), metrics['errors'])])
+        gauge('slow_directory_seconds',
+              'The time it took to read the slowest directories.',
+              [(mode + (('path', d['path']), ), d['elapsed'])
+               for d in metrics['slow_directories']])
+
+        if 'index' in metrics:
+            gauge('index_lookups',
+                  'The number of scan index lookups.',
+                  [(mode + (('result', 'hit'), ), metrics['index']['hits']),
+                   (mode + (('result', 'miss'), ),
+                    metrics['index']['misses'])])
+
+        return '\n'.join(lines) + '\n'
+
+    def _start_pool(self, options):
+        """
+        Starts our pool of worker processes (if we were configured to use
+        more than one)
+        """
+        try:
+            jobs = int(self.get('Jobs', DEFAULT_JOBS))
+
+        except (TypeError, ValueError):
+            self.logger.warning(
+                'An invalid number of jobs (%s) was specified.' %
+                self.get('Jobs'))
+            jobs = DEFAULT_JOBS
+
+        if jobs <= 1:
+            return
+
+        try:
+            # Our workers must inherit our state
+            context = multiprocessing.get_context('fork')
+
+        except AttributeError:
+            # Python v2.7 always forks
+            context = multiprocessing
+
+        except ValueError:
+            self.logger.warning(
+                'Parallel scanning is not supported on this platform.')
+            return
+
+        if self.scan_index is not None:
+            # Our workers can only see what we've committed
+            self.scan_index.commit()
+
+        TidyItScript._worker = (self, options)
+        self._pool = context.Pool(jobs, initializer=_tidy_worker_init)
+        self.logger.debug('Scanning with %d processes.' % jobs)
+
+    def _library(self, path):
+        """
+        Prepares our script to scan the library path specified
+        """
+        self._stat_threads = self.stat_threads.get(
+            abspath(tidy_path(path)), self.stat_threads[None])
+
+        if self._stat_threads > 1:
+            self.logger.debug(
+                'Using %d stat threads for %s' % (self._stat_threads, path))
+
+    def _open_plan(self):
+        """
+        Opens the file our action plan is written to (if we were configured
+        to write one).  False is returned if it could not be opened.
+        """
+        self._plan = None
+        self._planned = 0
+
+        plan_file = tidy_path(self.get('PlanFile', DEFAULT_PLAN_FILE))
+        if not plan_file:
+            return True
+
+        try:
+            self._plan = open(abspath(plan_file), 'w')
+
+        except (IOError, OSError) as e:
+            self.logger.error('Plan file %s could not be written.' % plan_file)
+            self.logger.debug('open() Exception %s' % str(e))
+            return False
+
+        self.logger.debug('Writing action plan to %s' % self._plan.name)
+        return True
+
+    def _open_filesystem(self):
+        """
+        Prepares the filesystem our libraries are scanned through; this is
+        the one provided by our operating system unless we were configured
+        to plan from a manifest or to replay a recording.  Calls made to it
+        are written to a recording if we were configured to.  False is
+        returned if our filesystem could not be prepared.
+        """
+        self._fs = OSFilesystem()
+
+        manifest = tidy_path(self.get('ManifestFile', DEFAULT_MANIFEST_FILE))
+        replay = tidy_path(self.get('FsReplay', DEFAULT_FS_REPLAY))
+        record = tidy_path(self.get('FsRecord', DEFAULT_FS_RECORD))
+
+        latency = 0.0
+        try:
+            latency = abs(float(
+                self.get('FsLatency', DEFAULT_FS_LATENCY) or 0)) / 1000.0
+
+        except (TypeError, ValueError):
+            self.logger.warning(
+                'An invalid filesystem latency (%s) was specified.' %
+                self.get('FsLatency'))
+
+        if manifest:
+            manifest = abspath(manifest)
+            started = time()
+            try:
+                self._fs = MemoryFilesystem(latency=latency)
+                self._fs.load(manifest)
+
+            except (IOError, OSError) as e:
+                self._fs = OSFilesystem()
+                self.logger.error('Manifest %s could not be read.' % manifest)
+                self.logger.debug('open() Exception %s' % str(e))
+                return False
+
+            if self._fs.skipped:
+                self.logger.warning(
+                    'Skipped %d invalid line(s) in manifest %s.' % (
+                        self._fs.skipped, manifest))
+
+            self.logger.info(
+                'Planning from manifest %s (%d entries read in %.2fs); '
+                'nothing will be changed.' % (
+                    manifest,
+                    self._fs.entries,
+                    time() - started,
+                ))
+
+            # Nothing we find can be acted on
+            self.mode = TIDYIT_MODE.PREVIEW
+
+        elif replay:
+            replay = abspath(replay)
+            try:
+                self._fs = ReplayFilesystem(replay, latency=latency)
+
+            except (IOError, OSError, ValueError, KeyError) as e:
+                self.logger.error(
+                    'Filesystem recording %s could not be read.' % replay)
+                self.logger.debug('open() Exception %s' % str(e))
+                return False
+
+            self.logger.info(
+                'Replaying filesystem calls from %s; nothing will be '
+                'changed.' % replay)
+
+        if latency and self._fs.real:
+            self.logger.warning(
+                'A filesystem latency is only added when planning from a '
+                'manifest or replaying a recording.')
+
+        if record:
+            record = abspath(record)
+            try:
+                self._fs = RecordingFilesystem(self._fs, record)
+
+            except (IOError, OSError) as e:
+                self.logger.error(
+                    'Filesystem recording %s could not be written.' % record)
+                self.logger.debug('open() Exception %s' % str(e))
+                return False
+
+            self.logger.debug('Recording filesystem calls to %s' % record)
+
+        if self.scan_index is not None:
+            if not self._fs.real:
+                # Our index is of our libraries; not the filesystem we're
+                # scanning instead
+                self.scan_index.close()
+                self.scan_index = None
+
+            else:
+                self.scan_index.stat = self._fs.stat
+
+        return True
+
+    def _close_filesystem(self):
+        """
+        Closes the filesystem our libraries were scanned through (and
+        returns to the one provided by our operating system)
+        """
+        if isinstance(self._fs, RecordingFilesystem):
+            self.logger.info(
+                'Recorded %d filesystem call(s) to %s.' % (
+                    self._fs.calls, self._fs.path))
+
+        elif isinstance(self._fs, ReplayFilesystem) and self._fs.misses:
+            self.logger.warning(
+                '%d filesystem call(s) were not found in recording %s.' % (
+                    self._fs.misses, self._fs.path))
+
+        self._fs.close()
+        self._fs = OSFilesystem()
+
+    def _plan_verify(self, record, verified, kept):
+        """
+        Returns True if the content an action plan entry refers to is
+        still the same as it was when it was planned.  The verified set
+        contains the paths of the entries we've already verified and the
+        kept set contains the directories we've left some content in.
+        """
+        path = record['path']
+        if path in kept:
+            # Handling this directory would handle what we left alone
+            self.logger.debug(
+                'Skipping %s; some of it\'s content was left alone.' % path)
+            return False
+
+        try:
+            self._fs_calls += 1
+            stat_obj = self._fs.stat(path)
+
+        except OSError:
+            self.logger.debug('Skipping %s; it no longer exists.' % path)
+            return False
+
+        if S_ISDIR(stat_obj.st_mode):
+            if stat_obj.st_mtime == record.get('mtime'):
+                # Nothing was added or removed from it
+                return True
+
+            # The directory will have changed if we've already handled
+            # some of it's content; anything that remains must also be
+            # part of our plan
+            listing = self._scandir(path)
+            if listing is None:
+                return False
+
+            for entry in listing:
+                if entry.path not in verified:
+                    self.logger.debug(
+                        'Skipping %s; %s was not part of the plan.' % (
+                            path, entry.name))
+                    return False
+
+            return True
+
+        if stat_obj.st_mtime != record.get('mtime') or \
+                stat_obj.st_size != record.get('size'):
+            self.logger.debug(
+                'Skipping %s; it has changed since it was planned.' % path)
+            return False
+
+        return True
+
+    def apply_plan(self, path):
+        """
+        Performs the actions identified in a previously written action plan
+        (in the order they were planned) without scanning our libraries
+        again.  Content that has changed since it was planned is left alone.
+        """
+        return self._profile(self._apply_plan, path)
+
+    def _apply_plan(self, path):
+        """
+        Performs the actions identified in the action plan specified
+        """
+        if not self._configure():
+            return False
+
+        # We no longer need this; nothing is being scanned
+        if self.scan_index is not None:
+            self.scan_index.close()
+            self.scan_index = None
+
+        path = abspath(tidy_path(path))
+        try:
+            plan = open(path, 'r')
+
+        except (IOError, OSError) as e:
+            self.logger.error('Plan file %s could not be read.' % path)
+            self.logger.debug('open() Exception %s' % str(e))
+            return False
+
+        self.logger.info('Applying plan %s' % path)
+        self._start_metrics()
+        self._check_devices([])
+        self._start_actions()
+
+        # The paths that were still as they were planned
+        verified = set()
+
+        # The directories containing content that wasn't
+        kept = set()
+
+        applied = 0
+        skipped = 0
+        with plan:
+            for no, line in enumerate(plan, start=1):
+                line = line.strip()
+                if not line:
                     continue
 
-                # Filesize
-                if size == 0:
-                    # Zero byte files are never good
-                    tidylist.append(fullpath)
-                    self.logger.debug('Planned handling (zero byte file): %s' % fullpath)
+                try:
+                    record = json.loads(line)
+                    depth = int(record['depth'])
+                    fullpath = record['path']
+
+                except (ValueError, TypeError, KeyError):
+                    self.logger.warning(
+                        'Skipping invalid entry on line %d of %s.' % (
+                            no, path))
+                    skipped += 1
                     continue
 
-                # Match against always trash items (if configured to do so)
-                elif self.always_trash is not None and self.always_trash.search(fullpath):
-                    # we found a file we flagged to always be trashed when
-                    # matched
-                    tidylist.append(fullpath)
-                    self.logger.debug('Planned handling (marked for trash): %s' % fullpath)
-                    # Next File
+                if not self._plan_verify(record, verified, kept):
+                    kept.add(dirname(fullpath))
+                    skipped += 1
+                    continue
+
+                verified.add(fullpath)
+                size = 0
+                if record.get('category') != TidyCategory.DIRECTORY:
+                    size = record.get('size') or 0
+
+                if not self._actions.put(fullpath, depth, size):
+                    self.logger.warning(
+                        'Left DIRECTORY: %s; some of it\'s content could '
+                        'not be handled.' % fullpath)
+                    kept.add(dirname(fullpath))
+                    skipped += 1
+                    continue
+
+                applied += 1
+
+        self._stop_actions()
+        self.logger.info(
+            'Applied %d planned action(s); %d skipped.' % (applied, skipped))
+
+        self._stop_metrics()
+        return None
+
+    def estimate(self):
+        """
+        Estimates what tidying our libraries would handle from a random
+        sample of the show/movie directories found in them; this takes a
+        fraction of the time a full scan does.
+        """
+        return self._profile(self._estimate)
+
+    def _estimate(self):
+        """
+        Scans a random sample of the show/movie directories found in each
+        of our libraries and extrapolates what a full scan would handle
+        """
+        configured = self._configure()
+        if not configured:
+            return False
+
+        paths, options = configured
+
+        # Nothing is changed (or indexed) while we're estimating
+        self.mode = TIDYIT_MODE.PREVIEW
+        if self.scan_index is not None:
+            self.scan_index.close()
+            self.scan_index = None
+
+        try:
+            sample = max(1, int(
+                self.get('EstimateSample', DEFAULT_ESTIMATE_SAMPLE)))
+
+        except (TypeError, ValueError):
+            self.logger.warning(
+                'An invalid estimate sample size (%s) was specified.' %
+                self.get('EstimateSample'))
+            sample = DEFAULT_ESTIMATE_SAMPLE
+
+        if not self._open_filesystem():
+            return False
+
+        started = time()
+
+        # The show/movie directories found in each of our libraries; each
+        # library is sampled on it's own (in proportion to it's size)
+        strata = []
+        for path in paths:
+            path = abspath(path)
+            listing = self._scandir(path)
+            if listing is None:
+                continue
+
+            if self.tidysafe_entries.intersection(
+                    [ entry.name for entry in listing ]):
+                # Nothing in this library is ever handled
+                self.logger.debug('Safe entry found in %s' % path)
+                continue
+
+            units = []
+            for entry in listing:
+                if entry.name in self.meta_entries or \
+                        entry.name in METADIRS:
+                    continue
+
+                if self._exclude is not None and \
+                        self._exclude.match(entry.path):
+                    continue
+
+                try:
+                    if entry.is_dir():
+                        units.append(entry.path)
+
+                except OSError:
                     continue
 
-                if len(valid_paths) > 0:
-                    # Handle alike files
-                    found = False
-                    for afile in extras:
-                        match = afile.match(fullpath)
-                        if match:
-                            # We found a file to match for file in question
-                            # in order to decide it's fate
-                            for entry in valid_paths:
-                                # Match against a valid_path
-                                if basename(entry).\
-                                   startswith(
-                                       basename(match.group('filename'))) and \
-                                        True not in [ ignore.search(basename(entry)) is not None \
-                                        for ignore in IGNORE_FILELIST_RE ]:
-                                    # We have a good match!
-                                    self.logger.debug('%s belongs to %s' % (
-                                        dirent,
-                                        basename(entry),
-                                    ))
-                                    found = True
-                                    break
-
-                                # No match if we get here, check the current
-                                # directory name against the file:
-                                if basename(dirname(entry)).\
-                                   startswith(
-                                       basename(match.group('filename'))):
-                                    # We have a good match!
-                                    self.logger.debug('%s belongs to (dir) %s' % (
-                                        dirent,
-                                        basename(dirname(entry)),
-                                    ))
-                                    found = True
-                                    break
-
-                            if not found:
-                                # We didn't find anything on an
-                                # Alike match
-                                tidylist.append(fullpath)
-                                self.logger.debug('Planned handling (no alike match): %s' % fullpath)
-                                # Trip Found flag since we've
-                                # aready handled this file
-                                found = True
-                                break
-
-                    if found:
-                        # Next File since we handled or at
-                        # least matched an Alike file
+            if units:
+                strata.append((path, units))
+
+        population = sum([ len(units) for _, units in strata ])
+        if not population:
+            self.logger.info(
+                'No show/movie directories were found to estimate from.')
+            self._close_filesystem()
+            return None
+
+        # The estimated (items, variance, bytes, variance) of each category
+        # and of everything (None) we would handle
+        categories = PLAN_CATEGORIES + (None, )
+        estimates = dict([ (c, [0.0, 0.0, 0.0, 0.0]) for c in categories ])
+
+        ref_time = time() - options['minage']
+        sampled = 0
+        for path, units in strata:
+            self._library(path)
+            chosen = random.sample(units, min(len(units), max(2, int(round(
+                sample * float(len(units)) / population)))))
+
+            # The items (and bytes) each directory we scan would have had
+            # handled in each category
+            found = dict([ (c, ([], [])) for c in categories ])
+            for unit in chosen:
+                planned = dict([ (c, [0, 0]) for c in categories ])
+
+                # Everything that would be handled is captured instead
+                self._capture = []
+                code = self.tidy_library(
+                    unit, __current_depth=2, __ref_time=ref_time, **options)
+                capture, self._capture = self._capture, None
+
+                if code == TidyCode.REMOVE and not options['keep_dirs']:
+                    # Our directory would be handled too
+                    capture.append((
+                        'handle', unit, 1, TidyCategory.DIRECTORY, 'dir',
+                        None, None))
+
+                for entry in capture:
+                    if entry[0] != 'handle':
                         continue
 
-            # If we make it to the end, we scanned a file
-            # that does not meet filtering criterias
+                    category, size = entry[3], entry[5]
+                    if size is None or category == TidyCategory.DIRECTORY:
+                        size = 0
+
+                    for c in (category, None):
+                        planned[c][0] += 1
+                        planned[c][1] += size
+
+                for c in categories:
+                    found[c][0].append(planned[c][0])
+                    found[c][1].append(planned[c][1])
+
+            sampled += len(chosen)
+            for c in categories:
+                for no, values in enumerate(found[c]):
+                    total, variance = _extrapolate(values, len(units))
+                    estimates[c][no * 2] += total
+                    estimates[c][no * 2 + 1] += variance
+
+        self._close_filesystem()
+
+        self.logger.info(
+            'Estimated from %d of %d show/movie director(ies) in %.2fs '
+            '(with 95%% confidence):' % (
+                sampled, population, time() - started))
+
+        last = self._last_run()
+        for c in categories:
+            items, items_var, size, size_var = estimates[c]
+            if c is not None and not items and not (
+                    last and last['planned'].get(c, {}).get('items')):
+                continue
 
-            # This is like a safe file.  We don't know what it is; so we don't
-            # want to avoid destroying something we shouldn't
-            self.logger.debug('Unhandled entry found: %s (safe-guarded)' % fullpath)
-            return TidyCode.IGNORE
+            if c is None:
+                _items = sum([ p['items'] for p in last['planned'].values() ]) \
+                    if last else 0
+                _size = sum([ p['bytes'] for p in last['planned'].values() ]) \
+                    if last else 0
+
+            elif last:
+                _items = last['planned'].get(c, {}).get('items', 0)
+                _size = last['planned'].get(c, {}).get('bytes', 0)
+
+            self.logger.info(
+                '%s: %d item(s) (+/- %d) and %.1fMB (+/- %.1fMB)%s' % (
+                    c if c is not None else 'total',
+                    round(items),
+                    round(ESTIMATE_Z * sqrt(items_var)),
+                    size / 1048576.0,
+                    ESTIMATE_Z * sqrt(size_var) / 1048576.0,
+                    '; the last full run planned %d item(s) and %.1fMB' % (
+                        _items, _size / 1048576.0) if last else '',
+                ))
 
-        if len(dirents) == 0 and len(valid_paths) == 0:
-            # we successfully handled every file/dir
-            # in the current directory and there were no
-            # valid files found in the list
+        if last:
+            self.logger.info(
+                'The last full run finished %s.' % strftime(
+                    '%Y-%m-%d %H:%M:%S', localtime(last['finished'])))
 
-            # Append the remove_if_empty list in this
-            # scenario
-            tidylist.extend(remove_if_empty)
+        return None
 
-        # We only tidy the parent if all of it's children
-        # are gone
-        for entry in tidylist:
-            self._handle(entry, current_depth)
+    def _last_run(self):
+        """
+        Returns the metrics our last complete scan wrote (if they were
+        written as JSON); None is returned if there are none.
+        """
+        metrics_file = tidy_path(self.get('MetricsFile', DEFAULT_METRICS_FILE))
+        if not metrics_file or metrics_file.endswith('.prom'):
+            return None
 
-        if len(dirents) + len(valid_paths):
-            # We have a media directory worth keeping
-            return TidyCode.IGNORE
+        try:
+            with open(abspath(metrics_file), 'r') as f:
+                metrics = json.load(f)
 
-        if current_depth > 1:
-            return TidyCode.REMOVE
+        except (IOError, OSError, ValueError) as e:
+            self.logger.debug('Metrics file %s could not be read.' % metrics_file)
+            self.logger.debug('open() Exception %s' % str(e))
+            return None
 
-        return TidyCode.IGNORE
+        if not isinstance(metrics, dict) or not metrics.get('complete') or \
+                'planned' not in metrics:
+            # It was not written by a complete scan of our libraries
+            return None
 
+        return metrics
 
-    def tidy(self):
-        """All of the core cleanup magic happens here.
+    def _profile(self, function, *args):
         """
+        Calls the function specified; profiling it if we were configured to
+        """
+        profile_file = tidy_path(self.get('ProfileFile', DEFAULT_PROFILE_FILE))
+        if not profile_file:
+            return function(*args)
 
-        if not self.validate(keys=(
-            'Mode',
-            'MovePath',
-            'VideoPaths',
-            'AlwaysTrash',
-            'MetaContent',
-            'VideoMinSize',
-            'ProcessMinAge',
-            'VideoExtensions',
-            'SafeEntries',
-            'VideoExtras',
-            'SystemEncoding')):
+        profile_file = abspath(profile_file)
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(function, *args)
 
-            return False
+        finally:
+            try:
+                profiler.dump_stats(profile_file)
+                self.logger.info('Wrote profile to %s' % profile_file)
 
+            except (IOError, OSError) as e:
+                self.logger.warning(
+                    'Profile %s could not be written.' % profile_file)
+                self.logger.debug('dump_stats() Exception %s' % str(e))
 
-        # Fix mode to object (self.*)
-        self.mode = self.get('Mode', TIDYIT_MODE_DEFAULT)
-        if self.mode not in TIDYIT_MODES:
-            self.logger.error('The specified mode "%s" is not supported.' % self.mode)
-            return False
+    def _start_actions(self):
+        """
+        Prepares the queue the content we handle is passed through
+        """
+        try:
+            threads = int(self.get('ActionThreads', DEFAULT_ACTION_THREADS))
 
-        # Fix tidy-safe entries to object (self.*)
-        self.tidysafe_entries = self.parse_list(self.get('SafeEntries', DEFAULT_TIDYSAFE_ENTRIES))
+        except (TypeError, ValueError):
+            self.logger.warning(
+                'An invalid number of action threads (%s) was specified.' %
+                self.get('ActionThreads'))
+            threads = DEFAULT_ACTION_THREADS
+
+        self._actions = ActionQueue(
+            self._handle if self._trace_slow is None else self._traced_handle,
+            threads)
+        self._move_index = MoveIndex(self._fs.scandir)
+        if threads > 1:
+            self.logger.debug('Handling content with %d threads.' % threads)
+
+    def _stop_actions(self):
+        """
+        Waits for all of the content we've queued to be handled and reports
+        on how quickly it was
+        """
+        if self._actions is None:
+            return
+
+        self._actions.close()
+        if self._move_index.listed:
+            self.logger.debug(
+                'Indexed the names found in %d move path director(ies).' %
+                self._move_index.listed)
+
+        if self._moves['copied']:
+            self.logger.info(
+                'Moved %d item(s) by renaming them; %d item(s) (%d bytes) '
+                'had to be copied to another device.' % (
+                    self._moves['renamed'],
+                    self._moves['copied'],
+                    self._moves['bytes'],
+                ))
 
-        # Store Move Path
-        self.move_path = tidy_path(self.get('MovePath', DEFAULT_MOVE_PATH))
-        if self.move_path:
-            # Convert to absolute path if possible
-            self.move_path = abspath(self.move_path)
+        elif self._moves['renamed']:
+            self.logger.debug(
+                'Moved %d item(s) by renaming them.' % self._moves['renamed'])
+
+        if self._actions.handled or self._actions.failed:
+            self.logger.info(
+                'Handled %d item(s) in %.2fs (%.1f/s); %d could not be '
+                'handled.' % (
+                    self._actions.handled,
+                    self._actions.elapsed,
+                    self._actions.handled / max(self._actions.elapsed, 0.001),
+                    self._actions.failed,
+                ))
 
-        if self.mode == TIDYIT_MODE.MOVE and not self.move_path:
-            # Fall back to preview mode if no move path is specified
-            self.mode = TIDYIT_MODE.PREVIEW
-            self.logger.warning('MovePath not specified; falling back to Preview Mode.')
+        # Keep what we need for our metrics (a rerun may have handled
+        # content once already)
+        handled = self._handled or {
+            'handled': 0, 'failed': 0, 'bytes': 0, 'busy': 0.0}
+        self._handled = {
+            'handled': handled['handled'] + self._actions.handled,
+            'failed': handled['failed'] + self._actions.failed,
+            'bytes': handled['bytes'] + self._actions.bytes,
+            'busy': handled['busy'] + self._actions.busy,
+        }
 
-        # Remaining Environment Variables
-        video_extensions = self.parse_list(self.get('VideoExtensions', DEFAULT_VIDEO_EXTENSIONS))
-        video_minsize = int(self.get('VideoMinSize', DEFAULT_VIDEO_MIN_SIZE_MB)) * 1048576
-        minage = int(self.get('ProcessMinAge', DEFAULT_MATCH_MINAGE))
-        encoding = self.get('SystemEncoding', DEFAULT_SYSTEM_ENCODING)
-        paths = self.parse_path_list(self.get('VideoPaths'))
-        self.meta_entries = self.parse_list(self.get('MetaContent', OS_METADATA_ENTRIES))
+        self._actions = None
 
-        # Directory Handling
-        keep_dirs = self.parse_bool(
-            self.get('KeepDirectories', DEFAULT_KEEP_DIRECTORY_SWITCH))
+    def _stop_pool(self):
+        """
+        Stops our pool of worker processes and threads (if they were
+        started)
+        """
+        if self._stat_pool is not None:
+            self._stat_pool[1].close()
+            self._stat_pool = None
 
-        # Create Unique List of Meta Entries
-        self.meta_entries = set(list(self.meta_entries) + list(OS_METADATA_ENTRIES))
-        self.logger.debug('Meta Entries set to: "%s"' % '", "'.join(self.meta_entries))
+        if self._pool is None:
+            return
 
-        # Extra Managing - build regular expressions based on input
-        video_extras = self.parse_list(self.get('VideoExtras', ''))
+        # Anything still running was scanned ahead of time and is no
+        # longer needed
+        self._pool.terminate()
+        self._pool.join()
+        self._pool = None
+        TidyItScript._worker = None
 
-        # Start ourselves off with an extras list
-        extras = [ x for x in VIDEO_ALIKE_FILES_RE ]
+    def tidy(self, watch=False):
+        """All of the core cleanup magic happens here.
+        """
+        return self._profile(self._tidy, watch)
 
-        if len(video_extras):
-            _extras = '%s' % '|'.join(video_extras)
-            _extras = '^(?P<filename>.*)(' + self._re_str(_extras) + ')$'
-            try:
-                __extras = re.compile('(%s)$' % _extras, re.IGNORECASE)
-                self.logger.debug('Compiled regex "(%s)"' % _extras)
-                # insert our extras to the head of our list
-                extras.insert(0, __extras)
-            except:
-                self.logger.warning(
-                    'Invalid regular expression: "(%s)$"' % _extras,
-                )
+    def _tidy(self, watch=False):
+        """
+        Scans our libraries and tidies them
+        """
 
-        if not len(video_extensions):
-            self.logger.error('No video extensions were specified.')
+        configured = self._configure()
+        if not configured:
             return False
 
-        _extensions = r'%s' % '|'.join(video_extensions)
-        _extensions = self._re_str(_extensions)
-        try:
-            extensions = re.compile(r'(%s)$' % _extensions, re.IGNORECASE)
-            self.logger.debug('Compiled regex "(%s)$"' % _extensions)
-        except:
-            self.logger.warning(
-                'Invalid regular expression: "(%s)$"' % _extensions,
-            )
-
-        # Trash Managing - build regular expressions based on input
-        always_trash_entries = self.parse_list(self.get('AlwaysTrash', []))
+        paths, options = configured
+        if not self._open_plan():
+            return False
 
-        # By Default; Always Trash is Disabled (Safer this way)
-        self.always_trash = None
-        if len(always_trash_entries):
-            _always_trash = '%s' % '|'.join(always_trash_entries)
-            _always_trash = self._re_str(_always_trash)
-            try:
-                self.always_trash = re.compile('(%s)$' % _always_trash, re.IGNORECASE)
-                self.logger.debug('Compiled "Always Trash" regex "(%s)$"' % _always_trash)
-            except:
-                # Disable option (Safer this way)
-                self.logger.warning(
-                    'Invalid "Always Trash" regular expression: "(%s)$"' % _always_trash,
-                )
+        if not self._open_filesystem():
+            return False
 
-        for path in paths:
-            self.tidy_library(
-                path,
-                extensions=extensions,
-                extras=extras,
-                minsize=video_minsize,
-                minage=minage,
-                keep_dirs=keep_dirs,
-            )
+        paths = self._lock(paths)
+        if not paths:
+            # Everything is already being looked after
+            self._close_filesystem()
+            return None
+
+        self._start_metrics()
+        self._check_devices(paths)
+
+        if self._max_runtime:
+            self._deadline = self._started + self._max_runtime
+
+        # The libraries left to be scanned this run (an earlier one may
+        # have already scanned some of them)
+        libraries = self._load_cursor(paths)
+
+        self._start_pool(options)
+
+        # Our action threads are started after our worker processes so
+        # that they aren't inherited by them
+        self._start_actions()
+
+        for path in libraries:
+            self._library(path)
+            self.tidy_library(path, **options)
+            if self._cursor_next is not None:
+                # We ran out of time
+                break
+
+        self._save_cursor()
+
+        # Anything scanned from here on is no longer on the clock
+        self._deadline = None
+        self._budgeted = None
+        self._cursor = None
+
+        if self._cursor_next is None:
+            # Take another look at anything that changed while we were
+            # running (if we were asked to)
+            self._rerun(options)
+
+        if watch:
+            # Keep an eye on our libraries for further changes
+            self.watch(paths, options)
+
+        self._stop_actions()
+        requested = self._unlock()
+        while requested:
+            # A rerun was requested after we last checked for one; we can
+            # no longer tell what changed so the library is tidied again
+            requested = self._lock(requested)
+            self._start_actions()
+            for path in requested:
+                self.logger.info(
+                    'Rerun requested; tidying %s again.' % path)
+                self._tidy_watched(abspath(path), None, options)
+
+            self._stop_actions()
+            requested = self._unlock()
+
+        self._stop_pool()
+        self._summarize()
+        self._close_filesystem()
 
         # Nothing fetched, nothing gained or lost
         return None
@@ -1012,7 +5621,15 @@ class TidyItScript(SchedulerScript):
     def main(self, *args, **kwargs):
         """CLI
         """
-        return self.tidy()
+        if self.get('ApplyPlan'):
+            # We've already been told what to do
+            return self.apply_plan(self.get('ApplyPlan'))
+
+        if self.parse_bool(self.get('Estimate', False)):
+            # We only want to know what we'd find
+            return self.estimate()
+
+        return self.tidy(watch=self.parse_bool(self.get('Watch', False)))
 
 
 # Call your script as follows:
@@ -1044,6 +5661,17 @@ if __name__ == "__main__":
              ".",
         metavar="ENTRIES",
     )
+    parser.add_option(
+        "--exclude",
+        dest="exclude",
+        help="Identify the directories (relative to each of the " +\
+             "libraries scanned) that should never be looked in; a " +\
+             "star (*) matches anything within a single directory " +\
+             "name while a double star (**) matches any number of " +\
+             "directories (eg. '*/Extras, **/.snapshot'). You can " +\
+             "specify more then one by separating them with a comma (,).",
+        metavar="PATHS",
+    )
     parser.add_option(
         "-t",
         "--always-trash",
@@ -1127,6 +5755,211 @@ if __name__ == "__main__":
         action="store_true",
         help="Do not delete video directories during cleanup."
     )
+    parser.add_option(
+        "--ctime",
+        dest="ctime",
+        action="store_true",
+        help="Take the age of content from the most recent of it's " +\
+            "modification and change times. Content moved into your " +\
+            "library keeps it's modification time; this leaves it alone " +\
+            "until it has reached the minimum age (--min-age) too.",
+    )
+    parser.add_option(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        help="The number of processes to scan your libraries with. Each " +\
+            "show/movie directory found in a library is scanned " +\
+            "independently of the others. This defaults to %d." % \
+            DEFAULT_JOBS,
+        metavar="JOBS",
+    )
+    parser.add_option(
+        "-T",
+        "--stat-threads",
+        dest="stat_threads",
+        help="The number of threads used to look up the details of the " +\
+            "files found in each directory. Network shares (NFS, SMB, " +\
+            "etc) benefit from this, local disks do not. You can " +\
+            "identify a value per library by prefixing it with the " +\
+            "library path and an equal (=) sign. eg. 4, /mnt/nas/TV=16. " +\
+            "This defaults to %d." % DEFAULT_STAT_THREADS,
+        metavar="THREADS",
+    )
+    parser.add_option(
+        "-A",
+        "--action-threads",
+        dest="action_threads",
+        help="The number of threads used to remove (or move) the " +\
+            "content being tidied. Network shares (NFS, SMB, etc) " +\
+            "benefit from this, local disks do not. This defaults " +\
+            "to %d." % DEFAULT_ACTION_THREADS,
+        metavar="THREADS",
+    )
+    parser.add_option(
+        "-i",
+        "--index",
+        dest="scan_index",
+        help="Identify a file to remember the directories scanned (and " +\
+            "the decisions made on them). Directories that have not " +\
+            "changed since the last run are not scanned again.",
+        metavar="FILE",
+    )
+    parser.add_option(
+        "--rebuild-index",
+        dest="rebuild_index",
+        action="store_true",
+        help="Discard the contents of the scan index (--index) and " +\
+            "rescan everything.",
+    )
+    parser.add_option(
+        "-w",
+        "--watch",
+        dest="watch",
+        action="store_true",
+        help="Once the initial tidy completes, keep running and watch " +\
+            "the libraries for changes (Linux only). Directories that " +\
+            "change are tidied again once they've reached the minimum " +\
+            "age (--min-age).",
+    )
+    parser.add_option(
+        "--max-runtime",
+        dest="max_runtime",
+        help="Stop scanning once the specified number of seconds have " +\
+            "passed (the show/movie directory being scanned is always " +\
+            "finished first). The next run continues from where this " +\
+            "one left off.",
+        metavar="SEC",
+    )
+    parser.add_option(
+        "--max-memory",
+        dest="max_memory",
+        help="Leave any directory alone (as though it held something " +\
+            "worth keeping) once scanning it has used more than the " +\
+            "specified number of MB of memory. The most memory used " +\
+            "is always reported.",
+        metavar="MB",
+    )
+    parser.add_option(
+        "--cursor-file",
+        dest="cursor_file",
+        help="The file used to track where a scan stopped by " +\
+            "--max-runtime left off. The default is '%s'." % \
+            DEFAULT_CURSOR_FILE,
+        metavar="FILE",
+    )
+    parser.add_option(
+        "--overlap",
+        dest="overlap",
+        help="Identify what is done when another copy of this script " +\
+            "is already tidying a library; this is either 'exit' or " +\
+            "'rerun'. A rerun has the copy already running rescan the " +\
+            "directories that changed while it was running. The " +\
+            "default is '%s'." % DEFAULT_OVERLAP_MODE,
+        metavar="MODE",
+    )
+    parser.add_option(
+        "--lock-dir",
+        dest="lock_dir",
+        help="The directory the lock files of each library are kept " +\
+            "in. Your system's temporary directory is used by default.",
+        metavar="DIR",
+    )
+    parser.add_option(
+        "--manifest",
+        dest="manifest",
+        help="Plan from the listing of your libraries found in the file " +\
+            "specified instead of scanning them; nothing is changed. " +\
+            "Each line identifies the path, size, modification time and " +\
+            "type of an entry such as the ones written by find with " +\
+            "-printf '%p\\t%s\\t%T@\\t%y\\n'.",
+        metavar="FILE",
+    )
+    parser.add_option(
+        "--fs-record",
+        dest="fs_record",
+        help="Record every filesystem call made (along with it's " +\
+            "outcome) to the file specified so that the run can be " +\
+            "replayed later on with --fs-replay.",
+        metavar="FILE",
+    )
+    parser.add_option(
+        "--fs-replay",
+        dest="fs_replay",
+        help="Replay the filesystem calls recorded (with --fs-record) " +\
+            "in the file specified instead of scanning your libraries; " +\
+            "nothing is changed.",
+        metavar="FILE",
+    )
+    parser.add_option(
+        "--fs-latency",
+        dest="fs_latency",
+        help="Add the specified number of milliseconds to every " +\
+            "filesystem call made to a --manifest or while replaying " +\
+            "with --fs-replay; it mimics a slow (network) filesystem.",
+        metavar="MS",
+    )
+    parser.add_option(
+        "--plan-out",
+        dest="plan_out",
+        help="Write every action taken (or that would have been taken " +\
+            "in a dry-run) to the file specified as it's planned. Each " +\
+            "line identifies the path along with it's category, size, " +\
+            "depth, modification time and the reason it's handled.",
+        metavar="FILE",
+    )
+    parser.add_option(
+        "--metrics",
+        dest="metrics",
+        help="Write the metrics of the run to the file specified. Files " +\
+            "ending in .prom are written for the Prometheus textfile " +\
+            "collector; all others are written as JSON.",
+        metavar="FILE",
+    )
+    parser.add_option(
+        "--estimate",
+        dest="estimate",
+        action="store_true",
+        help="Estimate what a run would handle (and the space it would " +\
+            "reclaim) from a random sample of the show/movie " +\
+            "directories in your libraries instead of scanning all of " +\
+            "them; nothing is changed. The estimate is shown next to " +\
+            "what the last full run (see --metrics) planned.",
+    )
+    parser.add_option(
+        "--sample",
+        dest="sample",
+        help="The number of show/movie directories to scan when " +\
+            "estimating. The default is %d." % DEFAULT_ESTIMATE_SAMPLE,
+        metavar="COUNT",
+    )
+    parser.add_option(
+        "--profile",
+        dest="profile",
+        help="Profile the run and write the statistics gathered to the " +\
+            "file specified (in the format read by Python's pstats " +\
+            "module).",
+        metavar="FILE",
+    )
+    parser.add_option(
+        "--trace-slow",
+        dest="trace_slow",
+        help="Report on any directory that takes longer than the " +\
+            "specified number of milliseconds to be listed, stat()'ed " +\
+            "or scanned and on any content that takes as long to be " +\
+            "handled.",
+        metavar="MS",
+    )
+    parser.add_option(
+        "--apply",
+        dest="apply_plan",
+        help="Perform the actions found in a plan previously written " +\
+            "with --plan-out instead of scanning your libraries. Content " +\
+            "that has changed since it was planned is left alone. This " +\
+            "switch is combined with the --clean (-c) and --move-path " +\
+            "(-p) switches the same way a scan is.",
+        metavar="FILE",
+    )
     parser.add_option(
         "-L",
         "--logfile",
@@ -1166,11 +5999,35 @@ if __name__ == "__main__":
     _clean = options.clean
     _move_path = options.move_path
     _safeentries = options.safeentries
+    _exclude = options.exclude
     _alwaystrash = options.alwaystrash
     _metacontent = options.metacontent
     _keep_dir = options.keep_dir
-
-    if _clean or _move_path or videopaths:
+    _ctime = options.ctime
+    _scan_index = options.scan_index
+    _rebuild_index = options.rebuild_index
+    _watch = options.watch
+    _jobs = options.jobs
+    _stat_threads = options.stat_threads
+    _action_threads = options.action_threads
+    _max_runtime = options.max_runtime
+    _max_memory = options.max_memory
+    _cursor_file = options.cursor_file
+    _overlap = options.overlap
+    _lock_dir = options.lock_dir
+    _manifest = options.manifest
+    _fs_record = options.fs_record
+    _fs_replay = options.fs_replay
+    _fs_latency = options.fs_latency
+    _plan_out = options.plan_out
+    _apply_plan = options.apply_plan
+    _metrics = options.metrics
+    _estimate = options.estimate
+    _sample = options.sample
+    _profile = options.profile
+    _trace_slow = options.trace_slow
+
+    if _clean or _move_path or _watch or _apply_plan or videopaths:
         # By specifying one of the followings; we know for sure that the
         # user is running this script manually from the command line.
         # is running this as a standalone script,
@@ -1216,15 +6073,140 @@ if __name__ == "__main__":
     if _safeentries:
         script.set('SafeEntries', _safeentries)
 
+    if _exclude:
+        script.set('ExcludePaths', _exclude)
+
     if _alwaystrash:
         script.set('AlwaysTrash', _alwaystrash)
 
     if _keep_dir:
         script.set('KeepDirectories', 'Yes')
 
+    if _ctime:
+        script.set('AgeFromChangeTime', 'Yes')
+
     if _metacontent:
         script.set('MetaContent', _metacontent)
 
+    if _jobs:
+        try:
+            _jobs = str(abs(int(_jobs)))
+            script.set('Jobs', _jobs)
+        except (ValueError, TypeError):
+            script.logger.error(
+                'An invalid `jobs` (%s) was specified.' % (_jobs)
+            )
+            exit(EXIT_CODE.FAILURE)
+
+    if _stat_threads:
+        script.set('StatThreads', _stat_threads)
+
+    if _action_threads:
+        try:
+            _action_threads = str(abs(int(_action_threads)))
+            script.set('ActionThreads', _action_threads)
+        except (ValueError, TypeError):
+            script.logger.error(
+                'An invalid `action_threads` (%s) was specified.' % (
+                    _action_threads)
+            )
+            exit(EXIT_CODE.FAILURE)
+
+    if _scan_index:
+        script.set('ScanIndex', _scan_index)
+
+    if _rebuild_index:
+        script.set('RebuildIndex', 'Yes')
+
+    if _watch:
+        script.set('Watch', 'Yes')
+
+    if _max_runtime:
+        try:
+            _max_runtime = str(abs(int(_max_runtime)))
+            script.set('MaxRuntime', _max_runtime)
+        except (ValueError, TypeError):
+            script.logger.error(
+                'An invalid `max_runtime` (%s) was specified.' % (
+                    _max_runtime)
+            )
+            exit(EXIT_CODE.FAILURE)
+
+    if _cursor_file:
+        script.set('CursorFile', _cursor_file)
+
+    if _max_memory:
+        try:
+            _max_memory = str(abs(int(_max_memory)))
+            script.set('MaxMemory', _max_memory)
+        except (ValueError, TypeError):
+            script.logger.error(
+                'An invalid `max_memory` (%s) was specified.' % (
+                    _max_memory)
+            )
+            exit(EXIT_CODE.FAILURE)
+
+    if _overlap:
+        script.set('OverlapMode', _overlap)
+
+    if _lock_dir:
+        script.set('LockDirectory', _lock_dir)
+
+    if _manifest:
+        script.set('ManifestFile', _manifest)
+
+    if _fs_record:
+        script.set('FsRecord', _fs_record)
+
+    if _fs_replay:
+        script.set('FsReplay', _fs_replay)
+
+    if _fs_latency:
+        try:
+            _fs_latency = str(abs(float(_fs_latency)))
+            script.set('FsLatency', _fs_latency)
+        except (ValueError, TypeError):
+            script.logger.error(
+                'An invalid `fs_latency` (%s) was specified.' % (_fs_latency)
+            )
+            exit(EXIT_CODE.FAILURE)
+
+    if _plan_out:
+        script.set('PlanFile', _plan_out)
+
+    if _apply_plan:
+        script.set('ApplyPlan', _apply_plan)
+
+    if _metrics:
+        script.set('MetricsFile', _metrics)
+
+    if _estimate:
+        script.set('Estimate', 'Yes')
+
+    if _sample:
+        try:
+            _sample = str(abs(int(_sample)))
+            script.set('EstimateSample', _sample)
+        except (ValueError, TypeError):
+            script.logger.error(
+                'An invalid `sample` (%s) was specified.' % (
+                    _sample)
+            )
+            exit(EXIT_CODE.FAILURE)
+
+    if _profile:
+        script.set('ProfileFile', _profile)
+
+    if _trace_slow:
+        try:
+            _trace_slow = str(abs(float(_trace_slow)))
+            script.set('TraceSlow', _trace_slow)
+        except (ValueError, TypeError):
+            script.logger.error(
+                'An invalid `trace_slow` (%s) was specified.' % (_trace_slow)
+            )
+            exit(EXIT_CODE.FAILURE)
+
     if _encoding:
         script.set('SystemEncoding', _encoding)
 
@@ -1232,7 +6214,7 @@ if __name__ == "__main__":
         # Set our video extras
         script.set('VideoExtras', _video_extras)
 
-    if not script.get('VideoPaths') and videopaths:
+    if not script.get('VideoPaths') and (videopaths or _apply_plan):
         if not _encoding:
             # Force defaults if not set
             script.set('SystemEncoding', DEFAULT_SYSTEM_ENCODING)
@@ -1270,7 +6252,7 @@ if __name__ == "__main__":
         script.set('VideoPaths', videopaths)
 
     if script.script_mode is SCRIPT_MODE.NONE \
-            and not script.get('VideoPaths'):
+            and not script.get('VideoPaths') and not _apply_plan:
         # Provide some CLI help when VideoPaths has been
         # detected as not being identified
         parser.print_help()
@@ -0,0 +1,548 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# TidyIt Benchmarks
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+"""
+Builds synthetic media libraries and times TidyIt.py tidying them.
+
+A library is generated from a seed so the same one can be built again
+and again; it contains TV shows (with seasons), movies (with extras and
+samples), metadata/ directories, @eaDir directories, .tidysafe markers,
+zero byte files and content both old and new enough to be left alone.
+
+Each library size is tidied in each of the modes requested (a fresh copy
+of the library is generated for every run) and the wall time, peak memory
+(RSS), filesystem calls and (optionally) the system calls made are
+recorded.  The results can be written to a JSON file and compared against
+a previous one to spot regressions.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import tempfile
+import platform
+import subprocess
+from os.path import join
+from os.path import abspath
+from os.path import dirname
+from os.path import isdir
+from optparse import OptionParser
+
+# The script we benchmark
+TIDYIT_SCRIPT = join(dirname(dirname(abspath(__file__))), 'TidyIt.py')
+
+# The library sizes (in entries) benchmarked by default
+DEFAULT_SIZES = (10000, 100000, 1000000)
+
+# The modes benchmarked by default
+DEFAULT_MODES = ('preview', 'delete', 'move')
+
+# The default seed our libraries are generated from
+DEFAULT_SEED = 1
+
+# The percentage a result can grow by (compared to the baseline) before it's
+# considered a regression
+DEFAULT_TOLERANCE = 10.0
+
+# The age of our content (in seconds); it's well past TidyIt's minimum age
+CONTENT_AGE = 30 * 86400
+
+# The minimum age TidyIt is run with (in seconds)
+BENCH_MINAGE = 3600
+
+# The size of our (sparse) video files; comfortably above TidyIt's default
+# minimum video size
+VIDEO_SIZE = 200 * 1048576
+
+# The size of our sample videos
+SAMPLE_SIZE = 20 * 1048576
+
+# The version of our results file
+RESULTS_VERSION = 1
+
+# Used to pull the statistics TidyIt reports at the end of a run
+SCANNED_RE = re.compile(
+    r'Scanned (?P<dirs>\d+) directories; (?P<calls>\d+) filesystem call')
+HANDLED_RE = re.compile(r'Handled (?P<handled>\d+) item')
+STRACE_TOTAL_RE = re.compile(r'^\s*100\.00\s+\S+\s+\S+\s+(?P<calls>\d+)', re.M)
+
+
+class LibraryGenerator(object):
+    """
+    Generates a synthetic media library containing (roughly) the number of
+    entries (files and directories) requested.
+    """
+
+    def __init__(self, root, entries, seed=DEFAULT_SEED):
+        """
+        Initializes our generator
+        """
+        self.root = abspath(root)
+        self.target = entries
+        self.random = random.Random(seed)
+
+        # The entries we've created (in the order we created them)
+        self.entries = []
+
+        # The entries that are new enough to be left alone by TidyIt
+        self.recent = set()
+
+    def _dir(self, *path):
+        """
+        Creates a directory
+        """
+        path = join(*path)
+        os.makedirs(path)
+        self.entries.append(path)
+        return path
+
+    def _file(self, path, size=10):
+        """
+        Creates a file of the size specified; large files are sparse so
+        they take up no space at all
+        """
+        with open(path, 'wb') as f:
+            if size > 4096:
+                f.truncate(size)
+
+            elif size:
+                f.write(b'x' * size)
+
+        self.entries.append(path)
+        return path
+
+    def _extras(self, path, name):
+        """
+        Creates the extras that usually accompany a video
+        """
+        for suffix in ('.nfo', '.en.srt', '-thumb.jpg'):
+            if self.random.random() < 0.8:
+                self._file(join(path, name + suffix))
+
+    def _meta(self, path):
+        """
+        Sometimes adds the meta content media servers and NAS devices
+        like to leave behind
+        """
+        chance = self.random.random()
+        if chance < 0.10:
+            meta = self._dir(path, 'metadata')
+            for no in range(self.random.randint(1, 4)):
+                self._file(join(meta, 'poster.%d.jpg' % no))
+
+        elif chance < 0.20:
+            meta = self._dir(path, '@eaDir')
+            self._file(join(meta, 'SYNOINDEX_MEDIA_INFO'))
+
+        elif chance < 0.25:
+            self._file(join(path, 'Thumbs.db'))
+
+    def _show(self, no):
+        """
+        Creates a TV show
+        """
+        show = self._dir(self.root, 'TV', 'Show %.6d' % no)
+        self._file(join(show, 'tvshow.nfo'))
+        self._file(join(show, 'fanart.jpg'))
+
+        if self.random.random() < 0.02:
+            # This show is never to be touched
+            self._file(join(show, '.tidysafe'), size=0)
+
+        for season in range(1, self.random.randint(2, 6)):
+            path = self._dir(show, 'Season %.2d' % season)
+            self._meta(path)
+
+            # Some seasons have had all of their episodes removed (and
+            # some of those have nothing but artwork left in them)
+            removed = self.random.random() < 0.15
+            if removed and self.random.random() < 0.5:
+                self._file(join(path, 'folder.jpg'))
+                continue
+
+            for episode in range(1, self.random.randint(4, 14)):
+                name = 'Show.%.6d.S%.2dE%.2d' % (no, season, episode)
+                if not removed and self.random.random() < 0.85:
+                    self._file(join(path, name + '.mkv'), VIDEO_SIZE)
+                self._extras(path, name)
+
+            if self.random.random() < 0.05:
+                self._file(join(path, 'empty.txt'), size=0)
+
+            if self.random.random() < 0.03:
+                # Recently downloaded
+                self.recent.add(path)
+
+    def _movie(self, no):
+        """
+        Creates a movie
+        """
+        name = 'Movie.%.6d.1080p' % no
+        path = self._dir(self.root, 'Movies', 'Movie %.6d' % no)
+        self._meta(path)
+
+        chance = self.random.random()
+        if chance < 0.02:
+            self._file(join(path, '.tidysafe'), size=0)
+
+        if chance >= 0.90:
+            # The movie was removed; only it's artwork remains
+            for art in ('fanart.jpg', 'poster.jpg', 'folder.jpg'):
+                if self.random.random() < 0.7:
+                    self._file(join(path, art))
+            return
+
+        if chance < 0.85:
+            self._file(join(path, name + '.mkv'), VIDEO_SIZE)
+
+        if self.random.random() < 0.3:
+            self._file(join(path, name + '.sample.mkv'), SAMPLE_SIZE)
+
+        self._extras(path, name)
+
+        if self.random.random() < 0.2:
+            extras = self._dir(path, 'Extras')
+            for extra in range(self.random.randint(1, 3)):
+                self._file(join(extras, 'Featurette.%d.mkv' % extra),
+                           VIDEO_SIZE if chance < 0.85 else 0)
+
+        if self.random.random() < 0.05:
+            self._file(join(path, 'empty.txt'), size=0)
+
+        if self.random.random() < 0.03:
+            self.recent.add(path)
+
+    def generate(self):
+        """
+        Generates our library; the number of entries created is returned
+        """
+        if isdir(self.root):
+            shutil.rmtree(self.root)
+
+        self._dir(self.root, 'TV')
+        self._dir(self.root, 'Movies')
+
+        shows = 0
+        movies = 0
+        while len(self.entries) < self.target:
+            # Our libraries are roughly two thirds television
+            if self.random.random() < 0.66:
+                shows += 1
+                self._show(shows)
+
+            else:
+                movies += 1
+                self._movie(movies)
+
+        # Now that everything exists, we can age it (creating content
+        # changes the modification time of the directory it's in)
+        aged = time.time() - CONTENT_AGE
+        now = time.time()
+        for path in self.entries:
+            os.utime(path, (aged, aged))
+
+        for path in self.recent:
+            os.utime(path, (now, now))
+
+        return len(self.entries)
+
+
+def default_workdir():
+    """
+    Returns where our libraries are generated by default; memory backed
+    (tmpfs) storage is preferred so the disk doesn't skew our results
+    """
+    if isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+def exit_code(status):
+    """
+    Returns the exit code of a process from the status os.wait4() reported
+    for it; processes that were killed by a signal have the negative of
+    it's number returned (just like subprocess does)
+    """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def run_case(script, workdir, size, mode, seed, args=None, syscalls=False):
+    """
+    Generates a library of the size specified and tidies it in the mode
+    specified.  A dictionary of our results is returned.
+    """
+    library = join(workdir, 'library')
+    trash = join(workdir, 'trash')
+    log = join(workdir, 'tidyit.log')
+    if isdir(trash):
+        shutil.rmtree(trash)
+
+    entries = LibraryGenerator(library, size, seed=seed).generate()
+
+    command = [
+        sys.executable, script, '-a', str(BENCH_MINAGE),
+        join(library, 'TV'), join(library, 'Movies'),
+    ]
+    if mode == 'delete':
+        command.insert(2, '-c')
+
+    elif mode == 'move':
+        command[2:2] = ['-p', trash]
+
+    if args:
+        command[2:2] = args
+
+    with open(log, 'w') as fd:
+        start = time.time()
+        process = subprocess.Popen(command, stdout=fd, stderr=subprocess.STDOUT)
+        _, status, rusage = os.wait4(process.pid, 0)
+        wall = time.time() - start
+        process.returncode = exit_code(status)
+
+    with open(log) as fd:
+        output = fd.read()
+
+    result = {
+        'size': size,
+        'mode': mode,
+        'entries': entries,
+        'wall': round(wall, 4),
+        'cpu': round(rusage.ru_utime + rusage.ru_stime, 4),
+        # Linux reports this in kilobytes
+        'peak_rss_kb': rusage.ru_maxrss,
+        'status': process.returncode,
+        'dirs_scanned': None,
+        'fs_calls': None,
+        'handled': None,
+        'syscalls': None,
+    }
+
+    match = SCANNED_RE.search(output)
+    if match:
+        result['dirs_scanned'] = int(match.group('dirs'))
+        result['fs_calls'] = int(match.group('calls'))
+
+    match = HANDLED_RE.search(output)
+    if match:
+        result['handled'] = int(match.group('handled'))
+
+    if syscalls:
+        # Tracing slows everything down; so the system calls are counted
+        # on a run of their own (on a freshly generated library)
+        if isdir(trash):
+            shutil.rmtree(trash)
+        LibraryGenerator(library, size, seed=seed).generate()
+
+        summary = join(workdir, 'strace.txt')
+        with open(log, 'w') as fd:
+            subprocess.call(
+                ['strace', '-f', '-c', '-o', summary] + command,
+                stdout=fd, stderr=subprocess.STDOUT)
+
+        try:
+            with open(summary) as fd:
+                match = STRACE_TOTAL_RE.search(fd.read())
+            if match:
+                result['syscalls'] = int(match.group('calls'))
+
+        except (IOError, OSError):
+            pass
+
+    for path in (library, trash):
+        if isdir(path):
+            shutil.rmtree(path)
+
+    return result
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Prints our results next to the baseline specified; True is returned if
+    none of them regressed beyond the tolerance (a percentage) specified
+    """
+    previous = dict([
+        ((r['size'], r['mode']), r) for r in baseline.get('results', []) ])
+
+    okay = True
+    for result in results:
+        base = previous.get((result['size'], result['mode']))
+        if base is None:
+            continue
+
+        for key in ('wall', 'peak_rss_kb', 'fs_calls', 'syscalls'):
+            if not base.get(key) or result.get(key) is None:
+                continue
+
+            change = (result[key] - base[key]) * 100.0 / base[key]
+            regressed = change > tolerance
+            okay = okay and not regressed
+            print('%8d %-8s %-12s %14s -> %-14s %+7.1f%%%s' % (
+                result['size'], result['mode'], key, base[key], result[key],
+                change, ' REGRESSED' if regressed else ''))
+
+    return okay
+
+
+if __name__ == "__main__":
+    usage = "Usage: %prog [options]"
+    parser = OptionParser(usage=usage)
+    parser.add_option(
+        "-s",
+        "--sizes",
+        dest="sizes",
+        help="The library sizes (in entries) to benchmark separated " +\
+            "by a comma (,). The default is '%s'." % \
+            ','.join([ str(s) for s in DEFAULT_SIZES ]),
+        metavar="SIZES",
+    )
+    parser.add_option(
+        "-m",
+        "--modes",
+        dest="modes",
+        help="The modes to benchmark separated by a comma (,). The " +\
+            "default is '%s'." % ','.join(DEFAULT_MODES),
+        metavar="MODES",
+    )
+    parser.add_option(
+        "-S",
+        "--seed",
+        dest="seed",
+        type="int",
+        default=DEFAULT_SEED,
+        help="The seed our libraries are generated from. The default " +\
+            "is %d." % DEFAULT_SEED,
+        metavar="SEED",
+    )
+    parser.add_option(
+        "-w",
+        "--workdir",
+        dest="workdir",
+        help="The directory our libraries are generated in. The default " +\
+            "is '%s'." % default_workdir(),
+        metavar="PATH",
+    )
+    parser.add_option(
+        "-a",
+        "--args",
+        dest="args",
+        help="Additional arguments to pass to TidyIt.py (eg. '-j 4').",
+        metavar="ARGS",
+    )
+    parser.add_option(
+        "-o",
+        "--output",
+        dest="output",
+        help="Write our results to the JSON file specified.",
+        metavar="FILE",
+    )
+    parser.add_option(
+        "-c",
+        "--compare",
+        dest="compare",
+        help="Compare our results against a JSON file previously " +\
+            "written with --output; the exit code is non-zero if any " +\
+            "of them regressed.",
+        metavar="FILE",
+    )
+    parser.add_option(
+        "-t",
+        "--tolerance",
+        dest="tolerance",
+        type="float",
+        default=DEFAULT_TOLERANCE,
+        help="The percentage a result can grow by before it's considered " +\
+            "a regression. The default is %.1f%%." % DEFAULT_TOLERANCE,
+        metavar="PERCENT",
+    )
+    parser.add_option(
+        "--syscalls",
+        dest="syscalls",
+        action="store_true",
+        help="Count the system calls made (requires strace); this is " +\
+            "done with an additional run of each benchmark.",
+    )
+    parser.add_option(
+        "-g",
+        "--generate",
+        dest="generate",
+        help="Only generate a library (of the first size specified) in " +\
+            "the path specified.",
+        metavar="PATH",
+    )
+    options, _args = parser.parse_args()
+
+    sizes = DEFAULT_SIZES
+    if options.sizes:
+        sizes = [ int(s) for s in options.sizes.split(',') if s.strip() ]
+
+    modes = DEFAULT_MODES
+    if options.modes:
+        modes = [ m.strip().lower() for m in options.modes.split(',')
+                  if m.strip() ]
+
+    if options.generate:
+        entries = LibraryGenerator(
+            options.generate, sizes[0], seed=options.seed).generate()
+        print('Generated %d entries in %s' % (entries, options.generate))
+        sys.exit(0)
+
+    workdir = tempfile.mkdtemp(
+        prefix='tidyit-bench-', dir=options.workdir or default_workdir())
+
+    results = []
+    try:
+        for size in sizes:
+            for mode in modes:
+                result = run_case(
+                    TIDYIT_SCRIPT, workdir, size, mode, options.seed,
+                    args=options.args.split() if options.args else None,
+                    syscalls=options.syscalls)
+                results.append(result)
+                print('%8d %-8s %9.2fs %9d KB  fs_calls=%s syscalls=%s' % (
+                    result['size'], result['mode'], result['wall'],
+                    result['peak_rss_kb'], result['fs_calls'],
+                    result['syscalls']))
+
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if options.output:
+        with open(options.output, 'w') as fd:
+            json.dump({
+                'version': RESULTS_VERSION,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'seed': options.seed,
+                'args': options.args,
+                'results': results,
+            }, fd, indent=2, sort_keys=True)
+
+    if options.compare:
+        with open(options.compare) as fd:
+            baseline = json.load(fd)
+
+        if not compare(results, baseline, tolerance=options.tolerance):
+            sys.exit(1)
+
+    sys.exit(0)
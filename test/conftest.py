@@ -0,0 +1,86 @@
+# -*- encoding: utf-8 -*-
+#
+# Fixtures shared by the TidyIt tests
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+import os
+import logging
+
+import pytest
+
+from helpers import MINAGE
+from helpers import build_library
+
+import TidyIt
+from nzbget import SCRIPT_MODE
+
+
+@pytest.fixture
+def library(tmp_path):
+    """
+    Builds the library every test tidies; the (TV, Movies) library paths
+    are returned
+    """
+    return build_library(str(tmp_path / 'library'))
+
+
+@pytest.fixture
+def script(caplog):
+    """
+    Returns a function that prepares a TidyItScript (run in our own
+    process) to tidy the paths specified; any other keyword arguments
+    are set as options.  Everything the script logs is captured by caplog.
+    """
+    caplog.set_level(logging.DEBUG, logger='nzbget')
+    scripts = []
+
+    # Options are set in our environment (where the processes started
+    # after us would otherwise find them)
+    environ = dict(os.environ)
+
+    def _script(*paths, **options):
+        script = TidyIt.TidyItScript(
+            logger=False, debug=False, script_mode=SCRIPT_MODE.NONE)
+
+        settings = {
+            'SystemEncoding': TidyIt.DEFAULT_SYSTEM_ENCODING,
+            'Mode': TidyIt.TIDYIT_MODE.PREVIEW,
+            'VideoExtensions': TidyIt.DEFAULT_VIDEO_EXTENSIONS,
+            'VideoMinSize': TidyIt.DEFAULT_VIDEO_MIN_SIZE_MB,
+            'ProcessMinAge': MINAGE,
+            'SafeEntries': TidyIt.DEFAULT_TIDYSAFE_ENTRIES,
+            'AlwaysTrash': '.zip',
+            'MetaContent': '',
+            'MovePath': '',
+            'VideoExtras': '',
+            'CursorFile': '',
+            'VideoPaths': ', '.join(paths),
+        }
+        settings.update(options)
+        for key, value in settings.items():
+            script.set(key, value)
+
+        scripts.append(script)
+        return script
+
+    yield _script
+
+    # Our scripts all share the same logger; don't leave anything they
+    # added to it behind
+    for script in scripts:
+        if script._path_decoder is not None:
+            script.logger.removeFilter(script._path_decoder)
+
+    os.environ.clear()
+    os.environ.update(environ)
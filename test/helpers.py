@@ -0,0 +1,175 @@
+# -*- encoding: utf-8 -*-
+#
+# Helpers shared by the TidyIt tests
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+import os
+import re
+import sys
+import time
+import subprocess
+from os.path import join
+from os.path import abspath
+from os.path import dirname
+
+# The script we test
+TIDYIT_SCRIPT = join(dirname(dirname(abspath(__file__))), 'TidyIt.py')
+
+# Make TidyIt.py importable
+sys.path.insert(0, dirname(TIDYIT_SCRIPT))
+
+# The age of our content (in seconds); it's well past our minimum age
+CONTENT_AGE = 30 * 86400
+
+# The minimum age (in seconds) we tidy with
+MINAGE = 3600
+
+# The size of our (sparse) video files; comfortably above TidyIt's default
+# minimum video size
+VIDEO_SIZE = 200 * 1048576
+
+# Used to pull the content handled out of the log
+ACTION_RE = re.compile(
+    r'(PREVIEW ONLY: Handle|Removed|Moved|Removed \(already backed up\)) '
+    r'(FILE|DIRECTORY): (?P<path>.+)$', re.M)
+
+
+def make(path, size=10, age=CONTENT_AGE):
+    """
+    Creates a file of the size specified (large files are sparse) that was
+    last modified the number of seconds specified ago
+    """
+    if not os.path.isdir(dirname(path)):
+        os.makedirs(dirname(path))
+
+    with open(path, 'wb') as f:
+        if size:
+            f.seek(size - 1)
+            f.write(b'\0')
+
+    modified = time.time() - age
+    os.utime(path, (modified, modified))
+    return path
+
+
+def settle(root, age=CONTENT_AGE):
+    """
+    Ages every directory found beneath the root specified (the root
+    included); creating content in a directory makes it new again
+    """
+    modified = time.time() - age
+
+    # Libraries can be deeper than we can recurse
+    stack = [root]
+    paths = []
+    while stack:
+        path = stack.pop()
+        paths.append(path)
+        stack.extend([ e.path for e in os.scandir(path)
+                       if e.is_dir(follow_symlinks=False) ])
+
+    for path in reversed(paths):
+        os.utime(path, (modified, modified))
+
+
+def build_library(root):
+    """
+    Builds a small library of TV shows and movies; the content each tidy
+    of it handles is always the same (see HANDLED)
+    """
+    tv = join(root, 'TV')
+    season = join(tv, 'Show A', 'Season 1')
+    make(join(season, 'Show.A.S01E01.mkv'), VIDEO_SIZE)
+    make(join(season, 'Show.A.S01E01.en.srt'))
+    make(join(season, 'Show.A.S01E02.en.srt'))
+    make(join(season, 'Show.A.S01E02.nfo'))
+    make(join(season, 'metadata', 'Show.A.S01E01.jpg'))
+    make(join(tv, 'Show A', 'tvshow.nfo'))
+
+    # Nothing but junk is left of this show
+    make(join(tv, 'Show B', 'Season 1', 'Show.B.S01E01.zip'))
+    make(join(tv, 'Show B', 'Season 1', 'Thumbs.db'))
+
+    # A show protected by a safe entry
+    make(join(tv, 'Show C', '.tidysafe'), 0)
+    make(join(tv, 'Show C', 'Season 1', 'Show.C.S01E01.en.srt'))
+
+    movies = join(root, 'Movies')
+    movie = join(movies, 'Movie 1 (2001)')
+    make(join(movie, 'Movie.1.2001.mkv'), VIDEO_SIZE)
+    make(join(movie, 'Movie.1.2001.nfo'))
+    make(join(movie, 'junk.zip'))
+    make(join(movie, 'empty.txt'), 0)
+
+    # A movie with nothing but it's sample left
+    movie = join(movies, 'Movie 2 (2002)')
+    make(join(movie, 'Movie.2.2002-sample.mkv'), 1000)
+    make(join(movie, 'Thumbs.db'))
+
+    # Something we don't know what to do with
+    make(join(movies, 'Movie 3 (2003)', 'readme.unknown'))
+
+    os.makedirs(join(movies, 'Empty', 'Deeper'))
+
+    settle(root)
+    return tv, movies
+
+
+# The content (relative to the library root) a tidy of the library built
+# by build_library() with '.zip' marked as always trash handles
+HANDLED = set([
+    join('TV', 'Show A', 'Season 1', 'Show.A.S01E02.en.srt'),
+    join('TV', 'Show A', 'Season 1', 'Show.A.S01E02.nfo'),
+    join('TV', 'Show B', 'Season 1', 'Show.B.S01E01.zip'),
+    join('TV', 'Show B', 'Season 1', 'Thumbs.db'),
+    join('TV', 'Show B', 'Season 1'),
+    join('TV', 'Show B'),
+    join('Movies', 'Movie 1 (2001)', 'junk.zip'),
+    join('Movies', 'Movie 1 (2001)', 'empty.txt'),
+    join('Movies', 'Movie 2 (2002)', 'Movie.2.2002-sample.mkv'),
+    join('Movies', 'Movie 2 (2002)', 'Thumbs.db'),
+    join('Movies', 'Movie 2 (2002)'),
+    join('Movies', 'Empty', 'Deeper'),
+    join('Movies', 'Empty'),
+])
+
+
+def handled(output, root=None):
+    """
+    Returns the set of paths (relative to the root specified) the log
+    output specified reports as handled
+    """
+    paths = set(m.group('path') for m in ACTION_RE.finditer(output))
+    if root is None:
+        return paths
+
+    return set(os.path.relpath(p, root) for p in paths)
+
+
+def tidyit(*args, **kwargs):
+    """
+    Runs TidyIt.py (in a process of it's own) with the arguments specified
+    and returns it's exit code along with everything it logged.  Hash
+    randomization is always left enabled (just like it is for cron).
+    """
+    env = dict(os.environ)
+    env.update(kwargs.get('env', {}))
+    env['PYTHONHASHSEED'] = 'random'
+
+    process = subprocess.Popen(
+        [sys.executable, TIDYIT_SCRIPT] + [str(a) for a in args],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env,
+        cwd=kwargs.get('cwd'))
+    output = process.communicate()[0].decode('utf-8', 'replace')
+    return process.returncode, output
@@ -0,0 +1,101 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for handling content through a queue of action threads
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+import time
+import threading
+from os.path import join
+from os.path import exists
+from os.path import dirname
+
+import pytest
+
+from helpers import HANDLED
+from helpers import MINAGE
+from helpers import handled
+from helpers import tidyit
+
+import TidyIt
+
+
+class Handler(object):
+    """
+    Records the content it's asked to handle; the paths it's told to fail
+    on are reported as not handled
+    """
+
+    def __init__(self, fail=(), delay=0.0):
+        self.fail = set(fail)
+        self.delay = delay
+        self.handled = []
+        self._lock = threading.Lock()
+
+    def __call__(self, path, depth):
+        time.sleep(self.delay)
+        with self._lock:
+            self.handled.append(path)
+        return path not in self.fail
+
+
+@pytest.mark.parametrize('threads', (1, 4))
+def test_directory_last(threads):
+    """
+    A directory is only handled once everything within it has been
+    """
+    handler = Handler(delay=0.01)
+    queue = TidyIt.ActionQueue(handler, threads=threads)
+    for no in range(8):
+        assert queue.put('/lib/Show/file%d' % no, 2, size=10)
+    assert queue.put('/lib/Show', 1)
+    queue.close()
+
+    assert handler.handled[-1] == '/lib/Show'
+    assert queue.handled == 9
+    assert queue.failed == 0
+    assert queue.bytes == 80
+
+
+@pytest.mark.parametrize('threads', (1, 4))
+def test_failures_keep_directory(threads):
+    """
+    A directory whose content could not all be handled is left alone (and
+    so is it's parent)
+    """
+    handler = Handler(fail=['/lib/Show/Season 1/file1'])
+    queue = TidyIt.ActionQueue(handler, threads=threads)
+    assert queue.put('/lib/Show/Season 1/file0', 3)
+    assert queue.put('/lib/Show/Season 1/file1', 3)
+    assert not queue.put('/lib/Show/Season 1', 2)
+    assert not queue.put('/lib/Show', 1)
+    queue.close()
+
+    assert '/lib/Show/Season 1' not in handler.handled
+    assert '/lib/Show' not in handler.handled
+    assert queue.handled == 1
+    assert queue.failed == 1
+
+
+def test_action_threads(library):
+    """
+    Content is handled the same way no matter how many action threads
+    there are
+    """
+    root = dirname(library[0])
+    code, output = tidyit(
+        '-A', 4, '-c', '-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+    assert handled(output, root) == HANDLED
+    for path in HANDLED:
+        assert not exists(join(root, path))
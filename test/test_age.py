@@ -0,0 +1,60 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for the minimum age content must reach before it's tidied
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+from os.path import join
+from os.path import dirname
+
+from helpers import HANDLED
+from helpers import MINAGE
+from helpers import handled
+from helpers import make
+from helpers import tidyit
+
+
+def test_new_content(library):
+    """
+    A show directory holding anything newer than our minimum age is left
+    alone
+    """
+    root = dirname(library[0])
+    make(join(library[0], 'Show B', 'Season 1', 'new.zip'), age=60)
+
+    code, output = tidyit('-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+    assert not [ p for p in handled(output, root)
+                 if p.startswith(join('TV', 'Show B')) ]
+    assert join('Movies', 'Empty') in handled(output, root)
+
+
+def test_ctime(library):
+    """
+    Content moved into a library keeps it's modification time; it's age can
+    be taken from the time it was changed instead (our library was only
+    just built)
+    """
+    root = dirname(library[0])
+    code, output = tidyit('-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+    assert handled(output, root) == HANDLED
+
+    code, output = tidyit('--ctime', '-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+    assert not handled(output, root)
+
+    # Old enough either way
+    code, output = tidyit('--ctime', '-t', '.zip', '-a', 0, *library)
+    assert code == 0
+    assert handled(output, root) == HANDLED
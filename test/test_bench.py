@@ -0,0 +1,113 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for the benchmark suite
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+import os
+import sys
+import signal
+import subprocess
+from os.path import join
+from os.path import dirname
+
+import pytest
+
+from helpers import TIDYIT_SCRIPT
+
+# Make our benchmark suite importable
+sys.path.insert(0, join(dirname(TIDYIT_SCRIPT), 'bench'))
+
+import TidyItBench
+from nzbget import EXIT_CODE
+
+
+def wait_status(code):
+    """
+    Returns the status os.wait4() reports for a process that runs the
+    Python code specified
+    """
+    process = subprocess.Popen([sys.executable, '-c', code])
+    _, status, _ = os.wait4(process.pid, 0)
+
+    # We've already reaped it
+    process.returncode = 0
+    return status
+
+
+@pytest.mark.parametrize('code, expected', (
+    ('import sys; sys.exit(0)', 0),
+    ('import sys; sys.exit(1)', 1),
+    ('import sys; sys.exit(3)', 3),
+    ('import os, signal; os.kill(os.getpid(), signal.SIGKILL)',
+     -signal.SIGKILL),
+))
+def test_exit_code(code, expected):
+    """
+    The status of a process is turned into it's exit code
+    """
+    assert TidyItBench.exit_code(wait_status(code)) == expected
+
+
+def test_generate(tmp_path):
+    """
+    The same seed always generates the same library
+    """
+    first = TidyItBench.LibraryGenerator(str(tmp_path / 'a'), 500, seed=3)
+    second = TidyItBench.LibraryGenerator(str(tmp_path / 'b'), 500, seed=3)
+    assert first.generate() == second.generate()
+
+    assert [ os.path.relpath(p, first.root) for p in first.entries ] == \
+        [ os.path.relpath(p, second.root) for p in second.entries ]
+    assert first.entries
+
+
+@pytest.mark.parametrize('mode', TidyItBench.DEFAULT_MODES)
+def test_run_case(tmp_path, mode):
+    """
+    Each mode is run against a library of it's own and reported on
+    """
+    result = TidyItBench.run_case(
+        TIDYIT_SCRIPT, str(tmp_path), 500, mode, TidyItBench.DEFAULT_SEED)
+    assert result['status'] == 0
+    assert result['mode'] == mode
+    assert result['dirs_scanned']
+    assert result['fs_calls']
+    assert result['handled']
+
+
+def test_run_case_failure(tmp_path):
+    """
+    A run that fails reports it's exit code (and not the status the
+    operating system reported it with)
+    """
+    result = TidyItBench.run_case(
+        TIDYIT_SCRIPT, str(tmp_path), 100, 'preview',
+        TidyItBench.DEFAULT_SEED, args=['--jobs=bad'])
+    assert result['status'] == EXIT_CODE.FAILURE
+
+
+def test_compare(capsys):
+    """
+    Results that grew beyond our tolerance are regressions
+    """
+    baseline = {'results': [
+        {'size': 10, 'mode': 'preview', 'wall': 1.0, 'fs_calls': 100}]}
+
+    assert TidyItBench.compare([
+        {'size': 10, 'mode': 'preview', 'wall': 1.05, 'fs_calls': 100}],
+        baseline)
+    assert not TidyItBench.compare([
+        {'size': 10, 'mode': 'preview', 'wall': 2.0, 'fs_calls': 100}],
+        baseline)
+    assert 'REGRESSED' in capsys.readouterr().out
@@ -0,0 +1,92 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for classifying filenames
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+import re
+
+import pytest
+
+import TidyIt
+from TidyIt import TidyCategory
+
+
+@pytest.fixture
+def classifier():
+    """
+    A classifier using the default video extensions and the '.zip' files
+    marked as always trash
+    """
+    return TidyIt.FilenameClassifier(
+        re.compile(r'(\.mkv|\.avi|\.mp4)$', re.IGNORECASE),
+        TidyIt.VIDEO_ALIKE_FILES_RE,
+        always_trash=re.compile(r'(\.zip)$', re.IGNORECASE),
+    )
+
+
+@pytest.mark.parametrize('name, expected', (
+    ('Movie.2001.mkv', (TidyCategory.VIDEO, None)),
+    ('Movie.2001.MKV', (TidyCategory.VIDEO, None)),
+    ('Movie.2001-sample.mkv', (TidyCategory.SAMPLE, None)),
+    ('sample-Movie.2001.avi', (TidyCategory.SAMPLE, None)),
+    ('poster.jpg', (TidyCategory.MEDIAMETA, None)),
+    ('season01-poster.jpg', (TidyCategory.MEDIAMETA, None)),
+    ('tvshow.nfo', (TidyCategory.MEDIAMETA, None)),
+    ('junk.zip', (TidyCategory.ALWAYS_TRASH, None)),
+    ('Movie.2001.en.srt', (TidyCategory.EXTRA, 'Movie.2001')),
+    ('Movie.2001-thumb.jpg', (TidyCategory.EXTRA, 'Movie.2001')),
+    ('Movie.2001.nfo', (TidyCategory.EXTRA, 'Movie.2001')),
+    ('readme.unknown', (TidyCategory.UNKNOWN, None)),
+))
+def test_classify(classifier, name, expected):
+    """
+    Filenames are classified into their category (and extras are given
+    the name of the video they belong to)
+    """
+    assert classifier.classify(name) == expected
+
+
+def test_classify_without_always_trash():
+    """
+    Nothing is trashed unless we were told to
+    """
+    classifier = TidyIt.FilenameClassifier(
+        re.compile(r'(\.mkv)$'), TidyIt.VIDEO_ALIKE_FILES_RE)
+    assert classifier.classify('junk.zip') == (TidyCategory.UNKNOWN, None)
+
+
+def test_classify_cached(classifier):
+    """
+    The verdict on a filename is only ever worked out once
+    """
+    if not hasattr(classifier.classify, 'cache_info'):
+        pytest.skip('lru_cache is not supported')
+
+    for _ in range(3):
+        classifier.classify('Movie.2001.en.srt')
+
+    info = classifier.classify.cache_info()
+    assert info.misses == 1
+    assert info.hits == 2
+
+
+def test_classify_extras_first():
+    """
+    The extras a user identifies are matched before our own
+    """
+    extras = [re.compile(r'^(?P<filename>.*)(\.forced\.srt)$', re.I)] + \
+        list(TidyIt.VIDEO_ALIKE_FILES_RE)
+    classifier = TidyIt.FilenameClassifier(re.compile(r'(\.mkv)$'), extras)
+    assert classifier.classify('Movie.forced.srt') == \
+        (TidyCategory.EXTRA, 'Movie')
@@ -0,0 +1,161 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for moving content by renaming it (or copying it to another device)
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+import os
+import re
+import json
+from errno import EXDEV
+from errno import ENOSPC
+from os.path import join
+from os.path import exists
+from os.path import dirname
+
+import pytest
+
+from helpers import HANDLED
+from helpers import MINAGE
+from helpers import handled
+from helpers import tidyit
+
+import TidyIt
+
+# The content we copy; it's larger than a single chunk
+CONTENT = os.urandom(1024) * (TidyIt.COPY_CHUNK_SIZE // 1024 + 3)
+
+
+def unsupported(*args):
+    """
+    A copy method our kernel doesn't support
+    """
+    raise OSError(EXDEV, os.strerror(EXDEV))
+
+
+@pytest.mark.parametrize('methods', ('kernel', 'sendfile', 'none'))
+def test_copy_file(tmp_path, monkeypatch, methods):
+    """
+    Files are copied exactly; no matter how we have to copy them
+    """
+    if methods in ('sendfile', 'none'):
+        monkeypatch.setattr(TidyIt, 'copy_file_range', unsupported)
+    if methods == 'none':
+        monkeypatch.setattr(TidyIt, 'sendfile', unsupported)
+
+    src = str(tmp_path / 'src')
+    dst = str(tmp_path / 'dst')
+    with open(src, 'wb') as f:
+        f.write(CONTENT)
+    os.utime(src, (1000000, 1000000))
+
+    assert TidyIt._copy_file(src, dst) == len(CONTENT)
+    with open(dst, 'rb') as f:
+        assert f.read() == CONTENT
+
+    # It's modification time is kept
+    assert os.stat(dst).st_mtime == 1000000
+
+
+def test_copy_file_failure(tmp_path, monkeypatch):
+    """
+    A partial copy is never left behind
+    """
+    def full(*args):
+        raise OSError(ENOSPC, os.strerror(ENOSPC))
+
+    monkeypatch.setattr(TidyIt, 'copy_file_range', full)
+    monkeypatch.setattr(TidyIt, 'sendfile', full)
+
+    src = str(tmp_path / 'src')
+    dst = str(tmp_path / 'dst')
+    with open(src, 'wb') as f:
+        f.write(CONTENT)
+
+    with pytest.raises(OSError):
+        TidyIt._copy_file(src, dst)
+    assert not exists(dst)
+
+
+def test_move_renamed(library, tmp_path):
+    """
+    Content on the same device as our move path is renamed
+    """
+    trash = str(tmp_path / 'trash')
+    code, output = tidyit(
+        '-D', '-p', trash, '-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+    assert re.search(r'Moved [1-9][0-9]* item\(s\) by renaming them\.', output)
+    assert 'had to be copied' not in output
+
+
+def test_move_copied(library, tmp_path, script, caplog, monkeypatch):
+    """
+    Content that can't be renamed to our move path (because it resides
+    on another device) is copied there instead
+    """
+    monkeypatch.setattr(TidyIt.OSFilesystem, 'rename', unsupported)
+
+    root = dirname(library[0])
+    trash = str(tmp_path / 'trash')
+    _script = script(*library, Mode=TidyIt.TIDYIT_MODE.MOVE, MovePath=trash)
+    assert _script.tidy() is None
+
+    assert handled(caplog.text, root) == HANDLED
+    for path in HANDLED:
+        assert not exists(join(root, path))
+
+    assert exists(join(trash, 'junk.zip'))
+    assert exists(join(trash, 'Show B', 'Season 1', 'Show.B.S01E01.zip'))
+    assert 'had to be copied to another device' in caplog.text
+
+
+def test_move_copied_recorded(library, tmp_path, script, monkeypatch):
+    """
+    Content copied to our move path is copied (and removed) through the
+    filesystem our libraries are scanned through
+    """
+    monkeypatch.setattr(TidyIt.OSFilesystem, 'rename', unsupported)
+    monkeypatch.setattr(TidyIt.OSFilesystem, 'link', unsupported)
+
+    trash = str(tmp_path / 'trash')
+    recording = str(tmp_path / 'library.fs')
+    _script = script(
+        *library, Mode=TidyIt.TIDYIT_MODE.MOVE, MovePath=trash,
+        FsRecord=recording)
+    assert _script.tidy() is None
+    assert exists(join(trash, 'junk.zip'))
+
+    with open(recording, 'r') as f:
+        calls = [ json.loads(line) for line in f ]
+
+    copied = [ c['path'] for c in calls if c['op'] == 'copy' ]
+    assert join(library[1], 'Movie 1 (2001)', 'junk.zip') in copied
+    assert join(library[1], 'Movie 1 (2001)', 'junk.zip') in [
+        c['path'] for c in calls if c['op'] == 'unlink' ]
+
+
+def test_moves_not_shared(script):
+    """
+    Each script tracks what it has moved on it's own
+    """
+    first = script()
+    second = script()
+    assert first._configure() is not None
+    assert second._configure() is not None
+
+    first._moves['renamed'] += 1
+    first._move_devices['/library'] = True
+    assert second._moves['renamed'] == 0
+    assert second._move_devices == {}
+    assert first._move_lock is not second._move_lock
@@ -0,0 +1,176 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for time budgeted scans (and resuming them)
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+import json
+from os.path import join
+from os.path import exists
+
+import pytest
+
+from helpers import make
+from helpers import settle
+
+import TidyIt
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    """
+    Returns a function that runs out of time once the number of show/movie
+    directories specified have been entered; the show/movie directories
+    entered are collected in the list returned with it
+    """
+    entered = []
+    _tidy_enter = TidyIt.TidyItScript._tidy_enter
+
+    def _budget(shows):
+        def _enter(self, path, depth, *args, **kwargs):
+            if depth == 2:
+                entered.append(path)
+
+            if self._deadline is not None and len(entered) >= shows:
+                # Out of time (once this directory is scanned)
+                self._deadline = 0
+            return _tidy_enter(self, path, depth, *args, **kwargs)
+
+        del entered[:]
+        monkeypatch.setattr(TidyIt.TidyItScript, '_tidy_enter', _enter)
+        return entered
+
+    return _budget
+
+
+@pytest.fixture
+def ordered(monkeypatch):
+    """
+    Our library paths are returned in the order they were specified in
+    (rather than one that changes from one process to the next)
+    """
+    monkeypatch.setattr(
+        TidyIt.TidyItScript, 'parse_path_list',
+        lambda self, *args: [
+            p.strip() for a in args for p in a.split(',') if p.strip() ])
+
+
+def cursor_entry(cursor_file):
+    """
+    Returns the (root, entry) the cursor file specified left off at
+    """
+    with open(cursor_file, 'r') as f:
+        cursor = json.load(f)
+    return cursor['root'], cursor['entry']
+
+
+def test_resume_after_finished_directory(tmp_path, script, budget):
+    """
+    The cursor records the last show directory we finished scanning (never
+    a file or a meta directory found beside it) and the next run carries
+    on with the one that follows it
+    """
+    tv = str(tmp_path / 'TV')
+    for show in ('Show A', 'Show B', 'Show C'):
+        make(join(tv, show, 'Season 1', 'junk.zip'))
+    make(join(tv, 'Show A.nfo'))
+    make(join(tv, 'metadata', 'Show A.jpg'))
+    settle(tv)
+
+    cursor_file = str(tmp_path / 'tidyit.cursor')
+    options = {
+        'MaxRuntime': 3600, 'CursorFile': cursor_file, 'MetaContent': '.nfo'}
+
+    entered = budget(1)
+    assert script(tv, **options).tidy() is None
+    assert cursor_entry(cursor_file) == (tv, 'Show A')
+    assert join(tv, 'Show A') in entered
+    assert join(tv, 'Show B') not in entered
+
+    entered = budget(5)
+    assert script(tv, **options).tidy() is None
+    assert join(tv, 'Show A') not in entered
+    assert join(tv, 'Show B') in entered
+    assert join(tv, 'Show C') in entered
+
+    # Our pass of the library is complete
+    assert not exists(cursor_file)
+
+
+def test_stop_before_anything(tmp_path, script, budget):
+    """
+    Running out of time before any show directory was finished leaves the
+    next run to start the library over
+    """
+    tv = str(tmp_path / 'TV')
+    for show in ('Show A', 'Show B'):
+        make(join(tv, show, 'Season 1', 'junk.zip'))
+    settle(tv)
+
+    cursor_file = str(tmp_path / 'tidyit.cursor')
+    options = {'MaxRuntime': 3600, 'CursorFile': cursor_file}
+
+    budget(0)
+    assert script(tv, **options).tidy() is None
+    assert cursor_entry(cursor_file) == (tv, None)
+
+    entered = budget(5)
+    assert script(tv, **options).tidy() is None
+    assert entered == [join(tv, 'Show A'), join(tv, 'Show B')]
+
+def test_library_order(library, tmp_path, script, budget, ordered):
+    """
+    Libraries are scanned in the same order every run (no matter what
+    order they were specified in); those before the cursor are the ones
+    an earlier run finished
+    """
+    tv, movies = library
+    cursor_file = str(tmp_path / 'tidyit.cursor')
+    options = {'MaxRuntime': 3600, 'CursorFile': cursor_file}
+
+    # Movies sorts ahead of TV
+    entered = budget(1)
+    assert script(tv, movies, **options).tidy() is None
+    assert cursor_entry(cursor_file) == (movies, 'Empty')
+    assert not [ p for p in entered if p.startswith(tv) ]
+
+    entered = budget(100)
+    assert script(movies, tv, **options).tidy() is None
+    assert join(movies, 'Empty') not in entered
+    assert join(movies, 'Movie 1 (2001)') in entered
+    assert join(tv, 'Show A') in entered
+    assert not exists(cursor_file)
+
+
+def test_watch_every_library(library, tmp_path, script, budget, monkeypatch):
+    """
+    Every library is watched once our (time budgeted) scan is done; even
+    the ones it never made it to
+    """
+    watched = []
+    monkeypatch.setattr(
+        TidyIt.TidyItScript, 'watch',
+        lambda self, paths, options: watched.extend(paths))
+
+    tv, movies = library
+    cursor_file = str(tmp_path / 'tidyit.cursor')
+    options = {'MaxRuntime': 3600, 'CursorFile': cursor_file}
+
+    # An earlier run already finished with our Movies
+    with open(cursor_file, 'w') as f:
+        json.dump({'root': tv, 'entry': None}, f)
+
+    entered = budget(100)
+    assert script(tv, movies, **options).tidy(watch=True) is None
+    assert not [ p for p in entered if p.startswith(movies) ]
+    assert sorted(watched) == sorted([tv, movies])
@@ -0,0 +1,142 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for logging names that can't be decoded
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+import os
+import sys
+import logging
+
+import pytest
+
+from helpers import MINAGE
+from helpers import make
+from helpers import settle
+from helpers import tidyit
+
+import TidyIt
+
+pytestmark = pytest.mark.skipif(
+    sys.getfilesystemencoding().lower() not in ('utf-8', 'utf8'),
+    reason='names are not read as utf-8 on this system')
+
+
+def decoded(encoding, message, *args):
+    """
+    Returns the message specified once a PathDecoder has looked at it
+    """
+    record = logging.LogRecord(
+        'nzbget', logging.INFO, __file__, 0, message, args, None)
+    assert TidyIt.PathDecoder(encoding).filter(record)
+    return record.getMessage()
+
+
+def test_decodable_message():
+    """
+    Messages free of undecoded names are left alone
+    """
+    record = logging.LogRecord(
+        'nzbget', logging.INFO, __file__, 0, u'Handle FILE: %s',
+        (u'caf\xe9.zip', ), None)
+    assert TidyIt.PathDecoder('latin-1').filter(record)
+    assert record.msg == u'Handle FILE: %s'
+    assert record.getMessage() == u'Handle FILE: caf\xe9.zip'
+
+
+def test_latin_1():
+    """
+    A name written in latin-1 is decoded with it
+    """
+    name = os.fsdecode(b'caf\xe9.zip')
+    assert decoded('latin-1', u'Handle FILE: %s', name) == \
+        u'Handle FILE: caf\xe9.zip'
+
+
+def test_utf_16():
+    """
+    Only the bytes that couldn't be decoded are; the rest of the message
+    (and of the name) is never garbled by an encoding that reads it's text
+    differently
+    """
+    name = os.fsdecode(b'/library/\xff\xfeA.zip')
+    message = decoded('utf-16', u'Handle FILE: %s (%d bytes)', name, 10)
+    assert message.startswith(u'Handle FILE: /library/')
+    assert message.endswith(u'A.zip (10 bytes)')
+    assert u'\udcff' not in message
+
+
+def test_logged_names(tmp_path):
+    """
+    Names that can't be decoded are logged (and handled) all the same
+    """
+    root = str(tmp_path / 'TV')
+    junk = os.path.join(
+        os.fsencode(root), b'Show A', b'Season 1', b'caf\xe9.zip')
+    make(os.fsdecode(junk))
+    settle(root)
+
+    code, output = tidyit(
+        '-n', 'latin-1', '-c', '-t', '.zip', '-a', MINAGE, root)
+    assert code == 0
+    assert u'Removed FILE: %s' % os.path.join(
+        root, 'Show A', 'Season 1', u'caf\xe9.zip') in output
+    assert not os.path.exists(junk)
+
+
+def test_undecodable_library(tmp_path):
+    """
+    A library whose name isn't valid UTF-8 can be indexed, locked,
+    recorded, planned and reported on
+    """
+    root = os.fsdecode(os.path.join(os.fsencode(str(tmp_path)), b'T\xe9l\xe9'))
+    junk = os.path.join(root, 'Show A', 'Season 1', 'junk.zip')
+    make(junk)
+    settle(root)
+
+    lock_dir = str(tmp_path / 'locks')
+    os.makedirs(lock_dir)
+    metrics = str(tmp_path / 'tidyit.prom')
+    args = (
+        '-n', 'latin-1', '-i', str(tmp_path / 'index.db'), '--lock-dir',
+        lock_dir, '--metrics', metrics, '-t', '.zip', '-a', MINAGE)
+
+    code, output = tidyit(
+        '--fs-record', str(tmp_path / 'library.fs'), '--plan-out',
+        str(tmp_path / 'tidyit.plan'), *(args + (root, )))
+    assert code == 0
+    assert u'Handle FILE: %s' % os.path.join(
+        str(tmp_path), u'T\xe9l\xe9', 'Show A', 'Season 1', 'junk.zip') \
+        in output
+
+    with open(metrics, 'rb') as f:
+        assert u'T\xe9l\xe9'.encode('utf-8') in f.read()
+
+    # A manifest of it is read exactly as it was written
+    manifest = str(tmp_path / 'manifest')
+    with open(manifest, 'wb') as f:
+        for path, kind in (
+                (root, 'd'),
+                (os.path.join(root, 'Show A'), 'd'),
+                (os.path.join(root, 'Show A', 'Season 1'), 'd'),
+                (junk, 'f')):
+            f.write(os.fsencode(path) + b'\t10\t1000\t' + kind.encode() +
+                    b'\n')
+
+    code, output = tidyit('--manifest', manifest, *(args + (root, )))
+    assert code == 0
+    assert 'Skipped' not in output
+
+    code, output = tidyit('-c', *(args + (root, )))
+    assert code == 0
+    assert not os.path.exists(junk)
@@ -0,0 +1,108 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for estimating what tidying a library would handle
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+import re
+from os.path import join
+from os.path import exists
+from os.path import dirname
+
+import pytest
+
+from helpers import HANDLED
+from helpers import MINAGE
+from helpers import make
+from helpers import settle
+from helpers import tidyit
+
+import TidyIt
+
+# Used to pull the total estimated out of the log
+TOTAL_RE = re.compile(
+    r'total: (?P<items>\d+) item\(s\) \(\+/- (?P<error>\d+)\)')
+
+
+def test_extrapolate():
+    """
+    A sample of the entire population is exact; anything less comes with
+    some uncertainty
+    """
+    assert TidyIt._extrapolate([1, 2, 3], 3) == (6.0, 0.0)
+
+    total, variance = TidyIt._extrapolate([1, 3], 10)
+    assert total == pytest.approx(20.0)
+    assert variance == pytest.approx(10 ** 2 * 0.8 * 2.0 / 2)
+
+    assert TidyIt._extrapolate([0, 0], 10) == (0.0, 0.0)
+
+
+def test_estimate_entire_library(library, tmp_path):
+    """
+    An estimate from every show/movie directory matches what a full run
+    plans (and what it planned is shown alongside it); nothing is changed
+    """
+    root = dirname(library[0])
+    metrics = str(tmp_path / 'metrics.json')
+    code, output = tidyit(
+        '--metrics', metrics, '-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+
+    code, output = tidyit(
+        '--estimate', '--metrics', metrics, '-c', '-t', '.zip', '-a', MINAGE,
+        *library)
+    assert code == 0
+    assert 'Estimated from 7 of 7 show/movie director(ies)' in output
+
+    match = TOTAL_RE.search(output)
+    assert match is not None
+    assert int(match.group('items')) == len(HANDLED)
+    assert int(match.group('error')) == 0
+    assert 'the last full run planned %d item(s)' % len(HANDLED) in output
+    for path in HANDLED:
+        assert exists(join(root, path))
+
+
+def test_estimate_sample(tmp_path):
+    """
+    A sample of a library is extrapolated to all of it
+    """
+    root = str(tmp_path / 'TV')
+    for no in range(40):
+        make(join(root, 'Show %.2d' % no, 'Season 1', 'junk.zip'))
+    settle(root)
+
+    code, output = tidyit(
+        '--estimate', '--sample', 10, '-t', '.zip', '-a', MINAGE, root)
+    assert code == 0
+    assert 'Estimated from 10 of 40 show/movie director(ies)' in output
+
+    # Every show is the same; so is every sample of them
+    match = TOTAL_RE.search(output)
+    assert match is not None
+    assert int(match.group('items')) == 40 * 3
+    assert int(match.group('error')) == 0
+
+
+def test_estimate_empty(tmp_path):
+    """
+    There's nothing to estimate from a library without any show/movie
+    directories
+    """
+    root = str(tmp_path / 'TV')
+    make(join(root, 'readme.txt'))
+
+    code, output = tidyit('--estimate', '-a', MINAGE, root)
+    assert code == 0
+    assert 'No show/movie directories were found to estimate from.' in output
@@ -0,0 +1,87 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for keeping scans out of excluded directories
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+from os.path import join
+from os.path import dirname
+
+import pytest
+
+from helpers import HANDLED
+from helpers import MINAGE
+from helpers import handled
+from helpers import tidyit
+
+import TidyIt
+
+
+@pytest.mark.parametrize('pattern, matched, unmatched', (
+    ('Show B', ['Show B'], ['Show BB', 'Show A/Show B']),
+    ('*/Extras', ['Show A/Extras'], ['Extras', 'Show A/Season 1/Extras']),
+    ('**/.snapshot', ['.snapshot', 'Show A/Season 1/.snapshot'],
+        ['Show A/.snapshots']),
+))
+def test_glob_re(pattern, matched, unmatched):
+    """
+    A star matches within a single directory name while a double star
+    matches any number of directories
+    """
+    regex = TidyIt.re.compile('^%s$' % TidyIt.glob_re(pattern))
+    for path in matched:
+        assert regex.match(path)
+
+    for path in unmatched:
+        assert not regex.match(path)
+
+
+def test_exclude(library):
+    """
+    Nothing within an excluded directory is handled (and the directories
+    it resides in are kept)
+    """
+    root = dirname(library[0])
+    code, output = tidyit(
+        '--exclude', 'Show B, */Deeper', '-t', '.zip', '-a', MINAGE,
+        *library)
+    assert code == 0
+    assert handled(output, root) == HANDLED - set([
+        join('TV', 'Show B', 'Season 1', 'Show.B.S01E01.zip'),
+        join('TV', 'Show B', 'Season 1', 'Thumbs.db'),
+        join('TV', 'Show B', 'Season 1'),
+        join('TV', 'Show B'),
+        join('Movies', 'Empty', 'Deeper'),
+        join('Movies', 'Empty'),
+    ])
+
+
+@pytest.mark.parametrize('exclude', (
+    'Show B,*/Deeper',
+    ' Show B ,  */Deeper ',
+    'Show B\n*/Deeper',
+    'Show B\r\n\r\n*/Deeper\n',
+))
+def test_exclude_delimiters(library, script, exclude):
+    """
+    Excluded directories can be delimited by commas or new lines; the
+    spaces within their names are kept
+    """
+    s = script(*library, ExcludePaths=exclude)
+    assert s._configure()
+    for path in (join(library[0], 'Show B'),
+                 join(library[1], 'Empty', 'Deeper')):
+        assert s._exclude.match(path)
+
+    for path in (join(library[0], 'Show'), join(library[1], 'Empty')):
+        assert not s._exclude.match(path)
@@ -0,0 +1,170 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for the filesystems libraries are scanned through
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+import time
+from os.path import dirname
+
+import pytest
+
+from helpers import HANDLED
+from helpers import MINAGE
+from helpers import handled
+from helpers import tidyit
+
+import TidyIt
+from nzbget import EXIT_CODE
+
+
+@pytest.fixture
+def memfs():
+    """
+    Returns a small library kept in memory
+    """
+    fs = TidyIt.MemoryFilesystem()
+    fs.add('/library/TV/Show A/Season 1/Show.A.S01E01.mkv', 'f', 100, 1000)
+    fs.add('/library/TV/Show A/tvshow.nfo', 'f', 10, 1000)
+    return fs
+
+
+def test_memory_filesystem(memfs):
+    """
+    The directories an entry resides in are created along with it
+    """
+    assert memfs.isdir('/library/TV/Show A')
+    assert not memfs.isdir('/library/TV/Show A/tvshow.nfo')
+    assert memfs.lexists('/library/TV/Show A/tvshow.nfo')
+    assert not memfs.lexists('/library/TV/Show B')
+    assert memfs.stat('/library/TV/Show A/tvshow.nfo').st_size == 10
+
+    entries = sorted(
+        memfs.scandir('/library/TV/Show A'), key=lambda e: e.name)
+    assert [ (e.name, e.is_dir()) for e in entries ] == [
+        ('Season 1', True), ('tvshow.nfo', False)]
+
+    memfs.rename('/library/TV/Show A', '/library/TV/Show B')
+    assert memfs.isdir('/library/TV/Show B/Season 1')
+    assert not memfs.lexists('/library/TV/Show A')
+
+    memfs.rmtree('/library/TV/Show B')
+    assert memfs.scandir('/library/TV') == []
+
+
+def test_memory_filesystem_latency(memfs):
+    """
+    Every call takes (at least) as long as the latency we were given
+    """
+    memfs.latency = 0.02
+    started = time.time()
+    for _ in range(5):
+        memfs.isdir('/library/TV')
+    assert time.time() - started >= 0.1
+
+
+def test_fs_latency(library, tmp_path, script):
+    """
+    The latency we're configured with (in milliseconds) is added to a
+    manifest or a replayed recording; never to our real filesystem
+    """
+    manifest = str(tmp_path / 'library.manifest')
+    with open(manifest, 'w') as f:
+        f.write('%s\t0\t1000\td\n' % library[0])
+
+    s = script(library[0], ManifestFile=manifest, FsLatency='25')
+    s._configure()
+    assert s._open_filesystem()
+    assert isinstance(s._fs, TidyIt.MemoryFilesystem)
+    assert s._fs.latency == pytest.approx(0.025)
+    s._close_filesystem()
+
+    recording = str(tmp_path / 'library.fs')
+    open(recording, 'w').close()
+    s = script(
+        library[0], ManifestFile='', FsReplay=recording, FsLatency='25')
+    s._configure()
+    assert s._open_filesystem()
+    assert isinstance(s._fs, TidyIt.ReplayFilesystem)
+    assert s._fs.latency == pytest.approx(0.025)
+    s._close_filesystem()
+
+
+def test_fs_latency_invalid(library):
+    """
+    A latency that isn't a number is refused
+    """
+    code, output = tidyit('--fs-latency', 'slow', *library)
+    assert code == EXIT_CODE.FAILURE
+
+
+def test_record_replay(library, tmp_path):
+    """
+    A recorded run can be replayed (slowly too); every call made by the
+    replay was recorded
+    """
+    root = dirname(library[0])
+    recording = str(tmp_path / 'library.fs')
+    code, output = tidyit(
+        '--fs-record', recording, '-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+    assert handled(output, root) == HANDLED
+
+    code, output = tidyit(
+        '--fs-replay', recording, '--fs-latency', 1, '-t', '.zip',
+        '-a', MINAGE, *library)
+    assert code == 0
+    assert 'were not found in recording' not in output
+    assert handled(output, root) == HANDLED
+
+
+def test_memory_filesystem_copy(memfs):
+    """
+    A directory is copied along with everything within it; nothing is
+    copied over the top of an existing entry
+    """
+    memfs.add('/library/TV/Show A/Season 1/link', 'l')
+    assert memfs.islink('/library/TV/Show A/Season 1/link')
+    assert not memfs.islink('/library/TV/Show A/tvshow.nfo')
+    assert not memfs.islink('/library/TV/Show B')
+
+    memfs.copy('/library/TV/Show A', '/library/TV/Show B')
+    assert memfs.lexists('/library/TV/Show B/Season 1/Show.A.S01E01.mkv')
+    assert memfs.lexists('/library/TV/Show A/Season 1/Show.A.S01E01.mkv')
+
+    with pytest.raises(OSError):
+        memfs.copy(
+            '/library/TV/Show A/tvshow.nfo', '/library/TV/Show B/tvshow.nfo')
+
+
+def test_recorded_entries(library, tmp_path):
+    """
+    The entries listed by a recording filesystem can be asked what they
+    are without following symbolic links (just like os.DirEntry objects)
+    """
+    fs = TidyIt.RecordingFilesystem(
+        TidyIt.OSFilesystem(), str(tmp_path / 'library.fs'))
+    try:
+        entries = dict(
+            (e.name, e) for e in fs.scandir(dirname(library[0])))
+        assert entries['TV'].is_dir(follow_symlinks=False)
+        assert not entries['TV'].is_file(follow_symlinks=False)
+
+    finally:
+        fs.close()
+
+    entries = dict(
+        (e.name, e) for e in TidyIt.ReplayFilesystem(
+            str(tmp_path / 'library.fs')).scandir(dirname(library[0])))
+    assert entries['TV'].is_dir(follow_symlinks=False)
+    assert not entries['TV'].is_file(follow_symlinks=False)
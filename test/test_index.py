@@ -0,0 +1,143 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for the persistent scan index
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+import os
+import re
+from os.path import join
+from os.path import dirname
+
+from helpers import HANDLED
+from helpers import MINAGE
+from helpers import handled
+from helpers import make
+from helpers import settle
+from helpers import tidyit
+
+import TidyIt
+
+# Used to pull the index hits (and misses) out of the log
+INDEX_RE = re.compile(r'Scan index: (?P<hits>\d+) hit\(s\), (?P<misses>\d+)')
+
+
+def index_hits(output):
+    """
+    Returns the (hits, misses) the log output specified reports
+    """
+    match = INDEX_RE.search(output)
+    assert match is not None
+    return int(match.group('hits')), int(match.group('misses'))
+
+
+def test_index_reused_across_processes(library, tmp_path):
+    """
+    Every run is a process of it's own (with hash randomization); the
+    verdicts an earlier run stored are used by the ones that follow
+    """
+    root = dirname(library[0])
+    index = str(tmp_path / 'index.db')
+    args = (
+        '-i', index, '-a', MINAGE, '-t', '.zip, .rar, .exe, .bat',
+        '-x', '.nfo, .jpg, .idx, .sub') + library
+
+    code, output = tidyit(*args)
+    assert code == 0
+    assert index_hits(output)[0] == 0
+    assert handled(output, root) == HANDLED
+
+    for _ in range(2):
+        code, output = tidyit(*args)
+        assert code == 0
+        assert index_hits(output)[0] > 0
+        assert handled(output, root) == HANDLED
+
+
+def test_index_invalidated(library, tmp_path):
+    """
+    Changing how content is judged discards the verdicts stored
+    """
+    index = str(tmp_path / 'index.db')
+    code, output = tidyit('-i', index, '-a', MINAGE, '-t', '.zip', *library)
+    assert code == 0
+
+    code, output = tidyit('-i', index, '-a', MINAGE, '-t', '.rar', *library)
+    assert code == 0
+    assert index_hits(output)[0] == 0
+
+
+def test_index_changed_directory(library, tmp_path):
+    """
+    A directory that changed since it was indexed is scanned again
+    """
+    root = dirname(library[0])
+    index = str(tmp_path / 'index.db')
+    code, output = tidyit('-i', index, '-a', MINAGE, '-t', '.zip', *library)
+    assert code == 0
+
+    show = join(library[0], 'Show A')
+    make(join(show, 'Season 1', 'Show.A.S01E03.zip'))
+    settle(show)
+
+    code, output = tidyit('-i', index, '-a', MINAGE, '-t', '.zip', *library)
+    assert code == 0
+    assert join('TV', 'Show A', 'Season 1', 'Show.A.S01E03.zip') in \
+        handled(output, root)
+
+
+def test_fingerprint():
+    """
+    Fingerprints only change when what they're generated from does
+    """
+    assert TidyIt.ScanIndex.fingerprint('a', ['b'], 1) == \
+        TidyIt.ScanIndex.fingerprint('a', ['b'], 1)
+    assert TidyIt.ScanIndex.fingerprint('a', ['b'], 1) != \
+        TidyIt.ScanIndex.fingerprint('a', ['b'], 2)
+
+
+def test_index_undecodable_names(tmp_path):
+    """
+    Names that aren't valid UTF-8 are indexed (and found again) exactly as
+    they were read
+    """
+    root = str(tmp_path / 'TV')
+    show = os.fsdecode(os.path.join(os.fsencode(root), b'Caf\xe9 Show'))
+    make(join(show, 'Season 1', 'Show.S01E01.zip'))
+    make(join(show, 'Season 2', 'Show.S02E01.mkv'), 0)
+    settle(root)
+
+    index = str(tmp_path / 'index.db')
+    code, output = tidyit('-i', index, '-a', MINAGE, root)
+    assert code == 0
+    assert index_hits(output)[0] == 0
+
+    code, output = tidyit('-i', index, '-a', MINAGE, root)
+    assert code == 0
+    assert index_hits(output)[0] > 0
+
+
+def test_index_stat_through_filesystem(library, tmp_path, script):
+    """
+    The directories our index verifies are stat()'ed through the same
+    filesystem our libraries are scanned through
+    """
+    s = script(
+        *library, ScanIndex=str(tmp_path / 'index.db'),
+        FsRecord=str(tmp_path / 'library.fs'))
+    assert s._configure()
+    assert s._open_filesystem()
+    assert isinstance(s._fs, TidyIt.RecordingFilesystem)
+    assert s.scan_index.stat == s._fs.stat
+    s._close_filesystem()
+    s.scan_index.close()
@@ -0,0 +1,71 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for scanning libraries with a pool of processes
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+from os.path import join
+from os.path import exists
+from os.path import dirname
+
+from helpers import HANDLED
+from helpers import MINAGE
+from helpers import handled
+from helpers import tidyit
+
+
+def test_jobs_preview(library):
+    """
+    Scanning with a pool of processes finds what a single process does
+    """
+    root = dirname(library[0])
+    code, output = tidyit('-j', 3, '-D', '-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+    assert 'Scanning with 3 processes.' in output
+    assert handled(output, root) == HANDLED
+
+
+def test_jobs_clean(library):
+    """
+    Content found by our workers is handled by our main process
+    """
+    root = dirname(library[0])
+    code, output = tidyit('-j', 3, '-c', '-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+    assert handled(output, root) == HANDLED
+    for path in HANDLED:
+        assert not exists(join(root, path))
+
+
+def test_jobs_with_index(library, tmp_path):
+    """
+    The verdicts our workers reach are stored in the scan index
+    """
+    root = dirname(library[0])
+    index = str(tmp_path / 'index.db')
+    for _ in range(2):
+        code, output = tidyit(
+            '-j', 3, '-i', index, '-t', '.zip', '-a', MINAGE, *library)
+        assert code == 0
+        assert handled(output, root) == HANDLED
+
+    assert 'Scan index: 0 hit(s)' not in output
+
+
+def test_jobs_invalid(library):
+    """
+    An invalid number of jobs is reported
+    """
+    code, output = tidyit('-j', 'many', '-t', '.zip', '-a', MINAGE, *library)
+    assert code != 0
+    assert 'jobs' in output
@@ -0,0 +1,235 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for locking libraries and coalescing overlapping runs
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+import os
+import json
+from os.path import join
+from os.path import exists
+from hashlib import sha1
+
+import pytest
+
+from helpers import MINAGE
+from helpers import handled
+from helpers import make
+from helpers import settle
+from helpers import tidyit
+
+import TidyIt
+
+fcntl = pytest.importorskip('fcntl')
+
+
+def lock_file(lock_dir, path):
+    """
+    Returns the lock file TidyIt uses for the library specified
+    """
+    return join(lock_dir, 'tidyit-%s.lock' % sha1(
+        os.fsencode(path)).hexdigest()[:16])
+
+
+class Locked(object):
+    """
+    Holds the lock on a library (just like another copy of TidyIt would)
+    """
+
+    def __init__(self, lock_dir, path):
+        self.path = lock_file(lock_dir, path)
+
+    def __enter__(self):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.lockf(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return self
+
+    def __exit__(self, *args):
+        os.close(self.fd)
+
+
+def test_locked_library_skipped(library, tmp_path):
+    """
+    A library another copy is already tidying is left to it
+    """
+    tv, movies = library
+    lock_dir = str(tmp_path)
+    with Locked(lock_dir, tv):
+        code, output = tidyit(
+            '--lock-dir', lock_dir, '-t', '.zip', '-a', MINAGE, *library)
+
+    assert code == 0
+    assert '%s is already being tidied; skipping.' % tv in output
+    assert not [ p for p in handled(output) if p.startswith(tv) ]
+    assert [ p for p in handled(output) if p.startswith(movies) ]
+
+
+def test_locked_library_rerun(library, tmp_path):
+    """
+    In rerun mode, the copy holding the lock is asked to take another look
+    at the library once it's done
+    """
+    tv = library[0]
+    lock_dir = str(tmp_path)
+    with Locked(lock_dir, tv) as locked:
+        code, output = tidyit(
+            '--lock-dir', lock_dir, '--overlap', 'rerun', '-t', '.zip',
+            '-a', MINAGE, tv)
+
+        assert code == 0
+        assert 'a rerun was requested' in output
+        assert exists('%s.rerun' % locked.path)
+
+
+def test_rerun(library, tmp_path, script, caplog, monkeypatch):
+    """
+    A rerun requested while we were scanning tidies the show directories
+    that changed since we scanned them
+    """
+    tv = library[0]
+    lock_dir = str(tmp_path)
+    junk = join(tv, 'Show A', 'Season 1', 'Show.A.S01E03.zip')
+
+    _save_cursor = TidyIt.TidyItScript._save_cursor
+
+    def _changed(self):
+        # Another copy of us showed up (and so did more content) while we
+        # were scanning
+        make(junk)
+        settle(join(tv, 'Show A'), age=2 * MINAGE)
+        open('%s.rerun' % lock_file(lock_dir, tv), 'w').close()
+        return _save_cursor(self)
+
+    monkeypatch.setattr(TidyIt.TidyItScript, '_save_cursor', _changed)
+    assert script(
+        tv, LockDirectory=lock_dir, OverlapMode='rerun',
+        AlwaysTrash='.zip').tidy() is None
+
+    assert 'Rerun requested; changes were found in 1 director(ies)' in \
+        caplog.text
+    assert junk in handled(caplog.text)
+    assert not exists('%s.rerun' % lock_file(lock_dir, tv))
+
+
+def test_rerun_after_unlock(library, tmp_path, script, caplog, monkeypatch):
+    """
+    A rerun requested after we last checked for one (but before our lock
+    was released) is still honoured
+    """
+    tv = library[0]
+    lock_dir = str(tmp_path)
+    junk = join(tv, 'Show A', 'Season 1', 'Show.A.S01E03.zip')
+
+    _stop_actions = TidyIt.TidyItScript._stop_actions
+    requested = []
+
+    def _changed(self):
+        if not requested:
+            requested.append(True)
+            make(junk)
+            settle(join(tv, 'Show A'), age=2 * MINAGE)
+            open('%s.rerun' % lock_file(lock_dir, tv), 'w').close()
+        return _stop_actions(self)
+
+    monkeypatch.setattr(TidyIt.TidyItScript, '_stop_actions', _changed)
+    assert script(
+        tv, LockDirectory=lock_dir, OverlapMode='rerun',
+        AlwaysTrash='.zip').tidy() is None
+
+    assert 'Rerun requested; tidying %s again.' % tv in caplog.text
+    assert junk in handled(caplog.text)
+    assert not exists('%s.rerun' % lock_file(lock_dir, tv))
+
+
+def test_rerun_off_the_clock(library, tmp_path, script, caplog, monkeypatch):
+    """
+    A rerun of a time budgeted scan isn't resumed from (or stopped at) our
+    cursor; it's no longer on the clock
+    """
+    tv = library[0]
+    lock_dir = str(tmp_path / 'locks')
+    cursor_file = str(tmp_path / 'tidyit.cursor')
+    os.makedirs(lock_dir)
+
+    # An earlier run already finished with Show A and Show B
+    with open(cursor_file, 'w') as f:
+        json.dump({'root': tv, 'entry': 'Show B'}, f)
+
+    _save_cursor = TidyIt.TidyItScript._save_cursor
+
+    def _changed(self):
+        # A new show showed up in our library root
+        make(join(tv, 'Show D', 'Season 1', 'Show.D.S01E01.zip'))
+        settle(join(tv, 'Show D'))
+        open('%s.rerun' % lock_file(lock_dir, tv), 'w').close()
+        return _save_cursor(self)
+
+    monkeypatch.setattr(TidyIt.TidyItScript, '_save_cursor', _changed)
+    assert script(
+        tv, LockDirectory=lock_dir, OverlapMode='rerun', MaxRuntime=3600,
+        CursorFile=cursor_file, AlwaysTrash='.zip').tidy() is None
+
+    assert 'Rerun requested' in caplog.text
+    assert join(tv, 'Show B', 'Season 1', 'Show.B.S01E01.zip') in \
+        handled(caplog.text)
+    assert join(tv, 'Show D', 'Season 1', 'Show.D.S01E01.zip') in \
+        handled(caplog.text)
+    assert not exists(cursor_file)
+
+
+def test_lock_undecodable_root(tmp_path):
+    """
+    A library root that isn't valid UTF-8 can still be locked
+    """
+    root = os.path.join(os.fsencode(str(tmp_path)), b'TV \xe9')
+    make(os.path.join(root, b'Show A', b'Season 1', b'junk.zip'))
+    root = os.fsdecode(root)
+    settle(root)
+
+    lock_dir = str(tmp_path / 'locks')
+    os.makedirs(lock_dir)
+    code, output = tidyit('--lock-dir', lock_dir, '-a', MINAGE, root)
+
+    assert code == 0
+    assert exists(lock_file(lock_dir, root))
+
+
+def test_watched_directory_from_manifest(tmp_path, script, caplog):
+    """
+    A show directory is looked up through the filesystem we scan; it only
+    needs to exist in our manifest
+    """
+    root = str(tmp_path / 'missing' / 'TV')
+    manifest = str(tmp_path / 'manifest')
+    with open(manifest, 'w') as f:
+        for path, kind in (
+                (root, 'd'),
+                (join(root, 'Show B'), 'd'),
+                (join(root, 'Show B', 'Season 1'), 'd'),
+                (join(root, 'Show B', 'Season 1', 'junk.zip'), 'f')):
+            f.write('%s\t10\t1000\t%s\n' % (path, kind))
+
+    s = script(root, ManifestFile=manifest)
+    paths, options = s._configure()
+    assert s._open_filesystem()
+    s._start_metrics()
+    s._start_actions()
+    s._tidy_watched(root, 'Show B', options)
+    s._stop_actions()
+    s._close_filesystem()
+
+    assert handled(caplog.text) == set([
+        join(root, 'Show B', 'Season 1', 'junk.zip'),
+        join(root, 'Show B', 'Season 1'),
+        join(root, 'Show B'),
+    ])
@@ -0,0 +1,94 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for planning from a manifest of a library
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+import os
+from os.path import join
+from os.path import exists
+from os.path import dirname
+from os.path import basename
+
+import pytest
+
+from helpers import HANDLED
+from helpers import MINAGE
+from helpers import handled
+from helpers import tidyit
+
+
+def write_manifest(root, path):
+    """
+    Writes a manifest of everything found beneath the root specified (the
+    root included) just like find -printf '%p\\t%s\\t%T@\\t%y\\n' would
+    """
+    with open(path, 'w') as f:
+        stack = [root]
+        while stack:
+            _path = stack.pop()
+            st = os.lstat(_path)
+            kind = 'd' if os.path.isdir(_path) else 'f'
+            f.write('%s\t%d\t%f\t%s\n' % (_path, st.st_size, st.st_mtime, kind))
+            if kind == 'd':
+                stack.extend([ e.path for e in os.scandir(_path) ])
+    return path
+
+
+@pytest.fixture
+def manifest(library, tmp_path):
+    """
+    Returns a manifest of our library
+    """
+    return write_manifest(
+        dirname(library[0]), str(tmp_path / 'library.manifest'))
+
+
+def test_manifest(library, manifest):
+    """
+    Planning from a manifest finds what scanning the library would and
+    changes nothing (even when asked to clean)
+    """
+    root = dirname(library[0])
+    code, output = tidyit(
+        '--manifest', manifest, '-c', '-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+    assert handled(output, root) == HANDLED
+    for path in HANDLED:
+        assert exists(join(root, path))
+
+
+def test_manifest_relative_paths(library, manifest):
+    """
+    Libraries specified relative to where we're run from are found in our
+    manifest
+    """
+    root = dirname(library[0])
+    code, output = tidyit(
+        '--manifest', manifest, '-t', '.zip', '-a', MINAGE,
+        *[ basename(p) for p in library ], cwd=root)
+    assert code == 0
+    assert 'not found in the manifest' not in output
+    assert handled(output, root) == HANDLED
+
+
+def test_manifest_missing_library(library, manifest, tmp_path):
+    """
+    A library that isn't in our manifest is reported
+    """
+    missing = str(tmp_path / 'Anime')
+    code, output = tidyit(
+        '--manifest', manifest, '-t', '.zip', '-a', MINAGE, missing,
+        library[0])
+    assert code == 0
+    assert 'Library %s was not found in the manifest.' % missing in output
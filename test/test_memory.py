@@ -0,0 +1,122 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for memory bounded scans
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+from os.path import join
+
+import pytest
+
+from helpers import handled
+from helpers import make
+from helpers import settle
+
+import TidyIt
+
+
+@pytest.fixture
+def crowded(tmp_path):
+    """
+    Returns a library with a season crowded with junk
+    """
+    root = str(tmp_path / 'TV')
+    season = join(root, 'Show A', 'Season 1')
+    for no in range(8):
+        make(join(season, 'Show.A.S01E%.2d.zip' % no))
+    settle(root)
+    return root, season
+
+
+def test_memory_usage():
+    """
+    We can tell how much memory we're using
+    """
+    assert TidyIt.memory_usage() > 0
+    assert TidyIt.peak_memory() >= 0
+
+
+def test_tidy_state_slots():
+    """
+    Every directory we're part way through is kept as small as possible
+    """
+    state = TidyIt.TidyState('/library/TV', 1, None)
+    assert not hasattr(state, '__dict__')
+
+
+def test_max_memory(crowded, script, caplog, monkeypatch):
+    """
+    A directory that would take more memory than we're allowed to scan is
+    left alone (and reported)
+    """
+    root, season = crowded
+    usage = [100 * 1048576]
+    _scandir = TidyIt.TidyItScript._scandir
+
+    def _listed(self, path):
+        # Reading our crowded season is what costs us
+        if path == season:
+            usage[0] += 2 * 1048576
+        return _scandir(self, path)
+
+    monkeypatch.setattr(TidyIt, 'MEMORY_CHECK_INTERVAL', 2)
+    monkeypatch.setattr(TidyIt, 'memory_usage', lambda: usage[0])
+    monkeypatch.setattr(TidyIt.TidyItScript, '_scandir', _listed)
+
+    s = script(root, MaxMemory=1)
+    assert s.tidy() is None
+    skipped = [ r for r in caplog.records
+                if r.getMessage().startswith('Skipping %s;' % season) ]
+    assert [ r.levelname for r in skipped ] == ['WARNING']
+    assert skipped[0].getMessage() == 'Skipping %s; scanning it would use ' \
+        'more than the 1MB of memory allowed.' % season
+    assert s._memory_skipped == 1
+    assert not handled(caplog.text)
+
+
+def test_max_memory_not_reached(crowded, script, caplog, monkeypatch):
+    """
+    Nothing is skipped while our directories stay within our limit; the
+    memory we were already using before one was read doesn't count
+    against it
+    """
+    root, season = crowded
+    monkeypatch.setattr(TidyIt, 'MEMORY_CHECK_INTERVAL', 2)
+    monkeypatch.setattr(TidyIt, 'memory_usage', lambda: 100 * 1048576)
+
+    s = script(root, MaxMemory=1)
+    assert s.tidy() is None
+    assert s._memory_skipped == 0
+    assert len(handled(caplog.text)) == 10
+
+
+def test_max_memory_small_directory(crowded, script, caplog, monkeypatch):
+    """
+    A directory with fewer entries than we check memory usage after is
+    still checked (before it's last entry)
+    """
+    root, season = crowded
+    usage = [0]
+    _scandir = TidyIt.TidyItScript._scandir
+
+    def _listed(self, path):
+        if path == season:
+            usage[0] += 2 * 1048576
+        return _scandir(self, path)
+
+    monkeypatch.setattr(TidyIt, 'memory_usage', lambda: usage[0])
+    monkeypatch.setattr(TidyIt.TidyItScript, '_scandir', _listed)
+
+    s = script(root, MaxMemory=1)
+    assert s.tidy() is None
+    assert s._memory_skipped == 1
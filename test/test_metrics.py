@@ -0,0 +1,132 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for the metrics collected during a run
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+import os
+import re
+import json
+
+from helpers import HANDLED
+from helpers import MINAGE
+from helpers import make
+from helpers import settle
+from helpers import tidyit
+
+import TidyIt
+
+
+def test_metrics_json(library, tmp_path):
+    """
+    The metrics of a run are written as JSON
+    """
+    metrics_file = str(tmp_path / 'metrics.json')
+    code, output = tidyit(
+        '-c', '--metrics', metrics_file, '-t', '.zip', '-a', MINAGE,
+        *library)
+    assert code == 0
+
+    with open(metrics_file) as f:
+        metrics = json.load(f)
+
+    assert metrics['mode'] == TidyIt.TIDYIT_MODE.DELETE
+    assert metrics['directories'] > 0
+    assert metrics['filesystem_calls'] > 0
+    assert metrics['actions'] == {'handled': len(HANDLED), 'failed': 0}
+    assert metrics['reclaimed_bytes'] > 0
+    assert metrics['complete'] is True
+    assert metrics['warnings'] == 0
+    assert metrics['errors'] == 0
+    assert set(metrics['categories']) == set(TidyIt.TIDY_CATEGORIES)
+    assert set(['list', 'stat', 'classify', 'act']) <= \
+        set(metrics['phases'])
+
+    # Everything we handled was planned
+    assert sum([ p['items'] for p in metrics['planned'].values() ]) == \
+        len(HANDLED)
+
+
+def test_metrics_prometheus(library, tmp_path):
+    """
+    Metrics files ending in .prom are written for Prometheus
+    """
+    metrics_file = str(tmp_path / 'tidyit.prom')
+    code, output = tidyit(
+        '--metrics', metrics_file, '-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+
+    with open(metrics_file) as f:
+        content = f.read()
+
+    assert '# TYPE tidyit_directories_scanned gauge' in content
+    assert re.search(
+        r'^tidyit_actions\{mode="Preview",outcome="handled"\} %d$' %
+        len(HANDLED), content, re.M)
+    assert re.search(
+        r'^tidyit_planned_items\{mode="Preview",category="directory"\} 5$',
+        content, re.M)
+
+    # Every sample is a name (with optional labels) and a value
+    for line in content.splitlines():
+        if not line.startswith('#'):
+            assert re.match(r'^tidyit_[a-z_]+(\{[^}]*\})? [0-9.e+-]+$', line)
+
+
+def test_metrics_unwritable(library, tmp_path):
+    """
+    A metrics file that can't be written is reported (but doesn't fail
+    our run)
+    """
+    metrics_file = str(tmp_path / 'missing' / 'metrics.json')
+    code, output = tidyit(
+        '--metrics', metrics_file, '-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+    assert metrics_file in output
+
+
+def test_metrics_prometheus_undecodable_names(tmp_path):
+    """
+    Paths that aren't valid UTF-8 are decoded with our SystemEncoding
+    before they're written as label values
+    """
+    root = str(tmp_path / 'TV')
+    show = os.fsdecode(os.path.join(os.fsencode(root), b'Caf\xe9 Show'))
+    make(os.path.join(show, 'Season 1', 'junk.zip'))
+    settle(root)
+
+    metrics_file = str(tmp_path / 'metrics.prom')
+    code, output = tidyit(
+        '-n', 'latin-1', '--metrics', metrics_file, '-t', '.zip',
+        '-a', MINAGE, root)
+    assert code == 0
+
+    with open(metrics_file, 'rb') as f:
+        content = f.read().decode('utf-8')
+
+    assert u'Caf\xe9 Show' in content
+    assert not os.path.exists('%s.tmp' % metrics_file)
+
+
+def test_metrics_not_replaced(library, tmp_path):
+    """
+    Nothing is left behind when our metrics can't take the place of what
+    is already there
+    """
+    metrics_file = str(tmp_path / 'metrics.prom')
+    os.mkdir(metrics_file)
+    code, output = tidyit(
+        '--metrics', metrics_file, '-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+    assert 'Metrics file %s could not be written.' % metrics_file in output
+    assert not os.path.exists('%s.tmp' % metrics_file)
@@ -0,0 +1,192 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for moving content out of a library
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+import os
+import errno
+from os.path import join
+from os.path import exists
+from os.path import isdir
+from os.path import dirname
+
+import pytest
+
+from helpers import HANDLED
+from helpers import MINAGE
+from helpers import VIDEO_SIZE
+from helpers import build_library
+from helpers import handled
+from helpers import make
+from helpers import tidyit
+
+import TidyIt
+
+
+def test_reserve(tmp_path):
+    """
+    Names already taken are given the next free numbered version of
+    themselves
+    """
+    path = str(tmp_path)
+    make(join(path, 'junk.zip'))
+    make(join(path, 'junk.zip.00001'))
+
+    index = TidyIt.MoveIndex()
+    assert index.reserve(join(path, 'other.zip')) == join(path, 'other.zip')
+    assert index.reserve(join(path, 'junk.zip')) == \
+        join(path, 'junk.zip.00002')
+    assert index.reserve(join(path, 'junk.zip')) == \
+        join(path, 'junk.zip.00003')
+    assert index.reserve(join(path, 'other.zip')) == \
+        join(path, 'other.zip.00001')
+
+    # The directory was only ever listed once
+    assert index.listed == 1
+
+
+def test_reserve_directories(tmp_path):
+    """
+    Directories share the name of an existing directory (their content is
+    merged) but never that of a file
+    """
+    path = str(tmp_path)
+    os.mkdir(join(path, 'Show'))
+    make(join(path, 'Movie'))
+
+    index = TidyIt.MoveIndex()
+    assert index.reserve(join(path, 'Show'), directory=True) == \
+        join(path, 'Show')
+    assert index.reserve(join(path, 'Movie'), directory=True) == \
+        join(path, 'Movie.00001')
+    assert index.reserve(join(path, 'Show')) == join(path, 'Show.00001')
+
+
+def test_reserve_missing_directory(tmp_path):
+    """
+    Directories that don't exist yet have every name free
+    """
+    path = str(tmp_path / 'missing')
+    index = TidyIt.MoveIndex()
+    assert index.reserve(join(path, 'junk.zip')) == join(path, 'junk.zip')
+    assert index.reserve(join(path, 'junk.zip')) == \
+        join(path, 'junk.zip.00001')
+
+
+def test_forget(tmp_path):
+    """
+    Forgetting a directory has it listed again
+    """
+    path = str(tmp_path)
+    index = TidyIt.MoveIndex()
+    index.reserve(join(path, 'Show', 'junk.zip'))
+    make(join(path, 'Show', 'junk.zip'))
+    make(join(path, 'Show', 'junk.zip.00001'))
+
+    index.forget(path)
+    assert index.reserve(join(path, 'Show', 'junk.zip')) == \
+        join(path, 'Show', 'junk.zip.00002')
+
+
+def test_move(library, tmp_path):
+    """
+    Content is moved (keeping the directories it resided in) instead of
+    being removed
+    """
+    root = dirname(library[0])
+    trash = str(tmp_path / 'trash')
+    code, output = tidyit(
+        '-p', trash, '-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+    assert handled(output, root) == HANDLED
+    for path in HANDLED:
+        assert not exists(join(root, path))
+
+    # Content is moved along with the directories that were handled with
+    # it
+    assert exists(join(trash, 'junk.zip'))
+    assert exists(join(trash, 'Show B', 'Season 1', 'Show.B.S01E01.zip'))
+    assert isdir(join(trash, 'Empty', 'Deeper'))
+
+
+def test_move_twice(library, tmp_path):
+    """
+    Content moved to where something was already moved before it is given
+    a name of it's own
+    """
+    trash = str(tmp_path / 'trash')
+    code, output = tidyit(
+        '-p', trash, '-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+
+    # The same library all over again
+    build_library(dirname(library[0]))
+    code, output = tidyit(
+        '-p', trash, '-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+
+    assert exists(join(trash, 'junk.zip'))
+    assert exists(join(trash, 'junk.zip.00001'))
+    assert exists(join(trash, 'Show B', 'Season 1', 'Show.B.S01E01.zip'))
+    assert exists(join(
+        trash, 'Show B', 'Season 1', 'Show.B.S01E01.zip.00001'))
+    assert not exists(join(trash, 'junk.zip.00002'))
+
+
+def test_move_race(tmp_path, script, monkeypatch):
+    """
+    A file that takes our name after we've checked it is never replaced;
+    our file is given the next free name instead
+    """
+    root = str(tmp_path / 'Movies')
+    make(join(root, 'Movie 1 (2001)', 'Movie.1.2001.mkv'), VIDEO_SIZE)
+    make(join(root, 'Movie 1 (2001)', 'junk.zip'), 20)
+    trash = str(tmp_path / 'trash')
+    os.mkdir(trash)
+
+    _move = TidyIt.TidyItScript._move
+
+    def _racer(self, path, target, *args, **kwargs):
+        if not exists(join(trash, 'junk.zip')):
+            # Someone else got there first
+            make(join(trash, 'junk.zip'), 5)
+        return _move(self, path, target, *args, **kwargs)
+
+    monkeypatch.setattr(TidyIt.TidyItScript, '_move', _racer)
+    s = script(
+        root, Mode=TidyIt.TIDYIT_MODE.MOVE, MovePath=trash,
+        AlwaysTrash='.zip', ProcessMinAge=0)
+    assert s.tidy() is None
+
+    assert os.path.getsize(join(trash, 'junk.zip')) == 5
+    assert os.path.getsize(join(trash, 'junk.zip.00001')) == 20
+    assert not exists(join(root, 'Movie 1 (2001)', 'junk.zip'))
+
+
+def test_memory_filesystem_link():
+    """
+    Linking to a name that's already taken fails (rather than replacing
+    what's there)
+    """
+    fs = TidyIt.MemoryFilesystem()
+    fs.add('/trash/junk.zip', 'f', 5, 1000)
+    fs.add('/library/junk.zip', 'f', 20, 1000)
+
+    with pytest.raises(OSError) as e:
+        fs.link('/library/junk.zip', '/trash/junk.zip')
+    assert e.value.errno == errno.EEXIST
+
+    fs.link('/library/junk.zip', '/trash/junk.zip.00001')
+    assert fs.stat('/trash/junk.zip').st_size == 5
+    assert fs.stat('/trash/junk.zip.00001').st_size == 20
@@ -0,0 +1,145 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for writing (and applying) action plans
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+import json
+from os.path import join
+from os.path import exists
+from os.path import dirname
+from os.path import relpath
+
+from helpers import HANDLED
+from helpers import MINAGE
+from helpers import handled
+from helpers import make
+from helpers import tidyit
+
+import TidyIt
+
+
+def read_plan(path):
+    """
+    Returns the entries of the action plan specified
+    """
+    with open(path, 'r') as f:
+        return [ json.loads(line) for line in f if line.strip() ]
+
+
+def test_plan_out(library, tmp_path):
+    """
+    Everything a preview would handle is written to our plan
+    """
+    root = dirname(library[0])
+    plan = str(tmp_path / 'plan.jsonl')
+    code, output = tidyit(
+        '--plan-out', plan, '-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+
+    entries = read_plan(plan)
+    assert set([ relpath(e['path'], root) for e in entries ]) == HANDLED
+    for entry in entries:
+        assert set(entry) == set(
+            ['path', 'category', 'size', 'depth', 'reason', 'mtime'])
+
+    # Content is always planned before the directory it resides in
+    paths = [ e['path'] for e in entries ]
+    for no, path in enumerate(paths):
+        assert not [ p for p in paths[:no] if dirname(path) == p ]
+
+    # Nothing was changed
+    for path in HANDLED:
+        assert exists(join(root, path))
+
+
+def test_apply_plan(library, tmp_path):
+    """
+    Applying a plan handles what it lists without scanning again
+    """
+    root = dirname(library[0])
+    plan = str(tmp_path / 'plan.jsonl')
+    code, output = tidyit(
+        '--plan-out', plan, '-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+
+    code, output = tidyit('--apply', plan, '-c')
+    assert code == 0
+    assert 'Scanning' not in output
+    assert handled(output, root) == HANDLED
+    for path in HANDLED:
+        assert not exists(join(root, path))
+
+
+def test_apply_changed_plan(library, tmp_path):
+    """
+    Content that changed since it was planned (and the directories it
+    resides in) is left alone
+    """
+    root = dirname(library[0])
+    plan = str(tmp_path / 'plan.jsonl')
+    code, output = tidyit(
+        '--plan-out', plan, '-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+
+    # The junk is now something else
+    make(join(root, 'TV', 'Show B', 'Season 1', 'Show.B.S01E01.zip'), 20)
+
+    # Something new was added
+    make(join(root, 'Movies', 'Empty', 'Deeper', 'new.mkv'))
+
+    code, output = tidyit('--apply', plan, '-c')
+    assert code == 0
+
+    kept = set([
+        join('TV', 'Show B', 'Season 1', 'Show.B.S01E01.zip'),
+        join('TV', 'Show B', 'Season 1'),
+        join('TV', 'Show B'),
+        join('Movies', 'Empty', 'Deeper'),
+        join('Movies', 'Empty'),
+    ])
+    assert handled(output, root) == HANDLED - kept
+    for path in kept:
+        assert exists(join(root, path))
+
+
+def test_apply_invalid_plan(library, tmp_path):
+    """
+    Invalid entries in a plan are skipped
+    """
+    plan = str(tmp_path / 'plan.jsonl')
+    with open(plan, 'w') as f:
+        f.write('not json\n')
+        f.write(json.dumps({'path': join(library[1], 'Empty')}) + '\n')
+
+    code, output = tidyit('--apply', plan, '-c')
+    assert code == 0
+    assert 'Applied 0 planned action(s); 2 skipped.' in output
+    assert exists(join(library[1], 'Empty'))
+
+
+def test_plan_verified_through_filesystem(script):
+    """
+    Planned content is verified through the filesystem we were given
+    """
+    fs = TidyIt.MemoryFilesystem()
+    fs.add('/library/TV/Show B/junk.zip', 'f', 10, 1000)
+
+    s = script()
+    s._reset_counters()
+    s._fs = fs
+    record = {'path': '/library/TV/Show B/junk.zip', 'mtime': 1000, 'size': 10}
+    assert s._plan_verify(record, set(), set())
+
+    record = dict(record, path='/library/TV/Show B/gone.zip')
+    assert not s._plan_verify(record, set(), set())
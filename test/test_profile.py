@@ -0,0 +1,69 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for profiling and tracing slow runs
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+import pstats
+from os.path import dirname
+
+from helpers import HANDLED
+from helpers import MINAGE
+from helpers import handled
+from helpers import tidyit
+
+
+def test_profile(library, tmp_path):
+    """
+    The statistics gathered while profiling can be read by pstats
+    """
+    profile = str(tmp_path / 'tidyit.prof')
+    code, output = tidyit('--profile', profile, '-a', MINAGE, *library)
+    assert code == 0
+    assert 'Wrote profile to %s' % profile in output
+
+    stats = pstats.Stats(profile)
+    assert [ f for f in stats.stats if f[2] == 'tidy_library' ]
+
+
+def test_profile_unwritable(library, tmp_path):
+    """
+    A profile that can't be written does not fail the run
+    """
+    profile = str(tmp_path / 'missing' / 'tidyit.prof')
+    code, output = tidyit('--profile', profile, '-a', MINAGE, *library)
+    assert code == 0
+    assert 'Profile %s could not be written.' % profile in output
+
+
+def test_trace_slow(library):
+    """
+    With a threshold of zero everything is slow enough to be reported;
+    what is handled is unchanged
+    """
+    root = dirname(library[0])
+    code, output = tidyit(
+        '--trace-slow', 0, '-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+    assert 'Slow ' in output
+    assert 'Slow action took' in output
+    assert handled(output, root) == HANDLED
+
+
+def test_trace_slow_disabled(library):
+    """
+    Nothing is traced unless we're asked to
+    """
+    code, output = tidyit('-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+    assert 'Slow ' not in output
@@ -0,0 +1,69 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for directories protected by a safe entry
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+from os.path import join
+
+from helpers import make
+from helpers import settle
+from helpers import handled
+
+import TidyIt
+
+
+def test_safe_entry(library, script, caplog, monkeypatch):
+    """
+    Nothing in a directory protected by a safe entry is stat()'ed or
+    looked into
+    """
+    listed = []
+    scandir = TidyIt.OSFilesystem.scandir
+
+    def _scandir(self, path):
+        listed.append(path)
+        return scandir(self, path)
+
+    monkeypatch.setattr(TidyIt.OSFilesystem, 'scandir', _scandir)
+
+    tv = library[0]
+    s = script(tv)
+    assert s.tidy() is None
+
+    show = join(tv, 'Show C')
+    assert 'Protected 1 director(ies) with a safe entry.' in caplog.text
+    assert show in listed
+    assert join(show, 'Season 1') not in listed
+    assert not [ p for p in handled(caplog.text) if p.startswith(show) ]
+
+
+def test_safe_entry_anywhere(tmp_path, script, caplog):
+    """
+    A safe entry protects the directory it's found in no matter where it
+    is in the listing (or what else is found with it)
+    """
+    root = str(tmp_path / 'TV')
+    season = join(root, 'Show A', 'Season 1')
+    make(join(season, 'aaa.zip'))
+    make(join(season, 'zzz.zip'))
+    make(join(season, 'keep'), 0)
+    make(join(root, 'Show B', 'Season 1', 'junk.zip'))
+    settle(root)
+
+    assert script(root, SafeEntries='keep, .tidysafe').tidy() is None
+    assert handled(caplog.text) == set([
+        join(root, 'Show B', 'Season 1', 'junk.zip'),
+        join(root, 'Show B', 'Season 1'),
+        join(root, 'Show B'),
+    ])
@@ -0,0 +1,86 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for the way TidyIt scans (and tidies) a library
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+from os.path import join
+from os.path import exists
+from os.path import dirname
+
+from helpers import HANDLED
+from helpers import MINAGE
+from helpers import handled
+from helpers import tidyit
+
+import TidyIt
+
+
+def test_preview(library):
+    """
+    A preview reports what would be handled and changes nothing
+    """
+    root = dirname(library[0])
+    code, output = tidyit('-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+    assert handled(output, root) == HANDLED
+    for path in HANDLED:
+        assert exists(join(root, path))
+
+
+def test_clean(library):
+    """
+    Cleaning removes everything a preview reports
+    """
+    root = dirname(library[0])
+    code, output = tidyit('-c', '-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+    assert handled(output, root) == HANDLED
+    for path in HANDLED:
+        assert not exists(join(root, path))
+
+    # Everything else was left alone
+    assert exists(join(
+        root, 'TV', 'Show A', 'Season 1', 'metadata', 'Show.A.S01E01.jpg'))
+    assert exists(join(
+        root, 'TV', 'Show C', 'Season 1', 'Show.C.S01E01.en.srt'))
+    assert exists(join(root, 'Movies', 'Movie 3 (2003)', 'readme.unknown'))
+
+
+def test_directories_read_once(library, script, monkeypatch):
+    """
+    Each directory is only ever listed once
+    """
+    listed = []
+    scandir = TidyIt.OSFilesystem.scandir
+
+    def _scandir(self, path):
+        listed.append(path)
+        return scandir(self, path)
+
+    monkeypatch.setattr(TidyIt.OSFilesystem, 'scandir', _scandir)
+    assert script(*library).tidy() is None
+
+    assert len(listed) == len(set(listed))
+    assert join(library[0], 'Show A', 'Season 1') in listed
+
+
+def test_summary(library):
+    """
+    The summary reports the filesystem calls issued; the calls an older
+    walk would have issued are only ever reported as an estimate
+    """
+    code, output = tidyit('-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+    assert 'filesystem call(s) issued (an estimated' in output
+    assert 'saved' not in output
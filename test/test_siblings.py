@@ -0,0 +1,82 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for matching extra files to the video they belong to
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+from os.path import join
+
+from helpers import MINAGE
+from helpers import VIDEO_SIZE
+from helpers import handled
+from helpers import make
+from helpers import settle
+from helpers import tidyit
+
+import TidyIt
+
+
+def test_lookup():
+    """
+    Extras are matched to the entry whose name they start with
+    """
+    index = TidyIt.SiblingIndex()
+    index.add('/lib/Show/Show.S01E02.mkv')
+    index.add('/lib/Show/Show.S01E01.mkv')
+
+    assert index.lookup('Show.S01E01') == ('Show.S01E01.mkv', False)
+    assert index.lookup('Show.S01E02') == ('Show.S01E02.mkv', False)
+    assert index.lookup('Show.S01E03') is None
+
+
+def test_lookup_directory():
+    """
+    Extras named after the directory their video resides in are matched
+    to it
+    """
+    index = TidyIt.SiblingIndex()
+    index.add('/lib/Movie (2001)/feature.mkv')
+
+    assert index.lookup('Movie (2001)') == ('Movie (2001)', True)
+    assert index.lookup('Movie') == ('Movie (2001)', True)
+
+
+def test_lookup_samples():
+    """
+    Samples are never matched by name
+    """
+    index = TidyIt.SiblingIndex()
+    index.add('/lib/Feature/Movie-sample.mkv')
+    index.add('/lib/Feature/sample-Movie.mkv')
+
+    assert index.lookup('Movie') is None
+    assert index.lookup('sample-Movie') is None
+
+
+def test_flat_directory(tmp_path):
+    """
+    Every extra in a directory of many videos is matched to it's own
+    """
+    root = str(tmp_path / 'library')
+    flat = join(root, 'Movies', 'Dump')
+    for no in range(50):
+        name = 'Film.%02d.1080p' % no
+        if no % 2:
+            make(join(flat, name + '.mkv'), VIDEO_SIZE)
+        make(join(flat, name + '.nfo'))
+    settle(root)
+
+    code, output = tidyit('-a', MINAGE, join(root, 'Movies'))
+    assert code == 0
+    assert handled(output, flat) == set([
+        'Film.%02d.1080p.nfo' % no for no in range(0, 50, 2) ])
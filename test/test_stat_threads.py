@@ -0,0 +1,59 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for stat()ing directory entries concurrently
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+from os.path import dirname
+
+from helpers import HANDLED
+from helpers import MINAGE
+from helpers import handled
+from helpers import tidyit
+
+
+def test_stat_threads(library):
+    """
+    Stat()ing with a pool of threads finds what a single thread does
+    """
+    root = dirname(library[0])
+    code, output = tidyit('-T', 4, '-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+    assert handled(output, root) == HANDLED
+
+
+def test_stat_threads_per_library(library, script, caplog):
+    """
+    The number of stat threads can be set for each library
+    """
+    tv, movies = library
+    _script = script(tv, movies, StatThreads='2, %s=8, %s=bad' % (tv, movies))
+    assert _script._configure()
+    assert 'An invalid number of stat threads' in caplog.text
+
+    _script._library(tv)
+    assert _script._stat_threads == 8
+
+    _script._library(movies)
+    assert _script._stat_threads == 2
+
+
+def test_stat_threads_with_jobs(library):
+    """
+    Our workers stat() with their own pool of threads
+    """
+    root = dirname(library[0])
+    code, output = tidyit(
+        '-j', 2, '-T', 4, '-t', '.zip', '-a', MINAGE, *library)
+    assert code == 0
+    assert handled(output, root) == HANDLED
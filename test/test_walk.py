@@ -0,0 +1,143 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for walking a library
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+import os
+import sys
+from os.path import join
+
+import pytest
+
+from helpers import MINAGE
+from helpers import VIDEO_SIZE
+from helpers import make
+from helpers import settle
+
+from TidyIt import TidyCode
+
+# Deeper than we could ever recurse
+DEPTH = sys.getrecursionlimit() + 100
+
+
+@pytest.fixture
+def tidy_tree():
+    """
+    Removes the (deep) trees registered with it once our test is done;
+    they're too deep to be removed recursively
+    """
+    roots = []
+    yield roots.append
+
+    for root in roots:
+        stack = [root]
+        paths = []
+        while stack:
+            path = stack.pop()
+            paths.append(path)
+            for entry in os.scandir(path):
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    os.unlink(entry.path)
+
+        for path in reversed(paths):
+            os.rmdir(path)
+
+
+def deep(root, depth=DEPTH):
+    """
+    Creates a chain of directories (without recursing) as deep as
+    specified; the deepest one is returned
+    """
+    path = root
+    os.mkdir(path)
+    for _ in range(depth):
+        path = join(path, 'd')
+        os.mkdir(path)
+    return path
+
+
+def test_deep_library(tmp_path, script, tidy_tree):
+    """
+    There is no limit to how deep a library can be
+    """
+    root = str(tmp_path / 'library')
+    deepest = deep(root)
+    tidy_tree(root)
+    make(join(deepest, 'junk.zip'))
+    settle(root)
+
+    _script = script(root)
+    paths, options = _script._configure()
+
+    actions = []
+    _script._capture = actions
+    assert _script.tidy_library(root, **options) == TidyCode.IGNORE
+
+    handled = [ a[1] for a in actions if a[0] == 'handle' ]
+    assert handled[0] == join(deepest, 'junk.zip')
+    assert handled[-1] == join(root, 'd')
+    assert len(handled) == DEPTH + 1
+
+
+def test_deep_library_kept(tmp_path, script, tidy_tree):
+    """
+    A video found deep within a library keeps every directory leading to
+    it
+    """
+    root = str(tmp_path / 'library')
+    deepest = deep(root)
+    tidy_tree(root)
+    make(join(deepest, 'Movie.mkv'), VIDEO_SIZE)
+    make(join(deepest, 'Movie.nfo'))
+    make(join(root, 'd', 'junk.zip'))
+    settle(root)
+
+    _script = script(root)
+    paths, options = _script._configure()
+
+    actions = []
+    _script._capture = actions
+    assert _script.tidy_library(root, **options) == TidyCode.IGNORE
+    assert [ a[1] for a in actions if a[0] == 'handle' ] == \
+        [join(root, 'd', 'junk.zip')]
+
+
+def test_not_a_directory(tmp_path, script):
+    """
+    Only directories are ever scanned
+    """
+    path = make(str(tmp_path / 'file.mkv'))
+    _script = script(path)
+    paths, options = _script._configure()
+    assert _script.tidy_library(path, **options) == TidyCode.IGNORE
+
+
+def test_new_content(tmp_path, script):
+    """
+    A directory holding anything newer than our minimum age is left alone
+    """
+    root = str(tmp_path / 'library')
+    make(join(root, 'Show', 'junk.zip'))
+    make(join(root, 'Show', 'recent.srt'), age=MINAGE // 2)
+    settle(root)
+
+    _script = script(root)
+    paths, options = _script._configure()
+
+    actions = []
+    _script._capture = actions
+    assert _script.tidy_library(root, **options) == TidyCode.IGNORE
+    assert not actions
@@ -0,0 +1,225 @@
+# -*- encoding: utf-8 -*-
+#
+# Tests for the inotify based watch mode
+#
+# Copyright (C) 2015-2020 Chris Caron <lead2gold@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+import os
+import sys
+import time
+import signal
+import threading
+import subprocess
+from os.path import join
+
+import pytest
+
+from helpers import TIDYIT_SCRIPT
+from helpers import make
+
+import TidyIt
+
+try:
+    TidyIt.Inotify().close()
+    INOTIFY = True
+
+except OSError:
+    INOTIFY = False
+
+pytestmark = pytest.mark.skipif(
+    not INOTIFY, reason='inotify is not supported on this system')
+
+
+class Watcher(object):
+    """
+    Runs TidyIt.py in watch mode (in a process of it's own) and collects
+    everything it logs
+    """
+
+    def __init__(self, *args):
+        self.lines = []
+        self.process = subprocess.Popen(
+            [sys.executable, TIDYIT_SCRIPT, '--watch'] +
+            [str(a) for a in args],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+        self._reader = threading.Thread(target=self._read)
+        self._reader.daemon = True
+        self._reader.start()
+
+    def _read(self):
+        for line in iter(self.process.stdout.readline, b''):
+            self.lines.append(line.decode('utf-8', 'replace'))
+
+    def wait_for(self, text, timeout=30):
+        """
+        Waits for the text specified to be logged; the line it was found
+        in is returned (None if it never was)
+        """
+        expires = time.time() + timeout
+        while True:
+            for line in list(self.lines):
+                if text in line:
+                    return line
+
+            if time.time() >= expires:
+                return None
+            time.sleep(0.1)
+
+    def stop(self):
+        """
+        Interrupts our watch (and waits for it to stop); it's exit code
+        is returned
+        """
+        if self.process.poll() is None:
+            self.process.send_signal(signal.SIGINT)
+        code = self.process.wait(timeout=30)
+        self._reader.join(timeout=5)
+        return code
+
+
+def test_inotify_events(tmp_path):
+    """
+    Changes made in a watched directory are reported against it's watch
+    descriptor (whose path is rebuilt from it's parent)
+    """
+    root = str(tmp_path)
+    child = join(root, 'Show')
+    os.mkdir(child)
+
+    inotify = TidyIt.Inotify()
+    try:
+        wd_root = inotify.add(root)
+        wd_child = inotify.add(child, parent=wd_root)
+        assert len(inotify) == 2
+        assert inotify.chain(wd_child) == [wd_root, wd_child]
+        assert inotify.path(wd_child) == child
+
+        make(join(child, 'new.zip'))
+        events = list(inotify.read(5))
+        assert (wd_child, 'new.zip') in [ (e[0], e[3]) for e in events ]
+
+        inotify.remove(wd_child)
+        assert inotify.chain(wd_child) == []
+        assert inotify.path(wd_child) is None
+
+    finally:
+        inotify.close()
+
+
+def test_inotify_unknown_path(tmp_path):
+    """
+    A directory that does not exist can't be watched
+    """
+    inotify = TidyIt.Inotify()
+    try:
+        with pytest.raises(OSError):
+            inotify.add(str(tmp_path / 'missing'))
+
+    finally:
+        inotify.close()
+
+
+def test_inotify_remove_tree(tmp_path):
+    """
+    Removing a directory's watch removes the watches beneath it too
+    """
+    root = str(tmp_path)
+    show = join(root, 'Show')
+    season = join(show, 'Season 1')
+    os.makedirs(season)
+
+    inotify = TidyIt.Inotify()
+    try:
+        wd_root = inotify.add(root)
+        wd_show = inotify.add(show, parent=wd_root)
+        wd_season = inotify.add(season, parent=wd_show)
+        assert len(inotify) == 3
+
+        inotify.remove(wd_show)
+        assert len(inotify) == 1
+        assert inotify.path(wd_season) is None
+        assert inotify.path(wd_root) == root
+
+    finally:
+        inotify.close()
+
+
+def test_inotify_undecodable_names(tmp_path):
+    """
+    Directories whose names aren't valid UTF-8 can be watched (and their
+    content is reported by the name it was read with)
+    """
+    show = os.fsdecode(os.path.join(os.fsencode(str(tmp_path)), b'Caf\xe9'))
+    os.mkdir(show)
+
+    inotify = TidyIt.Inotify()
+    try:
+        wd = inotify.add(show)
+        name = os.fsdecode(b'\xe9.zip')
+        make(join(show, name))
+        assert (wd, name) in [ (e[0], e[3]) for e in inotify.read(5) ]
+
+    finally:
+        inotify.close()
+
+
+def test_watch(library):
+    """
+    Content added to a library once we're watching it is tidied after it
+    has settled
+    """
+    watcher = Watcher('-a', 0, '-t', '.zip', *library)
+    try:
+        assert watcher.wait_for('Watching') is not None
+
+        junk = make(join(library[0], 'Show A', 'Season 1', 'Show.A.zip'))
+        assert watcher.wait_for('Handle FILE: %s' % junk) is not None
+
+    finally:
+        watcher.stop()
+
+
+def test_watch_undecodable_names(library):
+    """
+    Watch mode looks after directories whose names aren't valid UTF-8
+    """
+    show = os.fsdecode(os.path.join(os.fsencode(library[0]), b'Caf\xe9'))
+    os.mkdir(show)
+
+    watcher = Watcher('-a', 0, '-t', '.zip', *library)
+    try:
+        assert watcher.wait_for('Watching') is not None
+
+        make(join(show, 'Season 1', 'junk.zip'))
+        assert watcher.wait_for('Handle FILE: ') is not None
+        assert watcher.process.poll() is None
+
+    finally:
+        watcher.stop()
+
+
+def test_watch_fs_record(library, tmp_path):
+    """
+    Watch mode can record the filesystem calls it makes
+    """
+    recording = str(tmp_path / 'library.fs')
+    watcher = Watcher('--fs-record', recording, '-a', 0, '-t', '.zip', *library)
+    try:
+        assert watcher.wait_for('Watching') is not None
+
+        junk = make(join(library[0], 'Show A', 'Season 1', 'Show.A.zip'))
+        assert watcher.wait_for('Handle FILE: %s' % junk) is not None
+
+    finally:
+        watcher.stop()